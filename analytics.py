@@ -0,0 +1,198 @@
+"""
+Модуль структур данных статистики убийств.
+
+KillsSeries - компактное колоночное представление убийств по дням: массив
+дат и по массиву счетчиков на каждый тип монстра. Его строят прямо из SQL
+с условной агрегацией, без pandas; DataFrame создается только по запросу
+через to_frame. HourHeatmap и KillTrends - результаты аналитических
+запросов (убийства по дню недели и часу; дневные итоги со скользящим
+средним и долей ивентовых убийств). Модуль не импортирует БД и pandas,
+поэтому структуры можно передавать в процессы построения графиков.
+"""
+
+from array import array
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+MOB_TYPES = ('simple', 'event')
+WEEKDAYS = ('Вс', 'Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб')
+
+
+def as_date(value: Union[date, str]) -> date:
+    """
+    Приводит значение date(...) из БД к datetime.date.
+
+    SQLite возвращает результат функции date() строкой, PostgreSQL - датой.
+
+    Args:
+        value (Union[date, str]): Значение из БД.
+
+    Returns:
+        date: Дата.
+    """
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+@dataclass
+class KillsSeries:
+    """
+    Убийства по дням в колоночном виде.
+
+    Attributes:
+        dates (List[date]): Даты по возрастанию.
+        counts (Dict[str, array]): Счетчики по типу монстра, по одному на дату.
+    """
+    dates: List[date] = field(default_factory=list)
+    counts: Dict[str, array] = field(default_factory=lambda: {mob_type: array('q') for mob_type in MOB_TYPES})
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence], mob_types: Tuple[str, ...] = MOB_TYPES) -> 'KillsSeries':
+        """
+        Строит ряд из строк (date, count_type1, count_type2, ...).
+
+        Args:
+            rows (Iterable[Sequence]): Строки результата условной агрегации.
+            mob_types (Tuple[str, ...]): Типы монстров в порядке колонок.
+
+        Returns:
+            KillsSeries: Колоночный ряд.
+        """
+        series = cls(counts={mob_type: array('q') for mob_type in mob_types})
+        columns = [series.counts[mob_type] for mob_type in mob_types]
+        for row in rows:
+            series.dates.append(as_date(row[0]))
+            for column, value in zip(columns, row[1:]):
+                column.append(int(value or 0))
+        return series
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def empty(self) -> bool:
+        """Нет ни одного дня с убийствами."""
+        return not self.dates
+
+    def totals(self) -> Dict[str, int]:
+        """
+        Возвращает суммы по типам монстров.
+
+        Returns:
+            Dict[str, int]: Количество убийств каждого типа.
+        """
+        return {mob_type: sum(values) for mob_type, values in self.counts.items()}
+
+    def to_frame(self):
+        """
+        Возвращает ряд в виде DataFrame (pandas импортируется только здесь).
+
+        Returns:
+            pd.DataFrame: Индекс - даты, колонки - типы монстров (в том же виде, что get_kills).
+        """
+        import pandas as pd
+        if self.empty:
+            return pd.DataFrame(columns=["date", "обычный", "ивентовый"])
+        df = pd.DataFrame({mob_type: list(values) for mob_type, values in sorted(self.counts.items())},
+                          index=pd.to_datetime(self.dates))
+        df.index.name = 'date'
+        df.columns.name = 'mob_type'
+        return df
+
+
+@dataclass
+class HourHeatmap:
+    """
+    Убийства по дню недели и часу суток (UTC).
+
+    Attributes:
+        counts (List[array]): 7 строк по 24 счетчика; строка 0 - воскресенье,
+            как в extract('dow') SQL.
+    """
+    counts: List[array] = field(default_factory=lambda: [array('q', [0] * 24) for _ in WEEKDAYS])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> 'HourHeatmap':
+        """
+        Строит тепловую карту из строк (день недели, час, количество).
+
+        Args:
+            rows (Iterable[Sequence]): Строки результата запроса.
+
+        Returns:
+            HourHeatmap: Тепловая карта.
+        """
+        heatmap = cls()
+        for weekday, hour, count in rows:
+            heatmap.counts[int(weekday)][int(hour)] = int(count)
+        return heatmap
+
+    @property
+    def empty(self) -> bool:
+        """Нет ни одного убийства."""
+        return not any(any(row) for row in self.counts)
+
+    def peak(self) -> Tuple[int, int, int]:
+        """
+        Возвращает самый активный час.
+
+        Returns:
+            Tuple[int, int, int]: День недели, час и количество убийств.
+        """
+        return max(((weekday, hour, row[hour]) for weekday, row in enumerate(self.counts) for hour in range(24)),
+                   key=lambda item: item[2])
+
+
+@dataclass
+class KillTrends:
+    """
+    Дневные итоги убийств со скользящим средним и долей ивентовых убийств.
+
+    Attributes:
+        window (int): Ширина окна скользящего среднего в днях.
+        dates (List[date]): Даты по возрастанию.
+        totals (array): Убийств за день.
+        rolling (array): Среднее число убийств за window дней с убийствами, заканчивая текущим.
+        event_share (array): Доля ивентовых убийств за день (0..1).
+    """
+    window: int = 7
+    dates: List[date] = field(default_factory=list)
+    totals: array = field(default_factory=lambda: array('q'))
+    rolling: array = field(default_factory=lambda: array('d'))
+    event_share: array = field(default_factory=lambda: array('d'))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence], window: int = 7) -> 'KillTrends':
+        """
+        Строит тренды из строк (date, total, rolling, event_share).
+
+        Args:
+            rows (Iterable[Sequence]): Строки результата запроса.
+            window (int): Ширина окна скользящего среднего.
+
+        Returns:
+            KillTrends: Тренды.
+        """
+        trends = cls(window=window)
+        for day, total, rolling, share in rows:
+            trends.dates.append(as_date(day))
+            trends.totals.append(int(total or 0))
+            trends.rolling.append(float(rolling or 0))
+            trends.event_share.append(float(share or 0))
+        return trends
+
+    @property
+    def empty(self) -> bool:
+        """Нет ни одного дня с убийствами."""
+        return not self.dates
+
+    def event_ratio(self) -> Optional[float]:
+        """
+        Возвращает общее отношение ивентовых убийств к обычным за весь период.
+
+        Returns:
+            Optional[float]: Отношение event / simple или None, если обычных убийств нет.
+        """
+        events = sum(total * share for total, share in zip(self.totals, self.event_share))
+        simple = sum(self.totals) - events
+        return events / simple if simple else None
@@ -0,0 +1,415 @@
+"""
+Модуль массового экспорта и импорта сохранений персонажей.
+
+Содержит потоковую выгрузку всех файлов character_<user_id>.json/.xml
+в единый архив (NDJSON или бинарный формат) и обратную загрузку.
+Файлы обрабатываются пулом процессов порциями, поэтому расход памяти
+не зависит от количества игроков.
+
+Архив можно сжать потоковым кодеком (gzip, zlib, zstd), при импорте
+кодек определяется автоматически.
+
+Пример запуска:
+    python archive.py export saves characters.ndjson.gz --compress gzip
+    python archive.py import characters.ndjson.gz saves --sharded
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from exceptions import DataStorageError
+from compression import NONE, available_codecs, open_stream
+from character import Character, guess_value
+from migrations import upgrade
+from data_manager import CHARACTER_TYPES, SAVE_FILE_PATTERN, JSONDataManager, XMLDataManager, ShardedLayout
+BINARY_MAGIC = b'RPGARC1\n'
+BINARY_HEADER = struct.Struct('>I')
+ARCHIVE_FORMATS = ('ndjson', 'binary')
+CHUNK_SIZE = 256
+
+
+@dataclass
+class ArchiveStats:
+    """
+    Итоги экспорта или импорта архива.
+
+    Attributes:
+        records (int): Количество обработанных персонажей.
+        errors (int): Количество записей, которые не удалось обработать.
+        seconds (float): Затраченное время в секундах.
+    """
+    records: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """
+        Возвращает скорость обработки в записях в секунду.
+
+        Returns:
+            float: Количество записей в секунду.
+        """
+        return self.records / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return f'{self.records} записей, {self.errors} ошибок за {self.seconds:.2f} с ({self.rate:.0f} записей/с)'
+
+
+def iter_save_files(directory: str) -> Iterator[Tuple[int, str, str]]:
+    """
+    Лениво перечисляет файлы сохранений в каталоге.
+
+    Если каталог является корнем ShardedLayout, файлы перечисляются по индексу.
+
+    Args:
+        directory (str): Каталог с файлами character_<user_id>.json/.xml.
+
+    Yields:
+        Tuple[int, str, str]: ID пользователя, формат ('json' или 'xml') и путь к файлу.
+    """
+    if os.path.exists(os.path.join(directory, ShardedLayout.INDEX_FILENAME)):
+        layout = ShardedLayout(directory)
+        try:
+            for entry in layout.entries():
+                if entry['format'] in ('json', 'xml') and entry['user_id'].isdigit():
+                    yield int(entry['user_id']), entry['format'], entry['path']
+        finally:
+            layout.close()
+        return
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = SAVE_FILE_PATTERN.match(entry.name)
+            if match and entry.is_file():
+                yield int(match.group(1)), match.group(2), entry.path
+
+
+def read_xml_save(path: str) -> Dict[str, Any]:
+    """
+    Потоково разбирает XML-сохранение в словарь формата Character.to_dict.
+
+    Использует ET.iterparse и очищает обработанные элементы,
+    чтобы не держать дерево документа в памяти. Сжатые файлы
+    распаковываются на лету.
+
+    Args:
+        path (str): Путь к XML-файлу.
+
+    Returns:
+        Dict[str, Any]: Словарь с данными персонажа.
+    """
+    data: Dict[str, Any] = {'characteristics': {}, 'abilities': []}
+    decoders = Character.field_decoders()
+    with open_stream(path, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == 'Character':
+                    if elem.get('version') is not None:
+                        data['version'] = int(elem.get('version'))
+                    data['type'] = elem.get('type')
+                    data['name'] = elem.get('name')
+                    decoders = CHARACTER_TYPES.get(data['type'], Character).field_decoders()
+                continue
+            if elem.tag == 'Attribute':
+                key = elem.get('name')
+                data['characteristics'][key] = decoders.get(key, guess_value)(elem.text)
+                elem.clear()
+            elif elem.tag == 'Ability':
+                data['abilities'].append(elem.text)
+                elem.clear()
+    return data
+
+
+def _export_chunk(chunk: List[Tuple[int, str, str]]) -> Tuple[List[str], int]:
+    """
+    Читает порцию файлов сохранений в дочернем процессе.
+
+    Args:
+        chunk (List[Tuple[int, str, str]]): Порция из iter_save_files.
+
+    Returns:
+        Tuple[List[str], int]: JSON-строки записей архива и количество ошибок.
+    """
+    lines = []
+    errors = 0
+    for user_id, fmt, path in chunk:
+        try:
+            if fmt == 'xml':
+                character = read_xml_save(path)
+            else:
+                with open_stream(path, 'rb') as f:
+                    character = json.load(f)
+            record = {'user_id': user_id, 'format': fmt, 'character': upgrade(character)[0]}
+            lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        except Exception as e:
+            print(f"Ошибка при экспорте {path}: {e}")
+            errors += 1
+    return lines, errors
+
+
+def _import_chunk(job: Tuple[List[str], str, Optional[str], bool]) -> Tuple[List[str], int]:
+    """
+    Записывает порцию записей архива в файлы сохранений в дочернем процессе.
+
+    Индекс раскладки дочерние процессы не трогают: имена записанных файлов
+    возвращаются в родительский процесс, который и обновляет индекс.
+
+    Args:
+        job (Tuple[List[str], str, Optional[str], bool]): JSON-строки записей, целевой каталог,
+            формат файлов (None - формат исходного файла) и признак раскладки по подкаталогам.
+
+    Returns:
+        Tuple[List[str], int]: Имена записанных файлов и количество ошибок.
+    """
+    lines, directory, fmt, sharded = job
+    layout = ShardedLayout(directory) if sharded else None
+    managers = {'json': JSONDataManager(), 'xml': XMLDataManager()}
+    written = []
+    errors = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+            char_dict, _ = upgrade(record['character'])
+            char_type = char_dict.get('type')
+            if char_type not in CHARACTER_TYPES:
+                raise DataStorageError(f"Неизвестный тип персонажа: {char_type}")
+            character = CHARACTER_TYPES[char_type].from_dict(char_dict)
+            target_fmt = fmt or record.get('format', 'json')
+            filename = f"character_{record['user_id']}.{target_fmt}"
+            if layout is not None:
+                path = layout.path_for(filename)
+                layout.ensure_dir(path)
+            else:
+                path = os.path.join(directory, filename)
+            managers[target_fmt].create(character, path)
+            written.append(filename)
+        except Exception as e:
+            print(f"Ошибка при импорте записи: {e}")
+            errors += 1
+    return written, errors
+
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Разбивает итерируемый объект на списки фиксированного размера.
+
+    Args:
+        items (Iterable[Any]): Исходная последовательность.
+        size (int): Размер порции.
+
+    Yields:
+        List[Any]: Очередная порция.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _bounded_map(executor: ProcessPoolExecutor, func, jobs: Iterable[Any], window: int) -> Iterator[Any]:
+    """
+    Аналог executor.map, который держит в работе не более window задач.
+
+    В отличие от executor.map не вычитывает входной итератор целиком,
+    поэтому память остается ограниченной при любом количестве файлов.
+
+    Args:
+        executor (ProcessPoolExecutor): Пул процессов.
+        func: Функция, выполняемая в дочернем процессе.
+        jobs (Iterable[Any]): Аргументы задач.
+        window (int): Максимальное количество задач в работе.
+
+    Yields:
+        Any: Результаты задач в порядке их постановки.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(func, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_records(f, lines: Iterable[str], archive_format: str) -> None:
+    """
+    Дописывает записи в открытый бинарный файл архива.
+
+    Args:
+        f: Файл, открытый в режиме 'wb' или 'ab'.
+        lines (Iterable[str]): JSON-строки записей.
+        archive_format (str): 'ndjson' или 'binary'.
+    """
+    for line in lines:
+        payload = line.encode('utf-8')
+        if archive_format == 'binary':
+            f.write(BINARY_HEADER.pack(len(payload)))
+            f.write(payload)
+        else:
+            f.write(payload)
+            f.write(b'\n')
+
+
+def iter_records(f) -> Iterator[str]:
+    """
+    Лениво читает записи из архива, определяя его формат по сигнатуре.
+
+    Args:
+        f: Буферизованный файл архива, открытый в режиме 'rb'.
+
+    Yields:
+        str: JSON-строка очередной записи.
+
+    Raises:
+        DataStorageError: Если бинарный архив обрезан.
+    """
+    if f.peek(len(BINARY_MAGIC))[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+        f.read(len(BINARY_MAGIC))
+        while True:
+            header = f.read(BINARY_HEADER.size)
+            if not header:
+                return
+            if len(header) < BINARY_HEADER.size:
+                raise DataStorageError("Архив поврежден: неполный заголовок записи.")
+            size, = BINARY_HEADER.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                raise DataStorageError("Архив поврежден: неполная запись.")
+            yield payload.decode('utf-8')
+    else:
+        for raw in f:
+            if raw.strip():
+                yield raw.decode('utf-8')
+
+
+def export_characters(directory: str, archive_path: str, archive_format: str = 'ndjson',
+                      workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                      codec: str = NONE) -> ArchiveStats:
+    """
+    Выгружает все сохранения из каталога в один архив.
+
+    Args:
+        directory (str): Каталог с файлами сохранений.
+        archive_path (str): Путь к создаваемому архиву.
+        archive_format (str): 'ndjson' или 'binary'.
+        workers (Optional[int]): Количество процессов. По умолчанию - число ядер.
+        chunk_size (int): Количество файлов в одной задаче пула.
+        codec (str): Кодек потокового сжатия архива.
+
+    Returns:
+        ArchiveStats: Итоги экспорта.
+
+    Raises:
+        DataStorageError: При неизвестном формате архива или ошибке записи.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise DataStorageError(f"Неизвестный формат архива: {archive_format}")
+    stats = ArchiveStats()
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    try:
+        with open_stream(archive_path, 'wb', codec) as f, ProcessPoolExecutor(max_workers=workers) as executor:
+            if archive_format == 'binary':
+                f.write(BINARY_MAGIC)
+            chunks = _chunked(iter_save_files(directory), chunk_size)
+            for lines, errors in _bounded_map(executor, _export_chunk, chunks, workers * 2):
+                write_records(f, lines, archive_format)
+                stats.records += len(lines)
+                stats.errors += errors
+    except OSError as e:
+        raise DataStorageError(f"Ошибка при экспорте архива: {e}")
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def import_characters(archive_path: str, directory: str, save_format: Optional[str] = None,
+                      workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                      sharded: bool = False) -> ArchiveStats:
+    """
+    Восстанавливает файлы сохранений из архива.
+
+    Args:
+        archive_path (str): Путь к архиву (формат определяется автоматически).
+        directory (str): Каталог для файлов сохранений.
+        save_format (Optional[str]): 'json' или 'xml'. По умолчанию - исходный формат записи.
+        workers (Optional[int]): Количество процессов. По умолчанию - число ядер.
+        chunk_size (int): Количество записей в одной задаче пула.
+        sharded (bool): Раскладывать файлы по подкаталогам ShardedLayout с индексом.
+
+    Returns:
+        ArchiveStats: Итоги импорта.
+
+    Raises:
+        DataStorageError: При ошибке чтения архива.
+    """
+    if save_format not in (None, 'json', 'xml'):
+        raise DataStorageError(f"Неизвестный формат сохранения: {save_format}")
+    stats = ArchiveStats()
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    layout = ShardedLayout(directory) if sharded else None
+    try:
+        with open_stream(archive_path, 'rb') as f, ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = ((chunk, directory, save_format, sharded) for chunk in _chunked(iter_records(f), chunk_size))
+            for written, errors in _bounded_map(executor, _import_chunk, jobs, workers * 2):
+                if layout is not None:
+                    for filename in written:
+                        layout.record(filename)
+                stats.records += len(written)
+                stats.errors += errors
+        if layout is not None:
+            layout.close()
+    except OSError as e:
+        raise DataStorageError(f"Ошибка при импорте архива: {e}")
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main() -> None:
+    """
+    Точка входа командной строки для экспорта и импорта архивов.
+    """
+    parser = argparse.ArgumentParser(description='Массовый экспорт и импорт сохранений персонажей')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Выгрузить сохранения в архив')
+    export_parser.add_argument('directory')
+    export_parser.add_argument('archive')
+    export_parser.add_argument('--format', choices=ARCHIVE_FORMATS, default='ndjson')
+    export_parser.add_argument('--workers', type=int)
+    export_parser.add_argument('--compress', choices=available_codecs(), default=NONE)
+
+    import_parser = subparsers.add_parser('import', help='Загрузить сохранения из архива')
+    import_parser.add_argument('archive')
+    import_parser.add_argument('directory')
+    import_parser.add_argument('--format', choices=('json', 'xml'))
+    import_parser.add_argument('--workers', type=int)
+    import_parser.add_argument('--sharded', action='store_true', help='Разложить файлы по подкаталогам с индексом')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'export':
+            stats = export_characters(args.directory, args.archive, args.format, args.workers,
+                                      codec=args.compress)
+        else:
+            stats = import_characters(args.archive, args.directory, args.format, args.workers,
+                                      sharded=args.sharded)
+        print(stats)
+    except DataStorageError as e:
+        print(f"Ошибка хранения данных: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Модуль автосохранения персонажей.
+
+AutosaveScheduler следит за персонажами активных игроков и раз в interval
+секунд сохраняет тех из них, у кого есть несохраненные изменения (флаг
+Character.dirty), одной пачкой на каждый менеджер через
+DataManager.create_many. Персонаж сохраняется тем менеджером (и в том
+формате), из которого он был загружен. Таким образом прогресс теряется не
+больше чем за interval секунд, а при остановке бота выполняется финальное
+сохранение.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+from character import Character
+from data_manager import DataManager
+
+
+class AutosaveScheduler:
+    """
+    Планировщик пакетного автосохранения измененных персонажей.
+    """
+
+    def __init__(self, manager: DataManager, interval: float = 30.0) -> None:
+        """
+        Инициализирует планировщик автосохранения.
+
+        Args:
+            manager (DataManager): Менеджер по умолчанию, через который сохраняются персонажи.
+            interval (float): Период сохранения в секундах.
+        """
+        self.manager = manager
+        self.interval = interval
+        self.flushes = 0
+        self.saved = 0
+        self._sessions: Dict[str, Tuple[Character, DataManager]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, character: Character, filename: str, manager: Optional[DataManager] = None) -> None:
+        """
+        Начинает следить за персонажем игрока.
+
+        Персонаж, ранее отслеживаемый под тем же именем файла, заменяется.
+
+        Args:
+            character (Character): Объект персонажа.
+            filename (str): Имя файла сохранения.
+            manager (Optional[DataManager]): Менеджер, которым персонаж был загружен;
+                по умолчанию менеджер планировщика.
+        """
+        with self._lock:
+            self._sessions[filename] = (character, manager or self.manager)
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+                self._thread.start()
+
+    def forget(self, filename: str) -> None:
+        """
+        Прекращает следить за персонажем без сохранения.
+
+        Args:
+            filename (str): Имя файла сохранения.
+        """
+        with self._lock:
+            self._sessions.pop(filename, None)
+
+    def dirty(self) -> List[Tuple[Character, str]]:
+        """
+        Возвращает отслеживаемых персонажей с несохраненными изменениями.
+
+        Returns:
+            List[Tuple[Character, str]]: Пары (персонаж, имя файла).
+        """
+        with self._lock:
+            return [(character, filename) for filename, (character, _) in self._sessions.items() if character.dirty]
+
+    def flush(self) -> int:
+        """
+        Сохраняет всех измененных персонажей одной пачкой.
+
+        Флаг dirty снимается до сериализации, поэтому изменение, сделанное во
+        время записи, попадет в следующую пачку. При ошибке записи флаг
+        возвращается, и персонажи будут сохранены при следующей попытке.
+
+        Returns:
+            int: Количество сохраненных персонажей.
+        """
+        with self._flush_lock:
+            batches: Dict[int, Tuple[DataManager, List[Tuple[Character, str]]]] = {}
+            with self._lock:
+                for filename, (character, manager) in self._sessions.items():
+                    if character.dirty:
+                        batches.setdefault(id(manager), (manager, []))[1].append((character, filename))
+            count = 0
+            for manager, batch in batches.values():
+                for character, _ in batch:
+                    character.dirty = False
+                try:
+                    count += manager.create_many(batch)
+                except Exception as e:
+                    print(f"Ошибка при автосохранении: {e}")
+                    for character, _ in batch:
+                        character.mark_dirty()
+            if count:
+                self.flushes += 1
+                self.saved += count
+            return count
+
+    def close(self) -> None:
+        """
+        Останавливает фоновый поток и выполняет финальное сохранение.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        """
+        Цикл фонового потока: сохраняет измененных персонажей раз в interval секунд.
+        """
+        while not self._stop.wait(self.interval):
+            self.flush()
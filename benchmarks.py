@@ -0,0 +1,434 @@
+"""
+Модуль бенчмарков хранения и обработки данных бота.
+
+Каждый бенчмарк запускается отдельной подкомандой и печатает таблицу
+с результатами. Пример запуска:
+    python benchmarks.py storage --sizes 10000 100000 1000000
+    python benchmarks.py xml --count 20000
+    python benchmarks.py compression --count 5000
+    DB_URL=... python benchmarks.py kills --count 5000
+    python benchmarks.py importtime --module rpgmaker --top 15
+    DB_URL=... python benchmarks.py async --count 2000 --concurrency 32
+    python benchmarks.py killsagg --days 365 --repeats 200
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List
+from compression import available_codecs, compress, decompress
+from data_manager import (CHARACTER_TYPES, JSONDataManager, JSONSerializer, SQLiteDataManager, ShardedLayout,
+                          XMLSerializer)
+from druid import Druid
+from hunter import Hunter
+from mage import Mage
+from shaman import Shaman
+
+CLASSES = (Shaman, Druid, Hunter, Mage)
+
+
+def make_characters(count: int) -> List:
+    """
+    Создает набор персонажей для бенчмарков.
+
+    Args:
+        count (int): Количество персонажей.
+
+    Returns:
+        List: Пары (персонаж, имя файла).
+    """
+    items = []
+    for user_id in range(count):
+        character = CLASSES[user_id % len(CLASSES)](f'Герой{user_id}')
+        character.characteristics['exp'] = user_id % 100
+        items.append((character, f'character_{user_id}.json'))
+    return items
+
+
+def timed(func: Callable[[], object]) -> float:
+    """
+    Замеряет время выполнения функции.
+
+    Args:
+        func (Callable[[], object]): Функция без аргументов.
+
+    Returns:
+        float: Время выполнения в секундах.
+    """
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def dir_size(path: str) -> int:
+    """
+    Считает суммарный размер файлов в каталоге.
+
+    Args:
+        path (str): Каталог.
+
+    Returns:
+        int: Размер в байтах.
+    """
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+    return total
+
+
+def print_table(rows: List[Dict[str, object]]) -> None:
+    """
+    Печатает результаты бенчмарка в виде таблицы.
+
+    Args:
+        rows (List[Dict[str, object]]): Строки таблицы с одинаковыми ключами.
+    """
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = {col: max(len(col), *(len(str(row[col])) for row in rows)) for col in columns}
+    print('  '.join(col.ljust(widths[col]) for col in columns))
+    for row in rows:
+        print('  '.join(str(row[col]).ljust(widths[col]) for col in columns))
+
+
+def bench_storage(sizes: List[int], reads: int = 1000) -> None:
+    """
+    Сравнивает JSONDataManager (файл на персонажа) и SQLiteDataManager.
+
+    Args:
+        sizes (List[int]): Количества персонажей.
+        reads (int): Количество случайных чтений.
+    """
+    rows = []
+    for size in sizes:
+        items = make_characters(size)
+        sample = random.sample(range(size), min(reads, size))
+        with tempfile.TemporaryDirectory() as tmp:
+            layout = ShardedLayout(os.path.join(tmp, 'saves'), flush_every=max(size, 1))
+            json_manager = JSONDataManager(layout=layout)
+            write = timed(lambda: json_manager.create_many(items))
+            single = timed(lambda: [json_manager.update(*items[i]) for i in sample])
+            read = timed(lambda: [json_manager.read(items[i][1]) for i in sample])
+            layout.close()
+            rows.append({'backend': 'json', 'characters': size, 'batch writes/s': f'{size / write:.0f}',
+                         'single writes/s': f'{len(sample) / single:.0f}', 'reads/s': f'{len(sample) / read:.0f}',
+                         'disk, МБ': f'{dir_size(layout.root) / 2 ** 20:.1f}'})
+
+            db_dir = os.path.join(tmp, 'sqlite')
+            os.makedirs(db_dir)
+            sqlite_manager = SQLiteDataManager(os.path.join(db_dir, 'characters.db'))
+            write = timed(lambda: [sqlite_manager.create_many(items[i:i + 1000]) for i in range(0, size, 1000)])
+            single = timed(lambda: [sqlite_manager.update(*items[i]) for i in sample])
+            read = timed(lambda: [sqlite_manager.read(items[i][1]) for i in sample])
+            sqlite_manager.close()
+            rows.append({'backend': 'sqlite', 'characters': size, 'batch writes/s': f'{size / write:.0f}',
+                         'single writes/s': f'{len(sample) / single:.0f}', 'reads/s': f'{len(sample) / read:.0f}',
+                         'disk, МБ': f'{dir_size(db_dir) / 2 ** 20:.1f}'})
+    print_table(rows)
+
+
+def legacy_xml_deserialize(data: str):
+    """
+    Прежний разбор XML-сохранения: тип значения угадывается перебором int/float
+    через исключения, способности заменяются заглушками.
+
+    Оставлен только как точка отсчета для бенчмарка xml.
+
+    Args:
+        data (str): XML-строка с данными персонажа.
+
+    Returns:
+        Character: Объект персонажа.
+    """
+    root = ET.fromstring(data)
+    char_type = root.get("type")
+    instance = CHARACTER_TYPES[char_type].__new__(CHARACTER_TYPES[char_type])
+    instance.name = root.get("name")
+    characteristics = {}
+    for attr_elem in root.find("Characteristics").findall("Attribute"):
+        val_text = attr_elem.text
+        try:
+            val = int(val_text)
+        except ValueError:
+            try:
+                val = float(val_text)
+            except ValueError:
+                val = val_text
+        characteristics[attr_elem.get("name")] = val
+    instance.characteristics = characteristics
+    instance.abilities = {ability_elem.text: lambda s: None
+                          for ability_elem in root.find("Abilities").findall("Ability")}
+    return instance
+
+
+def bench_xml(count: int) -> None:
+    """
+    Сравнивает прежний и схемный разбор XML-сохранений, а также разбор JSON.
+
+    Args:
+        count (int): Количество разбираемых сохранений.
+    """
+    xml_serializer = XMLSerializer()
+    json_serializer = JSONSerializer()
+    items = make_characters(count)
+    xml_docs = [xml_serializer.serialize(character) for character, _ in items]
+    json_docs = [json_serializer.serialize(character) for character, _ in items]
+    rows = []
+    for name, func, docs in (('xml (прежний)', legacy_xml_deserialize, xml_docs),
+                             ('xml (схема)', xml_serializer.deserialize, xml_docs),
+                             ('json (схема)', json_serializer.deserialize, json_docs)):
+        seconds = timed(lambda: [func(doc) for doc in docs])
+        rows.append({'decoder': name, 'documents': count, 'docs/s': f'{count / seconds:.0f}',
+                     'мкс/doc': f'{seconds / count * 1e6:.1f}'})
+    print_table(rows)
+
+
+def bench_compression(count: int) -> None:
+    """
+    Сравнивает размер сохранения на диске и затраты CPU на сжатие и распаковку.
+
+    Args:
+        count (int): Количество сохранений каждого формата.
+    """
+    items = make_characters(count)
+    docs = {
+        'json': [JSONSerializer().serialize(character).encode('utf-8') for character, _ in items],
+        'xml': [XMLSerializer().serialize(character).encode('utf-8') for character, _ in items],
+    }
+    rows = []
+    for fmt, payloads in docs.items():
+        raw_size = sum(len(payload) for payload in payloads)
+        for codec in available_codecs():
+            packed = []
+            pack = timed(lambda: packed.extend(compress(payload, codec) for payload in payloads))
+            unpack = timed(lambda: [decompress(payload) for payload in packed])
+            size = sum(len(payload) for payload in packed)
+            rows.append({'format': fmt, 'codec': codec, 'байт/save': f'{size / count:.0f}',
+                         'ratio': f'{raw_size / size:.2f}', 'сжатие, мкс': f'{pack / count * 1e6:.1f}',
+                         'распаковка, мкс': f'{unpack / count * 1e6:.1f}'})
+    print_table(rows)
+
+
+def bench_kills(count: int, batch_size: int) -> None:
+    """
+    Сравнивает запись убийств по одной строке (save_kill) и пачками (KillWriter).
+
+    Используется БД из DB_URL. Строки бенчмарка пишутся с player_id=-1
+    и удаляются после замера, после чего дневная сводка пересчитывается.
+
+    Args:
+        count (int): Количество убийств для каждого способа.
+        batch_size (int): Размер пачки KillWriter.
+    """
+    from database import KillsSaver, SessionLocal, init_db
+    from db_utils import KillWriter, rebuild_daily_rollup, save_kill
+    init_db()
+    rows = []
+    try:
+        seconds = timed(lambda: [save_kill(-1, 'simple') for _ in range(count)])
+        rows.append({'writer': 'save_kill', 'kills': count, 'kills/s': f'{count / seconds:.0f}',
+                     'мкс/kill': f'{seconds / count * 1e6:.1f}'})
+        writer = KillWriter(batch_size=batch_size)
+
+        def write_batched():
+            for _ in range(count):
+                writer.add(-1, 'simple')
+            writer.close()
+
+        seconds = timed(write_batched)
+        rows.append({'writer': f'KillWriter({batch_size})', 'kills': count, 'kills/s': f'{count / seconds:.0f}',
+                     'мкс/kill': f'{seconds / count * 1e6:.1f}'})
+    finally:
+        session = SessionLocal()
+        session.query(KillsSaver).filter(KillsSaver.player_id == -1).delete()
+        session.commit()
+        session.close()
+        rebuild_daily_rollup()
+    print_table(rows)
+
+
+def bench_importtime(module: str, top: int, repeats: int) -> None:
+    """
+    Замеряет время импорта модуля в чистом интерпретаторе через python -X importtime.
+
+    Переменная DB_URL не передается дочернему процессу: импорт не должен
+    требовать подключения к базе данных.
+
+    Args:
+        module (str): Имя импортируемого модуля.
+        top (int): Сколько самых долгих модулей показать.
+        repeats (int): Количество запусков; в таблицу попадает лучший.
+    """
+    env = {key: value for key, value in os.environ.items() if key != 'DB_URL'}
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            print(result.stderr.splitlines()[-1] if result.stderr else f'Ошибка импорта {module}')
+            return
+        timings = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+            timings[name] = (int(self_us), int(cumulative_us))
+        total = timings.get(module, (0, 0))[1]
+        if best is None or total < best[0]:
+            best = (total, timings)
+    total, timings = best
+    heavy = [name for name in ('sqlalchemy', 'pandas', 'matplotlib', 'telebot') if name in timings]
+    print(f"{module}: {total / 1000:.1f} мс, загружено тяжелых пакетов: {', '.join(heavy) or 'нет'}")
+    rows = [{'module': name, 'cumulative, мс': f'{cumulative / 1000:.1f}', 'self, мс': f'{own / 1000:.1f}'}
+            for name, (own, cumulative) in sorted(timings.items(), key=lambda item: -item[1][1])[:top]]
+    print_table(rows)
+
+
+def bench_async(count: int, concurrency: int) -> None:
+    """
+    Сравнивает конкурентную запись и чтение убийств: синхронный путь в пуле
+    потоков против асинхронного движка в одном цикле событий.
+
+    Используется БД из DB_URL; для асинхронного пути нужен драйвер
+    (aiosqlite для SQLite, asyncpg для PostgreSQL). Строки бенчмарка пишутся
+    с player_id=-1 и удаляются после замера.
+
+    Args:
+        count (int): Количество операций каждого вида.
+        concurrency (int): Количество одновременных операций.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from database import KillsSaver, SessionLocal, init_db
+    from db_async import close_async_db, get_kills_async, init_async_db, save_kill_async
+    from db_utils import get_kills, rebuild_daily_rollup, save_kill
+    init_db()
+
+    async def run_async(func, *args):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await func(*args)
+
+        await init_async_db()
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(count)))
+            return time.perf_counter() - started
+        finally:
+            await close_async_db()
+
+    rows = []
+    try:
+        for name, sync_func, async_func, args in (('save_kill', save_kill, save_kill_async, (-1, 'simple')),
+                                                  ('get_kills', get_kills, get_kills_async, (-1,))):
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                seconds = timed(lambda: list(pool.map(lambda _: sync_func(*args), range(count))))
+            rows.append({'operation': name, 'path': f'sync, {concurrency} потоков', 'ops/s': f'{count / seconds:.0f}'})
+            seconds = asyncio.run(run_async(async_func, *args))
+            rows.append({'operation': name, 'path': f'async, {concurrency} задач', 'ops/s': f'{count / seconds:.0f}'})
+    finally:
+        session = SessionLocal()
+        session.query(KillsSaver).filter(KillsSaver.player_id == -1).delete()
+        session.commit()
+        session.close()
+        rebuild_daily_rollup()
+    print_table(rows)
+
+
+def bench_kills_aggregation(days: int, repeats: int) -> None:
+    """
+    Сравнивает get_kills (pivot в pandas) и get_kills_series (условная агрегация в SQL).
+
+    Сводка kills_daily заполняется во временной базе SQLite на days дней.
+
+    Args:
+        days (int): Количество дней в сводке.
+        repeats (int): Количество запросов каждого вида.
+    """
+    import database
+    from datetime import date, timedelta
+    from database import KillsDaily, SessionLocal
+    from db_utils import get_kills, get_kills_series
+    with tempfile.TemporaryDirectory() as tmp:
+        database.init_db(f"sqlite:///{os.path.join(tmp, 'kills.db')}")
+        session = SessionLocal()
+        first = date(2024, 1, 1)
+        session.add_all(KillsDaily(date=first + timedelta(days=day), mob_type=mob_type, count=random.randint(0, 500))
+                        for day in range(days) for mob_type in ('simple', 'event'))
+        session.commit()
+        session.close()
+        started = time.perf_counter()
+        import pandas  # noqa: F401
+        pandas_import = time.perf_counter() - started
+        rows = []
+        for name, func in (('get_kills (pandas)', get_kills), ('get_kills_series', get_kills_series)):
+            seconds = timed(lambda: [func() for _ in range(repeats)])
+            rows.append({'path': name, 'days': days, 'мс/запрос': f'{seconds / repeats * 1000:.2f}'})
+        database.ScopedSession.remove()
+        database.engine.dispose()
+    print(f"Импорт pandas (однократно для get_kills): {pandas_import * 1000:.0f} мс")
+    print_table(rows)
+
+
+def main() -> None:
+    """
+    Точка входа командной строки бенчмарков.
+    """
+    parser = argparse.ArgumentParser(description='Бенчмарки RPG-бота')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    storage_parser = subparsers.add_parser('storage', help='JSON-файлы против SQLite')
+    storage_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    storage_parser.add_argument('--reads', type=int, default=1000)
+
+    xml_parser = subparsers.add_parser('xml', help='Разбор XML-сохранений до и после схемы полей')
+    xml_parser.add_argument('--count', type=int, default=20000)
+
+    compression_parser = subparsers.add_parser('compression', help='Размер и CPU сжатия сохранений')
+    compression_parser.add_argument('--count', type=int, default=5000)
+
+    kills_parser = subparsers.add_parser('kills', help='Запись убийств по одной и пачками')
+    kills_parser.add_argument('--count', type=int, default=5000)
+    kills_parser.add_argument('--batch-size', type=int, default=500)
+
+    importtime_parser = subparsers.add_parser('importtime', help='Время импорта модуля (python -X importtime)')
+    importtime_parser.add_argument('--module', default='rpgmaker')
+    importtime_parser.add_argument('--top', type=int, default=15)
+    importtime_parser.add_argument('--repeats', type=int, default=3)
+
+    async_parser = subparsers.add_parser('async', help='Синхронный и асинхронный доступ к убийствам под нагрузкой')
+    async_parser.add_argument('--count', type=int, default=2000)
+    async_parser.add_argument('--concurrency', type=int, default=32)
+
+    killsagg_parser = subparsers.add_parser('killsagg', help='Агрегация убийств: pandas против SQL')
+    killsagg_parser.add_argument('--days', type=int, default=365)
+    killsagg_parser.add_argument('--repeats', type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == 'storage':
+        bench_storage(args.sizes, args.reads)
+    elif args.command == 'xml':
+        bench_xml(args.count)
+    elif args.command == 'compression':
+        bench_compression(args.count)
+    elif args.command == 'kills':
+        bench_kills(args.count, args.batch_size)
+    elif args.command == 'importtime':
+        bench_importtime(args.module, args.top, args.repeats)
+    elif args.command == 'async':
+        bench_async(args.count, args.concurrency)
+    elif args.command == 'killsagg':
+        bench_kills_aggregation(args.days, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
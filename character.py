@@ -6,8 +6,56 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 import random
+import re
+from migrations import SAVE_FORMAT_VERSION
+
+INT_PATTERN = re.compile(r'^[+-]?\d+$')
+FLOAT_PATTERN = re.compile(r'^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$')
+
+
+def parse_bool(text: str) -> bool:
+    """
+    Разбирает булево значение, записанное через str(bool).
+
+    Args:
+        text (str): Текстовое значение.
+
+    Returns:
+        bool: True только для строки 'True'.
+    """
+    return text == 'True'
+
+
+def guess_value(text: Optional[str]) -> Any:
+    """
+    Определяет тип значения поля, которого нет в схеме класса.
+
+    Тип выбирается по регулярным выражениям, без перебора int/float
+    через исключения.
+
+    Args:
+        text (Optional[str]): Текстовое значение.
+
+    Returns:
+        Any: Значение типа int, float или str.
+    """
+    if text is None:
+        return ''
+    if INT_PATTERN.match(text):
+        return int(text)
+    if FLOAT_PATTERN.match(text):
+        return float(text)
+    return text
+
+
+FIELD_DECODERS: Dict[type, Callable[[str], Any]] = {
+    int: int,
+    float: float,
+    bool: parse_bool,
+    str: str,
+}
 
 
 class Character(ABC):
@@ -16,8 +64,31 @@ class Character(ABC):
 
     Определяет общие характеристики, методы боя, повышения уровня
     и управления состоянием персонажа.
+
+    Attributes:
+        SCHEMA (Dict[str, type]): Типы характеристик персонажа, по которым
+            сериализаторы восстанавливают значения при загрузке.
+        dirty (bool): Есть ли у персонажа изменения, которые еще не сохранены
+            планировщиком автосохранения.
+        journal_generation (int): Поколение снимка разностных сохранений; записи
+            журнала другого поколения при чтении пропускаются.
     """
 
+    SCHEMA: Dict[str, type] = {
+        'max_health': int,
+        'health': int,
+        'power': int,
+        'exp': int,
+        'lvl': int,
+        'crit_chance': int,
+        'def_chance': int,
+        'coefficient': float,
+        'initiative': bool,
+    }
+
+    dirty: bool = False
+    journal_generation: int = 0
+
     def __init__(self, name: str, lvl: int) -> None:
         """
         Инициализирует экземпляр класса Character.
@@ -104,6 +175,7 @@ class Character(ABC):
                 self.characteristics['def_chance'] += 2
                 self.characteristics['exp'] -= 100
                 self.characteristics['health'] = self.characteristics['max_health']
+                self.mark_dirty()
                 return 'Поздравляю, герой, ты стал еще сильнее!'
             else:
                 return 'Герой, ты уже слишком силен'
@@ -120,9 +192,62 @@ class Character(ABC):
         """
         try:
             self.characteristics['exp'] += exp_amount
+            self.mark_dirty()
         except Exception as e:
             print(f"Ошибка при получении опыта: {e}")
 
+    def mark_dirty(self) -> None:
+        """
+        Отмечает, что прогресс персонажа изменился и его нужно сохранить.
+        """
+        self.dirty = True
+
+    def buff(self, ability: str, field: str, value: Any) -> None:
+        """
+        Меняет характеристику действием способности и запоминает прибавку.
+
+        Прибавки активных способностей не попадают в сохранения: to_dict
+        отдает характеристики без них.
+
+        Args:
+            ability (str): Название способности.
+            field (str): Имя характеристики.
+            value (Any): Новое значение характеристики.
+        """
+        buffs = self.__dict__.setdefault('buffs', {})
+        deltas = buffs.setdefault(ability, {})
+        deltas[field] = deltas.get(field, 0) + value - self.characteristics[field]
+        self.characteristics[field] = value
+
+    def unbuff(self, ability: str, field: str, value: Any) -> None:
+        """
+        Меняет характеристику при отключении способности и забывает ее прибавку.
+
+        Args:
+            ability (str): Название способности.
+            field (str): Имя характеристики.
+            value (Any): Новое значение характеристики.
+        """
+        self.characteristics[field] = value
+        deltas = self.__dict__.get('buffs', {}).get(ability)
+        if deltas is not None:
+            deltas.pop(field, None)
+            if not deltas:
+                del self.buffs[ability]
+
+    def base_characteristics(self) -> Dict[str, Any]:
+        """
+        Возвращает характеристики без прибавок активных способностей.
+
+        Returns:
+            Dict[str, Any]: Копия характеристик для сохранения.
+        """
+        characteristics = self.characteristics.copy()
+        for deltas in self.__dict__.get('buffs', {}).values():
+            for field, delta in deltas.items():
+                characteristics[field] -= delta
+        return characteristics
+
     def reset(self) -> None:
         """
         Сбрасывает состояние персонажа к начальному для нового боя.
@@ -139,15 +264,66 @@ class Character(ABC):
         """
         Преобразует объект персонажа в словарь.
 
+        Характеристики сохраняются без прибавок активных способностей, поле
+        generation добавляется только для снимков разностных сохранений.
+
         Returns:
-            Dict[str, Any]: Словарь с данными персонажа.
+            Dict[str, Any]: Словарь с данными персонажа и версией формата сохранения.
         """
-        return {
+        data = {
+            'version': SAVE_FORMAT_VERSION,
             'type': self.__class__.__name__,
             'name': self.name,
-            'characteristics': self.characteristics.copy(),
+            'characteristics': self.base_characteristics(),
             'abilities': list(self.abilities.keys())
         }
+        if self.journal_generation:
+            data['generation'] = self.journal_generation
+        return data
+
+    @classmethod
+    def field_decoders(cls) -> Dict[str, Callable[[str], Any]]:
+        """
+        Возвращает функции разбора текстовых значений характеристик класса.
+
+        Словарь строится один раз для каждого класса по его SCHEMA.
+
+        Returns:
+            Dict[str, Callable[[str], Any]]: Функции разбора по имени характеристики.
+        """
+        decoders = cls.__dict__.get('_field_decoders')
+        if decoders is None:
+            decoders = {name: FIELD_DECODERS[field_type] for name, field_type in cls.SCHEMA.items()}
+            cls._field_decoders = decoders
+        return decoders
+
+    @classmethod
+    def coerce_characteristics(cls, characteristics: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Приводит значения характеристик к типам из SCHEMA.
+
+        Используется для уже типизированных форматов (JSON), где меняются
+        только значения с неверным типом, например 10.0 вместо 10.
+
+        Args:
+            characteristics (Dict[str, Any]): Характеристики персонажа.
+
+        Returns:
+            Dict[str, Any]: Тот же словарь с исправленными типами.
+
+        Raises:
+            ValueError: Если целочисленная характеристика имеет дробное значение, например 10.5.
+        """
+        for name, field_type in cls.SCHEMA.items():
+            value = characteristics.get(name)
+            if value is not None and type(value) is not field_type:
+                if isinstance(value, str):
+                    characteristics[name] = cls.field_decoders()[name](value)
+                elif field_type is int and isinstance(value, float) and not value.is_integer():
+                    raise ValueError(f"Характеристика {name} должна быть целым числом: {value}")
+                else:
+                    characteristics[name] = field_type(value)
+        return characteristics
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Character':
@@ -0,0 +1,402 @@
+"""
+Модуль кеширования графиков статистики.
+
+ChartCache хранит последний построенный PNG вместе с версией данных,
+по которым он построен. Пока версия не меняется, график не перестраивается;
+одновременные запросы одной версии ждут одно общее построение. Для уже
+отправленной версии запоминается file_id Telegram, и следующие отправки
+ссылаются на загруженный файл вместо повторной загрузки PNG.
+
+Графики строятся через объектный API matplotlib (Figure и FigureCanvasAgg)
+без глобального состояния pyplot, а ChartRenderer выносит построение в
+отдельные процессы, чтобы не держать GIL потоков бота.
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+KILLS_COLORS = ('#1f77b4', '#ff7f0e')
+
+
+def chart_columns(data) -> Tuple[List[str], Dict[str, Sequence[int]]]:
+    """
+    Возвращает подписи дат и столбцы графика.
+
+    Args:
+        data: KillsSeries (колоночный ряд из analytics) или DataFrame из get_kills.
+
+    Returns:
+        Tuple[List[str], Dict[str, Sequence[int]]]: Подписи оси X и значения по типам монстров.
+    """
+    if hasattr(data, 'counts') and hasattr(data, 'dates'):
+        return [value.isoformat() for value in data.dates], dict(data.counts)
+    return [str(label) for label in data.index], {str(column): data[column] for column in data.columns}
+
+
+def render_kills_chart(data, title: str = 'Убийства монстров по дням') -> bytes:
+    """
+    Строит столбчатый график убийств по дням и возвращает его как PNG.
+
+    Args:
+        data: KillsSeries или DataFrame из get_kills (индекс - даты, колонки - типы монстров).
+        title (str): Заголовок графика.
+
+    Returns:
+        bytes: PNG-изображение графика.
+    """
+    from matplotlib.figure import Figure
+    if data.empty:
+        fig = _empty_figure()
+    else:
+        labels, columns = chart_columns(data)
+        fig = Figure(figsize=(12, 6))
+        ax = fig.add_subplot()
+        width = 0.8 / len(columns)
+        positions = range(len(labels))
+        for number, (column, values) in enumerate(columns.items()):
+            ax.bar([x - 0.4 + width * (number + 0.5) for x in positions], list(values), width,
+                   label=column, color=KILLS_COLORS[number % len(KILLS_COLORS)])
+        ax.set_xticks(list(positions))
+        ax.set_xticklabels(labels, rotation=45)
+        ax.set_title(title)
+        ax.set_xlabel('Дата')
+        ax.set_ylabel('Количество')
+        ax.legend(title='mob_type')
+        fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_hour_heatmap(heatmap, title: str = 'Убийства по дням недели и часам (UTC)') -> bytes:
+    """
+    Строит тепловую карту убийств по дню недели и часу и возвращает ее как PNG.
+
+    Args:
+        heatmap (HourHeatmap): Результат get_hour_heatmap.
+        title (str): Заголовок графика.
+
+    Returns:
+        bytes: PNG-изображение графика.
+    """
+    from matplotlib.figure import Figure
+    from analytics import WEEKDAYS
+    if heatmap.empty:
+        return _to_png(_empty_figure())
+    order = [1, 2, 3, 4, 5, 6, 0]
+    fig = Figure(figsize=(12, 4))
+    ax = fig.add_subplot()
+    image = ax.imshow([list(heatmap.counts[day]) for day in order], aspect='auto', cmap='YlOrRd')
+    ax.set_xticks(range(24))
+    ax.set_yticks(range(len(order)))
+    ax.set_yticklabels([WEEKDAYS[day] for day in order])
+    ax.set_title(title)
+    ax.set_xlabel('Час')
+    fig.colorbar(image, ax=ax, label='Количество')
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def render_trends_chart(trends, title: str = 'Убийства по дням и скользящее среднее') -> bytes:
+    """
+    Строит график дневных итогов со скользящим средним и долей ивентовых
+    убийств и возвращает его как PNG.
+
+    Args:
+        trends (KillTrends): Результат get_kill_trends.
+        title (str): Заголовок графика.
+
+    Returns:
+        bytes: PNG-изображение графика.
+    """
+    from matplotlib.figure import Figure
+    if trends.empty:
+        return _to_png(_empty_figure())
+    labels = [day.strftime('%Y-%m-%d') for day in trends.dates]
+    positions = list(range(len(labels)))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    ax.bar(positions, list(trends.totals), 0.8, color=KILLS_COLORS[0], alpha=0.5, label='за день')
+    ax.plot(positions, list(trends.rolling), color=KILLS_COLORS[0], label=f'среднее за {trends.window} дн.')
+    share_ax = ax.twinx()
+    share_ax.plot(positions, [share * 100 for share in trends.event_share], color=KILLS_COLORS[1],
+                  linestyle='--', label='ивентовые, %')
+    share_ax.set_ylim(0, 100)
+    share_ax.set_ylabel('Доля ивентовых, %')
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels, rotation=45)
+    ax.set_title(title)
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Количество')
+    handles, names = ax.get_legend_handles_labels()
+    share_handles, share_names = share_ax.get_legend_handles_labels()
+    ax.legend(handles + share_handles, names + share_names, loc='upper left')
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def _empty_figure():
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.text(0.5, 0.5, 'Нет данных об убийствах', horizontalalignment='center', verticalalignment='center')
+    ax.axis('off')
+    return fig
+
+
+def _to_png(fig) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def _init_render_worker() -> None:
+    """
+    Настраивает процесс построения графиков на неинтерактивный backend Agg.
+    """
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def _pool_processes(executor: ProcessPoolExecutor) -> list:
+    """
+    Возвращает процессы пула, чтобы их можно было завершить.
+
+    У ProcessPoolExecutor нет публичного способа остановить уже идущую задачу,
+    поэтому используется закрытый атрибут _processes: в CPython 3.9-3.13 это
+    словарь pid -> Process, пустой до запуска процессов и None после shutdown.
+
+    Args:
+        executor (ProcessPoolExecutor): Пул процессов.
+
+    Returns:
+        list: Процессы пула.
+    """
+    return list((getattr(executor, '_processes', None) or {}).values())
+
+
+class ChartRenderer:
+    """
+    Пул процессов для построения графиков с ограничением времени.
+
+    Процессы запускаются методом spawn, чтобы не наследовать потоки и
+    соединения бота. Отмена Future не останавливает уже идущее построение,
+    поэтому по таймауту пул останавливается, его процессы завершаются, а
+    следующий график запускает новый пул.
+    """
+
+    def __init__(self, workers: int = 1, timeout: float = 30.0) -> None:
+        """
+        Инициализирует пул построения графиков. Процессы запускаются при первом графике.
+
+        Args:
+            workers (int): Количество процессов.
+            timeout (float): Сколько секунд ждать построения одного графика.
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def render(self, func: Callable[..., bytes], *args) -> bytes:
+        """
+        Строит график в отдельном процессе.
+
+        Args:
+            func (Callable[..., bytes]): Функция построения уровня модуля.
+            *args: Аргументы функции; должны сериализоваться pickle.
+
+        Returns:
+            bytes: PNG-изображение.
+
+        Raises:
+            TimeoutError: Если график не построен за timeout секунд.
+            BrokenProcessPool: Если процесс построения упал и повтор в новом пуле тоже не удался.
+            CancelledError: Если построение дважды отменено остановкой пула.
+        """
+        for attempt in range(2):
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_render_worker,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                executor = self._executor
+            try:
+                try:
+                    future = executor.submit(func, *args)
+                except RuntimeError as e:
+                    raise BrokenProcessPool(str(e)) from e
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                self._terminate(executor)
+                raise TimeoutError(f"График не построен за {self.timeout} с")
+            except (BrokenProcessPool, CancelledError):
+                # Пул остановлен по таймауту другого графика: один раз повторяем в новом пуле.
+                self._terminate(executor)
+                if attempt:
+                    raise
+
+    def _terminate(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Останавливает зависший пул и завершает его процессы.
+
+        Args:
+            executor (ProcessPoolExecutor): Пул, в котором построение не уложилось в таймаут.
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        processes = _pool_processes(executor)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=1)
+
+    def close(self) -> None:
+        """
+        Останавливает процессы построения графиков.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ChartCache:
+    """
+    Кеш PNG-графика, привязанный к версии данных.
+    """
+
+    def __init__(self, render: Callable[[], bytes], version: Callable[[], Hashable], ttl: float = 0.0) -> None:
+        """
+        Инициализирует кеш графика.
+
+        Args:
+            render (Callable[[], bytes]): Функция построения PNG.
+            version (Callable[[], Hashable]): Функция получения текущей версии данных.
+            ttl (float): Сколько секунд отдавать построенный график без проверки
+                версии данных. 0 - проверять версию при каждом запросе.
+        """
+        self.render = render
+        self.version = version
+        self.ttl = ttl
+        self.hits = 0
+        self.renders = 0
+        self._lock = threading.Lock()
+        self._cached: Optional[Tuple[Hashable, bytes, float]] = None
+        self._inflight: Dict[Hashable, Future] = {}
+        self._file_id: Optional[Tuple[Hashable, str]] = None
+
+    def get(self) -> Tuple[Hashable, bytes]:
+        """
+        Возвращает актуальный график, при необходимости строя его.
+
+        Returns:
+            Tuple[Hashable, bytes]: Версия данных и PNG-байты графика.
+
+        Raises:
+            Exception: Ошибка функции построения передается всем ожидающим потокам.
+        """
+        with self._lock:
+            cached = self._cached
+        if cached is not None and self.ttl > 0 and time.monotonic() - cached[2] < self.ttl:
+            self.hits += 1
+            return cached[0], cached[1]
+        version = self.version()
+        with self._lock:
+            cached = self._cached
+            if cached is not None and cached[0] == version:
+                self._cached = (version, cached[1], time.monotonic())
+                self.hits += 1
+                return version, cached[1]
+            future = self._inflight.get(version)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[version] = future
+        if not owner:
+            return version, future.result()
+        try:
+            png = self.render()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(png)
+            self.renders += 1
+            with self._lock:
+                self._cached = (version, png, time.monotonic())
+            return version, png
+        finally:
+            with self._lock:
+                self._inflight.pop(version, None)
+
+    def file_id(self, version: Hashable) -> Optional[str]:
+        """
+        Возвращает file_id Telegram для графика указанной версии.
+
+        Args:
+            version (Hashable): Версия данных.
+
+        Returns:
+            Optional[str]: file_id или None, если эта версия еще не отправлялась.
+        """
+        with self._lock:
+            if self._file_id is not None and self._file_id[0] == version:
+                return self._file_id[1]
+            return None
+
+    def remember_file_id(self, version: Hashable, file_id: Optional[str]) -> None:
+        """
+        Запоминает file_id Telegram для графика указанной версии.
+
+        Args:
+            version (Hashable): Версия данных.
+            file_id (Optional[str]): file_id загруженной фотографии; None сбрасывает запись.
+        """
+        with self._lock:
+            self._file_id = (version, file_id) if file_id else None
+
+    def invalidate(self) -> None:
+        """
+        Сбрасывает построенный график и его file_id.
+        """
+        with self._lock:
+            self._cached = None
+            self._file_id = None
+
+
+def send_chart(bot, chat_id: int, cache: ChartCache, caption: Optional[str] = None):
+    """
+    Отправляет актуальный график в чат.
+
+    Если текущая версия графика уже загружалась в Telegram, фотография
+    отправляется по file_id. Если Telegram отклонил file_id, график
+    загружается заново.
+
+    Args:
+        bot: Экземпляр TeleBot.
+        chat_id (int): ID чата.
+        cache (ChartCache): Кеш графика.
+        caption (Optional[str]): Подпись к фотографии.
+
+    Returns:
+        Message: Отправленное сообщение.
+    """
+    version, png = cache.get()
+    file_id = cache.file_id(version)
+    if file_id is not None:
+        try:
+            return bot.send_photo(chat_id, file_id, caption=caption)
+        except Exception as e:
+            print(f"Ошибка отправки графика по file_id, загружаем заново: {e}")
+            cache.remember_file_id(version, None)
+    message = bot.send_photo(chat_id, png, caption=caption)
+    if getattr(message, 'photo', None):
+        cache.remember_file_id(version, message.photo[-1].file_id)
+    return message
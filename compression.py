@@ -0,0 +1,223 @@
+"""
+Модуль сжатия сохранений и архивов.
+
+Поддерживает кодеки gzip и zlib из стандартной библиотеки и zstd, если
+установлен пакет zstandard. Кодек сжатых данных определяется по сигнатуре,
+поэтому несжатые сохранения старого формата читаются без изменений.
+"""
+
+import io
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+from exceptions import DataStorageError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NONE = 'none'
+GZIP = 'gzip'
+ZLIB = 'zlib'
+ZSTD = 'zstd'
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+GZIP_MAGIC = b'\x1f\x8b'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _zlib_codec(wbits: int, level: int) -> Tuple[Callable[[], object], Callable[[], object]]:
+    """
+    Возвращает фабрики потоковых компрессора и декомпрессора zlib.
+
+    Args:
+        wbits (int): Параметр wbits zlib (31 - формат gzip, 15 - формат zlib).
+        level (int): Уровень сжатия.
+
+    Returns:
+        Tuple[Callable[[], object], Callable[[], object]]: Фабрики compressobj и decompressobj.
+    """
+    return (lambda: zlib.compressobj(level, zlib.DEFLATED, wbits),
+            lambda: zlib.decompressobj(wbits))
+
+
+CODECS: Dict[str, Tuple[Callable[[], object], Callable[[], object]]] = {
+    GZIP: _zlib_codec(31, 6),
+    ZLIB: _zlib_codec(15, 6),
+}
+if zstandard is not None:
+    CODECS[ZSTD] = (lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+                    lambda: zstandard.ZstdDecompressor().decompressobj())
+
+
+def available_codecs() -> Tuple[str, ...]:
+    """
+    Возвращает доступные кодеки.
+
+    Returns:
+        Tuple[str, ...]: Имена кодеков, включая 'none'.
+    """
+    return (NONE, *CODECS)
+
+
+def check_codec(codec: str) -> str:
+    """
+    Проверяет, что кодек доступен.
+
+    Args:
+        codec (str): Имя кодека.
+
+    Returns:
+        str: То же имя кодека.
+
+    Raises:
+        DataStorageError: Если кодек неизвестен или для него не установлена библиотека.
+    """
+    if codec != NONE and codec not in CODECS:
+        if codec == ZSTD:
+            raise DataStorageError("Для сжатия zstd установите пакет zstandard.")
+        raise DataStorageError(f"Неизвестный кодек сжатия: {codec}")
+    return codec
+
+
+def detect_codec(head: bytes) -> str:
+    """
+    Определяет кодек по первым байтам данных.
+
+    Args:
+        head (bytes): Начало данных (достаточно четырех байт).
+
+    Returns:
+        str: Имя кодека или 'none' для несжатых данных.
+    """
+    if head.startswith(GZIP_MAGIC):
+        return GZIP
+    if head.startswith(ZSTD_MAGIC):
+        return ZSTD
+    if len(head) >= 2 and head[0] & 0x0f == 8 and (head[0] << 8 | head[1]) % 31 == 0:
+        return ZLIB
+    return NONE
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    """
+    Сжимает данные целиком.
+
+    Args:
+        data (bytes): Исходные данные.
+        codec (str): Имя кодека.
+
+    Returns:
+        bytes: Сжатые данные (исходные при codec='none').
+    """
+    if check_codec(codec) == NONE:
+        return data
+    compressor = CODECS[codec][0]()
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Распаковывает данные, определяя кодек автоматически.
+
+    Args:
+        data (bytes): Сжатые или несжатые данные.
+
+    Returns:
+        bytes: Распакованные данные.
+
+    Raises:
+        DataStorageError: Если данные сжаты недоступным кодеком.
+    """
+    codec = check_codec(detect_codec(data[:4]))
+    if codec == NONE:
+        return data
+    decompressor = CODECS[codec][1]()
+    return decompressor.decompress(data) + (decompressor.flush() if hasattr(decompressor, 'flush') else b'')
+
+
+class _CompressingWriter(io.RawIOBase):
+    """
+    Файловый объект, сжимающий записываемые данные на лету.
+    """
+
+    def __init__(self, raw, codec: str) -> None:
+        self._raw = raw
+        self._compressor = CODECS[codec][0]()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._raw.write(self._compressor.compress(bytes(data)))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.write(self._compressor.flush())
+            self._raw.close()
+        super().close()
+
+
+class _DecompressingReader(io.RawIOBase):
+    """
+    Файловый объект, распаковывающий данные при чтении.
+    """
+
+    def __init__(self, raw, codec: str) -> None:
+        self._raw = raw
+        self._decompressor = CODECS[codec][1]()
+        self._buffer = b''
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._eof:
+            chunk = self._raw.read(STREAM_CHUNK_SIZE)
+            if chunk:
+                self._buffer = self._decompressor.decompress(chunk)
+            else:
+                self._eof = True
+                if hasattr(self._decompressor, 'flush'):
+                    self._buffer = self._decompressor.flush()
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+def open_stream(path: str, mode: str, codec: Optional[str] = None) -> io.BufferedIOBase:
+    """
+    Открывает бинарный поток с потоковым сжатием или распаковкой.
+
+    Args:
+        path (str): Путь к файлу.
+        mode (str): 'rb' или 'wb'.
+        codec (Optional[str]): Кодек для записи. При чтении определяется по сигнатуре.
+
+    Returns:
+        io.BufferedIOBase: Буферизованный поток, поддерживающий peek при чтении.
+
+    Raises:
+        DataStorageError: При неизвестном режиме или недоступном кодеке.
+    """
+    if mode == 'wb':
+        codec = check_codec(codec or NONE)
+        raw = open(path, 'wb')
+        if codec == NONE:
+            return raw
+        return io.BufferedWriter(_CompressingWriter(raw, codec), STREAM_CHUNK_SIZE)
+    if mode == 'rb':
+        raw = open(path, 'rb')
+        codec = check_codec(detect_codec(raw.peek(4)[:4]))
+        if codec == NONE:
+            return raw
+        return io.BufferedReader(_DecompressingReader(raw, codec), STREAM_CHUNK_SIZE)
+    raise DataStorageError(f"Неподдерживаемый режим потока: {mode}")
@@ -5,12 +5,22 @@
 персонажей в различные форматы и управления файлами данных.
 """
 
+import hashlib
 import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
-from exceptions import SerializationError, DataStorageError
-from character import Character
+from typing import Dict, Any, Optional, List, Callable, Tuple, Iterator, Iterable, Union
+from exceptions import SerializationError, DataStorageError, WriteBehindError
+from character import Character, guess_value
+from migrations import SAVE_FORMAT_VERSION, upgrade
+from compression import NONE, check_codec, compress, decompress
 from shaman import Shaman
 from mage import Mage
 from druid import Druid
@@ -23,6 +33,8 @@ CHARACTER_TYPES = {
     'Hunter': Hunter
 }
 
+SAVE_FILE_PATTERN = re.compile(r'^character_(\d+)\.(json|xml)$')
+
 
 class DataSerializer(ABC):
     """
@@ -43,7 +55,19 @@ class DataSerializer(ABC):
         pass
 
     @abstractmethod
-    def deserialize(self, str) -> Character:
+    def load(self, data: str) -> Tuple[Character, int]:
+        """
+        Десериализует строку в объект персонажа, обновляя формат до текущей версии.
+
+        Args:
+            data (str): Сериализованные данные персонажа.
+
+        Returns:
+            Tuple[Character, int]: Объект персонажа и версия формата, в которой были данные.
+        """
+        pass
+
+    def deserialize(self, data: str) -> Character:
         """
         Десериализует строку в объект персонажа.
 
@@ -53,7 +77,7 @@ class DataSerializer(ABC):
         Returns:
             Character: Объект персонажа.
         """
-        pass
+        return self.load(data)[0]
 
 
 class JSONSerializer(DataSerializer):
@@ -79,7 +103,7 @@ class JSONSerializer(DataSerializer):
         except Exception as e:
             raise SerializationError(f"Ошибка сериализации в JSON: {e}")
 
-    def deserialize(self, data: str) -> Character:
+    def load(self, data: str) -> Tuple[Character, int]:
         """
         Десериализует JSON-строку в объект персонажа.
 
@@ -87,17 +111,21 @@ class JSONSerializer(DataSerializer):
             data (str): JSON-строка с данными персонажа.
 
         Returns:
-            Character: Объект персонажа.
+            Tuple[Character, int]: Объект персонажа и исходная версия формата.
 
         Raises:
             SerializationError: При ошибке десериализации.
         """
         try:
-            char_dict = json.loads(data)
+            char_dict, version = upgrade(json.loads(data))
             char_type = char_dict.get('type')
             if char_type not in CHARACTER_TYPES:
                 raise SerializationError(f"Неизвестный тип персонажа: {char_type}")
-            return CHARACTER_TYPES[char_type].from_dict(char_dict)
+            char_class = CHARACTER_TYPES[char_type]
+            char_class.coerce_characteristics(char_dict.get('characteristics', {}))
+            character = char_class.from_dict(char_dict)
+            character.journal_generation = int(char_dict.get('generation', 0))
+            return character, version
         except json.JSONDecodeError as e:
             raise SerializationError(f"Ошибка десериализации из JSON: {e}")
         except Exception as e:
@@ -107,6 +135,9 @@ class JSONSerializer(DataSerializer):
 class XMLSerializer(DataSerializer):
     """
     Класс для сериализации и десериализации персонажа в формат XML.
+
+    Значения характеристик восстанавливаются по SCHEMA класса персонажа,
+    а способности привязываются заново через from_dict этого класса.
     """
 
     def serialize(self, character: Character) -> str:
@@ -124,11 +155,14 @@ class XMLSerializer(DataSerializer):
         """
         try:
             root = ET.Element("Character")
+            root.set("version", str(SAVE_FORMAT_VERSION))
             root.set("type", character.__class__.__name__)
             root.set("name", character.name)
+            if character.journal_generation:
+                root.set("generation", str(character.journal_generation))
 
             characteristics_elem = ET.SubElement(root, "Characteristics")
-            for key, value in character.characteristics.items():
+            for key, value in character.base_characteristics().items():
                 attr_elem = ET.SubElement(characteristics_elem, "Attribute")
                 attr_elem.set("name", key)
                 attr_elem.text = str(value)
@@ -142,7 +176,7 @@ class XMLSerializer(DataSerializer):
         except Exception as e:
             raise SerializationError(f"Ошибка сериализации в XML: {e}")
 
-    def deserialize(self, data: str) -> Character:
+    def load(self, data: str) -> Tuple[Character, int]:
         """
         Десериализует XML-строку в объект персонажа.
 
@@ -150,7 +184,7 @@ class XMLSerializer(DataSerializer):
             data (str): XML-строка с данными персонажа.
 
         Returns:
-            Character: Объект персонажа.
+            Tuple[Character, int]: Объект персонажа и исходная версия формата.
 
         Raises:
             SerializationError: При ошибке десериализации.
@@ -158,56 +192,789 @@ class XMLSerializer(DataSerializer):
         try:
             root = ET.fromstring(data)
             char_type = root.get("type")
-            name = root.get("name")
 
             if char_type not in CHARACTER_TYPES:
                 raise SerializationError(f"Неизвестный тип персонажа: {char_type}")
 
-            instance = CHARACTER_TYPES[char_type].__new__(CHARACTER_TYPES[char_type])
-            instance.name = name
-
-            characteristics_elem = root.find("Characteristics")
+            char_class = CHARACTER_TYPES[char_type]
+            decoders = char_class.field_decoders()
             characteristics = {}
-            for attr_elem in characteristics_elem.findall("Attribute"):
+            for attr_elem in root.iter("Attribute"):
                 key = attr_elem.get("name")
-                val_text = attr_elem.text
-                try:
-                    val = int(val_text)
-                except ValueError:
-                    try:
-                        val = float(val_text)
-                    except ValueError:
-                        val = val_text
-                characteristics[key] = val
-            instance.characteristics = characteristics
-
-            abilities_elem = root.find("Abilities")
-            abilities = {}
-            for ability_elem in abilities_elem.findall("Ability"):
-                ability_name = ability_elem.text
-                abilities[ability_name] = lambda s: None
-            instance.abilities = abilities
-
-            return instance
+                characteristics[key] = decoders.get(key, guess_value)(attr_elem.text)
+
+            char_dict = {
+                'type': char_type,
+                'name': root.get("name"),
+                'characteristics': characteristics,
+                'abilities': [ability_elem.text for ability_elem in root.iter("Ability")],
+            }
+            if root.get("version") is not None:
+                char_dict['version'] = int(root.get("version"))
+            char_dict, version = upgrade(char_dict)
+            character = char_class.from_dict(char_dict)
+            character.journal_generation = int(root.get("generation", 0))
+            return character, version
         except ET.ParseError as e:
             raise SerializationError(f"Ошибка десериализации из XML: {e}")
         except Exception as e:
             raise SerializationError(f"Ошибка десериализации из XML: {e}")
 
 
+def atomic_write(filename: str, data: Union[str, bytes]) -> None:
+    """
+    Атомарно записывает строку или байты в файл.
+
+    Данные пишутся во временный файл в том же каталоге, сбрасываются на диск
+    через fsync и подменяют целевой файл через os.replace, поэтому при сбое
+    на диске остается либо старое, либо новое сохранение целиком.
+
+    Args:
+        filename (str): Путь к целевому файлу.
+        data (Union[str, bytes]): Записываемые данные. Строки записываются в UTF-8.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(filename)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи сохранений.
+
+    Запись выполняется фоновым потоком не позже чем через delay секунд после
+    первой постановки файла в очередь. Повторные сохранения одного и того же
+    файла за это время объединяются в одну запись последней версии данных.
+    Неудачная запись повторяется до MAX_ATTEMPTS раз, после чего отбрасывается
+    и учитывается в dropped; flush и close сообщают о таких файлах исключением.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, delay: float = 1.0) -> None:
+        """
+        Инициализирует очередь отложенной записи.
+
+        Args:
+            delay (float): Окно объединения записей в секундах.
+        """
+        self.delay = delay
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.dropped = 0
+        self._dropped_files: List[str] = []
+        self._pending: Dict[str, Tuple[str, Callable[[str, str], None], float, int]] = {}
+        self._inflight: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, filename: str, data: str, writer: Callable[[str, str], None] = atomic_write) -> None:
+        """
+        Ставит данные файла в очередь на запись.
+
+        Args:
+            filename (str): Путь к файлу.
+            data (str): Сериализованные данные.
+            writer (Callable[[str, str], None]): Функция записи. По умолчанию atomic_write.
+
+        Raises:
+            DataStorageError: Если очередь уже закрыта.
+        """
+        with self._cond:
+            if self._closed:
+                raise DataStorageError("Очередь записи закрыта.")
+            self.submitted += 1
+            previous = self._pending.get(filename)
+            if previous is not None:
+                self.coalesced += 1
+                self._pending[filename] = (data, writer, previous[2], 0)
+            else:
+                self._pending[filename] = (data, writer, time.monotonic(), 0)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self, filename: str) -> Optional[str]:
+        """
+        Возвращает еще не записанные на диск данные файла.
+
+        Args:
+            filename (str): Путь к файлу.
+
+        Returns:
+            Optional[str]: Данные из очереди или None, если записей нет.
+        """
+        with self._cond:
+            if filename in self._pending:
+                return self._pending[filename][0]
+            return self._inflight.get(filename)
+
+    def discard(self, filename: str) -> bool:
+        """
+        Отменяет отложенную запись файла.
+
+        Args:
+            filename (str): Путь к файлу.
+
+        Returns:
+            bool: True, если в очереди была запись этого файла.
+        """
+        with self._write_lock, self._cond:
+            return self._pending.pop(filename, None) is not None
+
+    def flush(self) -> None:
+        """
+        Синхронно записывает все файлы из очереди.
+
+        Raises:
+            WriteBehindError: Если часть файлов записать не удалось (в том числе
+                отброшенные фоновым потоком после последнего flush); список в
+                атрибуте files. Файлы, у которых остались попытки, остаются в очереди.
+        """
+        failed = self._write_due(force=True)
+        with self._cond:
+            failed = self._dropped_files + [name for name in failed if name not in self._dropped_files]
+            self._dropped_files = []
+        if failed:
+            raise WriteBehindError(failed)
+
+    def close(self) -> None:
+        """
+        Записывает все файлы из очереди и останавливает фоновый поток.
+
+        Raises:
+            WriteBehindError: Если часть файлов записать не удалось.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        """
+        Цикл фонового потока: ждет наступления срока записи и пишет файлы.
+        """
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._pending:
+                        oldest = min(item[2] for item in self._pending.values())
+                        timeout = oldest + self.delay - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            self._write_due(force=False)
+
+    def _write_due(self, force: bool) -> List[str]:
+        """
+        Записывает файлы, срок записи которых наступил.
+
+        Args:
+            force (bool): Если True, записывает все файлы независимо от срока.
+
+        Returns:
+            List[str]: Файлы, которые записать не удалось.
+        """
+        failed = []
+        with self._write_lock:
+            with self._cond:
+                now = time.monotonic()
+                due = [name for name, item in self._pending.items() if force or item[2] + self.delay <= now]
+                batch = {name: self._pending.pop(name) for name in due}
+                self._inflight = {name: item[0] for name, item in batch.items()}
+            for filename, (data, writer, enqueued, attempts) in batch.items():
+                try:
+                    writer(filename, data)
+                    self.written += 1
+                except Exception as e:
+                    print(f"Ошибка отложенной записи {filename}: {e}")
+                    failed.append(filename)
+                    with self._cond:
+                        if filename in self._pending:
+                            continue
+                        if attempts + 1 < self.MAX_ATTEMPTS:
+                            self._pending[filename] = (data, writer, time.monotonic(), attempts + 1)
+                        else:
+                            print(f"Запись {filename} отброшена после {self.MAX_ATTEMPTS} попыток")
+                            self.dropped += 1
+                            if not force:
+                                self._dropped_files.append(filename)
+            with self._cond:
+                self._inflight = {}
+        return failed
+
+
+class ShardedLayout:
+    """
+    Раскладка файлов сохранений по хешированным подкаталогам с индексом.
+
+    Файл character_<user_id>.<fmt> хранится в root/ab/cd/, где ab и cd -
+    первые символы хеша имени файла. Индекс index.json в корне хранит
+    для каждого user_id пути, размеры и время изменения сохранений, поэтому
+    проверка существования и перечисление не обращаются к файловой системе.
+    Индекс сбрасывается на диск каждые flush_every изменений и при закрытии;
+    если бот завершился аварийно, индекс перестраивается обходом каталога.
+    """
+
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, root: str, depth: int = 2, width: int = 2, flush_every: int = 100) -> None:
+        """
+        Инициализирует раскладку. Индекс загружается при первом обращении.
+
+        Args:
+            root (str): Корневой каталог сохранений.
+            depth (int): Количество уровней подкаталогов.
+            width (int): Количество символов хеша на один уровень.
+            flush_every (int): Через сколько изменений сбрасывать индекс на диск.
+        """
+        self.root = root
+        self.depth = depth
+        self.width = width
+        self.flush_every = flush_every
+        self.index_path = os.path.join(root, self.INDEX_FILENAME)
+        self._entries: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+        self._changes = 0
+        self._created_dirs = set()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def split_filename(filename: str) -> Tuple[str, str]:
+        """
+        Выделяет из имени файла ключ пользователя и формат.
+
+        Args:
+            filename (str): Имя файла, например character_42.json.
+
+        Returns:
+            Tuple[str, str]: user_id (или имя без расширения) и формат.
+        """
+        basename = os.path.basename(filename)
+        match = SAVE_FILE_PATTERN.match(basename)
+        if match:
+            return match.group(1), match.group(2)
+        stem, _, ext = basename.rpartition('.')
+        return (stem, ext) if stem else (basename, '')
+
+    def path_for(self, filename: str) -> str:
+        """
+        Возвращает путь к файлу сохранения внутри раскладки.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            str: Путь root/<хеш>/<имя файла>.
+        """
+        basename = os.path.basename(filename)
+        digest = hashlib.md5(basename.encode('utf-8')).hexdigest()
+        parts = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return os.path.join(self.root, *parts, basename)
+
+    def ensure_dir(self, path: str) -> None:
+        """
+        Создает каталог для файла, если он еще не создавался.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        directory = os.path.dirname(path)
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def contains(self, filename: str) -> bool:
+        """
+        Проверяет по индексу, есть ли сохранение.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True, если сохранение есть в индексе.
+        """
+        user_key, fmt = self.split_filename(filename)
+        with self._lock:
+            return fmt in self._load().get(user_key, {})
+
+    def record(self, filename: str, path: Optional[str] = None) -> None:
+        """
+        Добавляет или обновляет запись индекса после записи файла.
+
+        Args:
+            filename (str): Имя файла.
+            path (Optional[str]): Путь к записанному файлу. По умолчанию path_for(filename).
+        """
+        path = path or self.path_for(filename)
+        stat = os.stat(path)
+        user_key, fmt = self.split_filename(filename)
+        entry = {'path': os.path.relpath(path, self.root), 'mtime': stat.st_mtime, 'size': stat.st_size}
+        with self._lock:
+            self._load().setdefault(user_key, {})[fmt] = entry
+            self._changed()
+
+    def forget(self, filename: str) -> None:
+        """
+        Удаляет запись индекса.
+
+        Args:
+            filename (str): Имя файла.
+        """
+        user_key, fmt = self.split_filename(filename)
+        with self._lock:
+            formats = self._load().get(user_key)
+            if formats and formats.pop(fmt, None) is not None:
+                if not formats:
+                    del self._entries[user_key]
+                self._changed()
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        """
+        Перечисляет сохранения по индексу без обхода каталогов.
+
+        Yields:
+            Dict[str, Any]: Запись с ключами user_id, format, path, mtime и size.
+        """
+        with self._lock:
+            snapshot = [(user_key, fmt, dict(entry))
+                        for user_key, formats in self._load().items() for fmt, entry in formats.items()]
+        for user_key, fmt, entry in snapshot:
+            entry['path'] = os.path.join(self.root, entry['path'])
+            yield {'user_id': user_key, 'format': fmt, **entry}
+
+    def rebuild(self) -> int:
+        """
+        Перестраивает индекс обходом корневого каталога.
+
+        Returns:
+            int: Количество найденных сохранений.
+        """
+        entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        count = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name == self.INDEX_FILENAME or name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                user_key, fmt = self.split_filename(name)
+                entries.setdefault(user_key, {})[fmt] = {
+                    'path': os.path.relpath(path, self.root), 'mtime': stat.st_mtime, 'size': stat.st_size,
+                }
+                count += 1
+        with self._lock:
+            self._entries = entries
+            self._write_index(clean=False)
+        return count
+
+    def adopt(self, directory: str) -> int:
+        """
+        Переносит сохранения из плоского каталога (старый формат хранения) в раскладку.
+
+        Args:
+            directory (str): Каталог со старыми файлами character_<user_id>.json/.xml.
+
+        Returns:
+            int: Количество перенесенных файлов.
+        """
+        moved = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if SAVE_FILE_PATTERN.match(entry.name) and entry.is_file():
+                    path = self.path_for(entry.name)
+                    self.ensure_dir(path)
+                    os.replace(entry.path, path)
+                    self.record(entry.name, path)
+                    moved += 1
+        return moved
+
+    def save_index(self) -> None:
+        """
+        Сбрасывает индекс на диск.
+        """
+        with self._lock:
+            if self._entries is not None:
+                self._write_index(clean=False)
+
+    def close(self) -> None:
+        """
+        Сохраняет индекс с отметкой о корректном завершении работы.
+        """
+        with self._lock:
+            if self._entries is not None:
+                self._write_index(clean=True)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(formats) for formats in self._load().values())
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Загружает индекс при первом обращении.
+
+        Индекс, не отмеченный как корректно закрытый, перестраивается.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: Записи индекса по user_id и формату.
+        """
+        if self._entries is None:
+            os.makedirs(self.root, exist_ok=True)
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                index = {}
+            if index.get('clean'):
+                self._entries = index.get('entries', {})
+                self._write_index(clean=False)
+            else:
+                self.rebuild()
+        return self._entries
+
+    def _changed(self) -> None:
+        """
+        Учитывает изменение индекса и при необходимости сбрасывает его на диск.
+        """
+        self._changes += 1
+        if self._changes >= self.flush_every:
+            self._write_index(clean=False)
+
+    def _write_index(self, clean: bool) -> None:
+        """
+        Атомарно записывает индекс.
+
+        Args:
+            clean (bool): Признак корректного завершения работы.
+        """
+        atomic_write(self.index_path, json.dumps({'clean': clean, 'entries': self._entries},
+                                                 ensure_ascii=False, separators=(',', ':')))
+        self._changes = 0
+
+
+class CharacterCache:
+    """
+    Ограниченный LRU-кеш десериализованных персонажей.
+
+    Ключом служит путь к файлу, запись действительна, пока у файла не
+    изменились mtime, размер и inode. Хранится словарь Character.to_dict,
+    при попадании из него собирается новый объект через from_dict, поэтому
+    изменения загруженного персонажа не портят кеш.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 2 ** 20) -> None:
+        """
+        Инициализирует кеш.
+
+        Args:
+            max_entries (int): Максимальное количество персонажей в кеше.
+            max_bytes (int): Максимальный суммарный размер закешированных файлов в байтах.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(stat: os.stat_result) -> Tuple[int, int, int]:
+        """
+        Возвращает признак версии файла для проверки записи кеша.
+
+        Args:
+            stat (os.stat_result): Результат os.stat для файла.
+
+        Returns:
+            Tuple[int, int, int]: mtime в наносекундах, размер и inode.
+        """
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[Character]:
+        """
+        Возвращает копию персонажа из кеша, если файл не изменился.
+
+        Args:
+            path (str): Путь к файлу.
+            stat (os.stat_result): Текущий результат os.stat для файла.
+
+        Returns:
+            Optional[Character]: Новый объект персонажа или None при промахе.
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != self.signature(stat):
+                if entry is not None:
+                    self._pop(path)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            data = entry[1]
+        return CHARACTER_TYPES[data['type']].from_dict({**data, 'characteristics': dict(data['characteristics'])})
+
+    def put(self, path: str, stat: os.stat_result, character: Character) -> None:
+        """
+        Кладет персонажа в кеш и вытесняет самые старые записи при переполнении.
+
+        Args:
+            path (str): Путь к файлу.
+            stat (os.stat_result): Результат os.stat, полученный до чтения файла.
+            character (Character): Прочитанный персонаж.
+        """
+        data = character.to_dict()
+        if data['type'] not in CHARACTER_TYPES or stat.st_size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(path)
+            self._entries[path] = (self.signature(stat), data)
+            self.size_bytes += stat.st_size
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        """
+        Удаляет запись файла из кеша.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        with self._lock:
+            self._pop(path)
+
+    def clear(self) -> None:
+        """
+        Очищает кеш.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Возвращает счетчики кеша.
+
+        Returns:
+            Dict[str, int]: Попадания, промахи, вытеснения, количество записей и их размер.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.size_bytes}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _pop(self, path: str) -> None:
+        """
+        Удаляет запись без блокировки и пересчитывает занятый размер.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size_bytes -= entry[0][1]
+
+
 class DataManager(ABC):
     """
     Абстрактный класс для управления файлами данных персонажей.
     """
 
-    def __init__(self, serializer: DataSerializer) -> None:
+    def __init__(self, serializer: DataSerializer, write_behind: Optional[WriteBehindQueue] = None,
+                 layout: Optional[ShardedLayout] = None, cache: Optional[CharacterCache] = None,
+                 compression: str = NONE) -> None:
         """
         Инициализирует менеджер данных с указанным сериализатором.
 
         Args:
             serializer (DataSerializer): Объект сериализатора.
+            write_behind (Optional[WriteBehindQueue]): Очередь отложенной записи.
+                Если не задана, файлы записываются синхронно.
+            layout (Optional[ShardedLayout]): Раскладка сохранений по подкаталогам.
+                Если не задана, имя файла используется как путь.
+            cache (Optional[CharacterCache]): Кеш прочитанных персонажей.
+            compression (str): Кодек сжатия новых сохранений: 'none', 'gzip', 'zlib' или 'zstd'.
+                При чтении кодек определяется автоматически.
+
+        Raises:
+            DataStorageError: Если кодек сжатия недоступен.
         """
         self.serializer = serializer
+        self.write_behind = write_behind
+        self.layout = layout
+        self.cache = cache
+        self.compression = check_codec(compression)
+        self.migrated = 0
+
+    def path(self, filename: str) -> str:
+        """
+        Возвращает путь к файлу сохранения на диске.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            str: Путь к файлу.
+        """
+        return self.layout.path_for(filename) if self.layout is not None else filename
+
+    def exists(self, filename: str) -> bool:
+        """
+        Проверяет, есть ли сохранение с указанным именем файла.
+
+        Учитывает сохранения, которые еще находятся в очереди записи.
+        При заданной раскладке проверка выполняется по индексу.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True, если сохранение существует.
+        """
+        path = self.path(filename)
+        if self.write_behind is not None and self.write_behind.pending(path) is not None:
+            return True
+        if self.layout is not None:
+            return self.layout.contains(filename)
+        return os.path.exists(path)
+
+    def _write(self, filename: str, data: str) -> None:
+        """
+        Атомарно записывает данные файла сразу или через очередь отложенной записи.
+
+        Args:
+            filename (str): Имя файла.
+            data (str): Сериализованные данные.
+        """
+        path = self.path(filename)
+        if self.write_behind is not None:
+            self.write_behind.submit(path, data, self._write_file)
+        else:
+            self._write_file(path, data)
+
+    def _write_file(self, path: str, data: str) -> None:
+        """
+        Сжимает и атомарно записывает файл, обновляет индекс раскладки.
+
+        Args:
+            path (str): Путь к файлу.
+            data (str): Сериализованные данные.
+        """
+        if self.layout is not None:
+            self.layout.ensure_dir(path)
+        atomic_write(path, compress(data.encode('utf-8'), self.compression))
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        if self.layout is not None:
+            self.layout.record(os.path.basename(path), path)
+
+    def _load(self, filename: str) -> Character:
+        """
+        Читает персонажа с учетом еще не записанных сохранений и кеша.
+
+        Сохранения старых версий формата обновляются при чтении и
+        перезаписываются в текущем формате через _write_back.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            Character: Объект персонажа.
+        """
+        path = self.path(filename)
+        if self.write_behind is not None:
+            data = self.write_behind.pending(path)
+            if data is not None:
+                return self.serializer.deserialize(data)
+        stat = None
+        if self.cache is not None:
+            stat = os.stat(path)
+            character = self.cache.get(path, stat)
+            if character is not None:
+                return character
+        with open(path, 'rb') as f:
+            character, version = self.serializer.load(decompress(f.read()).decode('utf-8'))
+        if version < SAVE_FORMAT_VERSION:
+            self._write_back(filename, character)
+        elif self.cache is not None:
+            self.cache.put(path, stat, character)
+        return character
+
+    def _write_back(self, filename: str, character: Character) -> None:
+        """
+        Перезаписывает обновленное при чтении сохранение в текущем формате.
+
+        При наличии очереди отложенной записи перезапись выполняется в фоне.
+        Ошибка перезаписи не мешает чтению: сохранение обновится позже.
+
+        Args:
+            filename (str): Имя файла.
+            character (Character): Обновленный персонаж.
+        """
+        try:
+            self.create(character, filename)
+            self.migrated += 1
+        except Exception as e:
+            print(f"Ошибка при обновлении формата {filename}: {e}")
+
+    def _remove(self, filename: str) -> None:
+        """
+        Удаляет файл, его запись в индексе и отменяет его отложенную запись.
+
+        Args:
+            filename (str): Имя файла.
+
+        Raises:
+            FileNotFoundError: Если файла нет ни на диске, ни в очереди записи.
+        """
+        path = self.path(filename)
+        discarded = self.write_behind is not None and self.write_behind.discard(path)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        if self.layout is not None:
+            self.layout.forget(filename)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            if not discarded:
+                raise
 
     @abstractmethod
     def create(self, character: Character, filename: str) -> bool:
@@ -263,17 +1030,41 @@ class DataManager(ABC):
         """
         pass
 
+    def create_many(self, items: Iterable[Tuple[Character, str]]) -> int:
+        """
+        Сохраняет несколько персонажей.
+
+        Args:
+            items (Iterable[Tuple[Character, str]]): Пары (персонаж, имя файла).
+
+        Returns:
+            int: Количество сохраненных персонажей.
+        """
+        count = 0
+        for character, filename in items:
+            self.create(character, filename)
+            count += 1
+        return count
+
 
 class JSONDataManager(DataManager):
     """
     Класс для управления файлами данных персонажей в формате JSON.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, write_behind: Optional[WriteBehindQueue] = None,
+                 layout: Optional[ShardedLayout] = None, cache: Optional[CharacterCache] = None,
+                 compression: str = NONE) -> None:
         """
         Инициализирует менеджер данных с JSON-сериализатором.
+
+        Args:
+            write_behind (Optional[WriteBehindQueue]): Очередь отложенной записи.
+            layout (Optional[ShardedLayout]): Раскладка сохранений по подкаталогам.
+            cache (Optional[CharacterCache]): Кеш прочитанных персонажей.
+            compression (str): Кодек сжатия новых сохранений.
         """
-        super().__init__(JSONSerializer())
+        super().__init__(JSONSerializer(), write_behind, layout, cache, compression)
 
     def create(self, character: Character, filename: str) -> bool:
         """
@@ -290,8 +1081,7 @@ class JSONDataManager(DataManager):
             DataStorageError: При ошибке создания файла.
         """
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.serializer.serialize(character))
+            self._write(filename, self.serializer.serialize(character))
             return True
         except Exception as e:
             raise DataStorageError(f"Ошибка при создании файла JSON: {e}")
@@ -310,9 +1100,7 @@ class JSONDataManager(DataManager):
             DataStorageError: При ошибке чтения файла.
         """
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = f.read()
-            return self.serializer.deserialize(data)
+            return self._load(filename)
         except FileNotFoundError:
             raise DataStorageError(f"Файл {filename} не найден.")
         except Exception as e:
@@ -348,8 +1136,7 @@ class JSONDataManager(DataManager):
             DataStorageError: При ошибке удаления файла.
         """
         try:
-            import os
-            os.remove(filename)
+            self._remove(filename)
             return True
         except FileNotFoundError:
             print(f"Файл {filename} не найден для удаления.")
@@ -363,11 +1150,19 @@ class XMLDataManager(DataManager):
     Класс для управления файлами данных персонажей в формате XML.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, write_behind: Optional[WriteBehindQueue] = None,
+                 layout: Optional[ShardedLayout] = None, cache: Optional[CharacterCache] = None,
+                 compression: str = NONE) -> None:
         """
         Инициализирует менеджер данных с XML-сериализатором.
+
+        Args:
+            write_behind (Optional[WriteBehindQueue]): Очередь отложенной записи.
+            layout (Optional[ShardedLayout]): Раскладка сохранений по подкаталогам.
+            cache (Optional[CharacterCache]): Кеш прочитанных персонажей.
+            compression (str): Кодек сжатия новых сохранений.
         """
-        super().__init__(XMLSerializer())
+        super().__init__(XMLSerializer(), write_behind, layout, cache, compression)
 
     def create(self, character: Character, filename: str) -> bool:
         """
@@ -384,8 +1179,7 @@ class XMLDataManager(DataManager):
             DataStorageError: При ошибке создания файла.
         """
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.serializer.serialize(character))
+            self._write(filename, self.serializer.serialize(character))
             return True
         except Exception as e:
             raise DataStorageError(f"Ошибка при создании файла XML: {e}")
@@ -404,9 +1198,7 @@ class XMLDataManager(DataManager):
             DataStorageError: При ошибке чтения файла.
         """
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = f.read()
-            return self.serializer.deserialize(data)
+            return self._load(filename)
         except FileNotFoundError:
             raise DataStorageError(f"Файл {filename} не найден.")
         except Exception as e:
@@ -442,11 +1234,209 @@ class XMLDataManager(DataManager):
             DataStorageError: При ошибке удаления файла.
         """
         try:
-            import os
-            os.remove(filename)
+            self._remove(filename)
             return True
         except FileNotFoundError:
             print(f"Файл {filename} не найден для удаления.")
             return False
         except Exception as e:
             raise DataStorageError(f"Ошибка при удалении файла XML: {e}")
+
+
+class SQLiteDataManager(DataManager):
+    """
+    Класс для хранения персонажей в одной встроенной базе SQLite.
+
+    Вместо отдельного файла на персонажа все сохранения лежат в таблице
+    characters, ключом служит прежнее имя файла. База работает в режиме WAL,
+    запросы используют постоянный текст, поэтому sqlite3 берет готовые
+    подготовленные выражения из своего кеша, а create_many пишет пачку
+    персонажей одной транзакцией.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS characters ('
+        'filename TEXT PRIMARY KEY, '
+        'type TEXT NOT NULL, '
+        'data TEXT NOT NULL, '
+        'updated_at REAL NOT NULL'
+        ') WITHOUT ROWID'
+    )
+    UPSERT = ('INSERT INTO characters (filename, type, data, updated_at) VALUES (?, ?, ?, ?) '
+              'ON CONFLICT(filename) DO UPDATE SET type = excluded.type, data = excluded.data, '
+              'updated_at = excluded.updated_at')
+    SELECT = 'SELECT data FROM characters WHERE filename = ?'
+    EXISTS = 'SELECT 1 FROM characters WHERE filename = ?'
+    DELETE = 'DELETE FROM characters WHERE filename = ?'
+
+    def __init__(self, path: str = 'characters.db', serializer: Optional[DataSerializer] = None,
+                 compression: str = NONE) -> None:
+        """
+        Открывает (или создает) базу персонажей.
+
+        Args:
+            path (str): Путь к файлу базы SQLite.
+            serializer (Optional[DataSerializer]): Сериализатор. По умолчанию JSONSerializer.
+            compression (str): Кодек сжатия данных персонажей. Сжатые данные хранятся как BLOB.
+
+        Raises:
+            DataStorageError: При ошибке открытия базы или недоступном кодеке.
+        """
+        super().__init__(serializer or JSONSerializer(), compression=compression)
+        self.db_path = path
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                         cached_statements=64)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(self.SCHEMA)
+        except sqlite3.Error as e:
+            raise DataStorageError(f"Ошибка при открытии базы SQLite: {e}")
+
+    def exists(self, filename: str) -> bool:
+        """
+        Проверяет, есть ли сохранение с указанным именем.
+
+        Args:
+            filename (str): Имя сохранения.
+
+        Returns:
+            bool: True, если сохранение существует.
+        """
+        with self._lock:
+            return self._conn.execute(self.EXISTS, (filename,)).fetchone() is not None
+
+    def create(self, character: Character, filename: str) -> bool:
+        """
+        Сохраняет персонажа в базу.
+
+        Args:
+            character (Character): Объект персонажа для сохранения.
+            filename (str): Имя сохранения.
+
+        Returns:
+            bool: True при успешном создании, иначе False.
+
+        Raises:
+            DataStorageError: При ошибке записи в базу.
+        """
+        return self.create_many([(character, filename)]) == 1
+
+    def create_many(self, items: Iterable[Tuple[Character, str]]) -> int:
+        """
+        Сохраняет несколько персонажей одной транзакцией.
+
+        Args:
+            items (Iterable[Tuple[Character, str]]): Пары (персонаж, имя сохранения).
+
+        Returns:
+            int: Количество сохраненных персонажей.
+
+        Raises:
+            DataStorageError: При ошибке записи в базу.
+        """
+        try:
+            now = time.time()
+            rows = [(filename, character.__class__.__name__,
+                     self._encode(self.serializer.serialize(character)), now)
+                    for character, filename in items]
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(self.UPSERT, rows)
+                    self._conn.execute('COMMIT')
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            return len(rows)
+        except Exception as e:
+            raise DataStorageError(f"Ошибка при записи в базу SQLite: {e}")
+
+    def read(self, filename: str) -> Character:
+        """
+        Читает персонажа из базы.
+
+        Args:
+            filename (str): Имя сохранения.
+
+        Returns:
+            Character: Объект персонажа.
+
+        Raises:
+            DataStorageError: Если сохранения нет или при ошибке чтения.
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(self.SELECT, (filename,)).fetchone()
+        except sqlite3.Error as e:
+            raise DataStorageError(f"Ошибка при чтении из базы SQLite: {e}")
+        if row is None:
+            raise DataStorageError(f"Сохранение {filename} не найдено.")
+        try:
+            data = row[0] if isinstance(row[0], str) else decompress(row[0]).decode('utf-8')
+            character, version = self.serializer.load(data)
+        except Exception as e:
+            raise DataStorageError(f"Ошибка при чтении из базы SQLite: {e}")
+        if version < SAVE_FORMAT_VERSION:
+            self._write_back(filename, character)
+        return character
+
+    def update(self, character: Character, filename: str) -> bool:
+        """
+        Обновляет данные персонажа в базе.
+
+        Args:
+            character (Character): Объект персонажа для обновления.
+            filename (str): Имя сохранения.
+
+        Returns:
+            bool: True при успешном обновлении, иначе False.
+
+        Raises:
+            DataStorageError: При ошибке записи в базу.
+        """
+        return self.create(character, filename)
+
+    def delete(self, filename: str) -> bool:
+        """
+        Удаляет персонажа из базы.
+
+        Args:
+            filename (str): Имя сохранения.
+
+        Returns:
+            bool: True при успешном удалении, False если сохранения не было.
+
+        Raises:
+            DataStorageError: При ошибке удаления.
+        """
+        try:
+            with self._lock:
+                deleted = self._conn.execute(self.DELETE, (filename,)).rowcount
+        except sqlite3.Error as e:
+            raise DataStorageError(f"Ошибка при удалении из базы SQLite: {e}")
+        if not deleted:
+            print(f"Сохранение {filename} не найдено для удаления.")
+        return bool(deleted)
+
+    def close(self) -> None:
+        """
+        Закрывает соединение с базой.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def _encode(self, data: str) -> Union[str, bytes]:
+        """
+        Сжимает сериализованные данные, если для менеджера выбран кодек.
+
+        Args:
+            data (str): Сериализованные данные.
+
+        Returns:
+            Union[str, bytes]: Строка без сжатия или сжатые байты.
+        """
+        if self.compression == NONE:
+            return data
+        return compress(data.encode('utf-8'), self.compression)
@@ -1,24 +1,343 @@
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime
+from sqlalchemy import create_engine, event, func, select, Column, Index, Integer, BigInteger, String, Date, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm import sessionmaker, scoped_session
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
+import threading
+import time
 
 load_dotenv()
 
 DATABASE_URL = os.getenv('DB_URL')
+DATABASE_READ_URL = os.getenv('DB_READ_URL')
 
-engine = create_engine(DATABASE_URL, echo=False)
+
+def engine_options(url: str, prefix: str = 'DB') -> dict:
+    """
+    Собирает параметры пула соединений из переменных окружения.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW и DB_POOL_TIMEOUT применяются только к
+    пулу очереди соединений: SQLite в памяти работает через пул одного
+    соединения, который этих параметров не принимает. С prefix='DB_READ'
+    сначала читаются DB_READ_POOL_SIZE и т.д., затем общие DB_*.
+    """
+    def setting(name: str, default: str) -> str:
+        return os.getenv(f'{prefix}_{name}', os.getenv(f'DB_{name}', default))
+
+    options = {
+        'echo': False,
+        'pool_pre_ping': setting('POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(setting('POOL_RECYCLE', '1800')),
+    }
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return options
+    options.update({
+        'pool_size': int(setting('POOL_SIZE', '5')),
+        'max_overflow': int(setting('MAX_OVERFLOW', '10')),
+        'pool_timeout': float(setting('POOL_TIMEOUT', '30')),
+    })
+    return options
+
+
+class PoolMetrics:
+    """
+    Счетчики пула соединений: выдачи, возвраты, новые и сброшенные соединения,
+    а также время ожидания соединения в session_scope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def attach(self, engine) -> None:
+        """
+        Подписывается на события пула движка.
+        """
+        event.listen(engine, 'connect', lambda *args: self._inc('connects'))
+        event.listen(engine, 'checkout', lambda *args: self._inc('checkouts'))
+        event.listen(engine, 'checkin', lambda *args: self._inc('checkins'))
+        event.listen(engine, 'invalidate', lambda *args: self._inc('invalidations'))
+
+    def record_wait(self, seconds: float) -> None:
+        """
+        Учитывает время ожидания соединения из пула.
+        """
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, engine=None) -> dict:
+        """
+        Возвращает текущие значения счетчиков и, если передан движок, занятость пула.
+        """
+        with self._lock:
+            data = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'wait_avg_ms': self.wait_total / self.waits * 1000 if self.waits else 0.0,
+                'wait_max_ms': self.wait_max * 1000,
+            }
+        if engine is not None and hasattr(engine.pool, 'checkedout'):
+            data['checked_out'] = engine.pool.checkedout()
+            data['pool_size'] = engine.pool.size()
+        return data
+
+    def _inc(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class ReplicaLag:
+    """
+    Отставание реплики чтения от основной БД по таблице kills.
+
+    rows - сколько убийств уже есть в основной БД, но еще нет в реплике;
+    seconds - сколько ждет самое старое из них. Пока seconds больше max_lag
+    или реплика недоступна, чтение идет из основной БД. Отставание
+    проверяется не чаще раза в interval секунд.
+    """
+
+    def __init__(self, max_lag: float = 30.0, interval: float = 10.0):
+        self._lock = threading.Lock()
+        self.max_lag = max_lag
+        self.interval = interval
+        self.rows = 0
+        self.seconds = 0.0
+        self.available = True
+        self.checked_at = None
+
+    def due(self) -> bool:
+        """
+        Пора ли снова проверить отставание.
+        """
+        return self.checked_at is None or time.monotonic() - self.checked_at >= self.interval
+
+    def stale(self) -> bool:
+        """
+        Реплика недоступна или отстает больше max_lag секунд.
+        """
+        return not self.available or self.seconds > self.max_lag
+
+    def check(self, primary, replica) -> None:
+        """
+        Сравнивает последний id убийства в реплике с основной БД.
+        """
+        with replica.connect() as conn:
+            replica_max = conn.execute(select(func.max(KillsSaver.id))).scalar() or 0
+        with primary.connect() as conn:
+            rows, oldest = conn.execute(select(func.count(), func.min(KillsSaver.time))
+                                        .where(KillsSaver.id > replica_max)).one()
+        seconds = 0.0
+        if oldest is not None:
+            now = datetime.now(timezone.utc) if oldest.tzinfo else datetime.utcnow()
+            seconds = max((now - oldest).total_seconds(), 0.0)
+        with self._lock:
+            self.rows, self.seconds, self.available = rows, seconds, True
+            self.checked_at = time.monotonic()
+
+    def mark_unavailable(self) -> None:
+        """
+        Отмечает реплику недоступной до следующей проверки.
+        """
+        with self._lock:
+            self.available = False
+            self.checked_at = time.monotonic()
+
+    def reset(self) -> None:
+        """
+        Сбрасывает результаты проверок.
+        """
+        with self._lock:
+            self.rows, self.seconds, self.available, self.checked_at = 0, 0.0, True, None
+
+
+engine = None
+pool_metrics = PoolMetrics()
 Base = declarative_base()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+ScopedSession = scoped_session(SessionLocal)
+read_engine = None
+read_pool_metrics = PoolMetrics()
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+ReadScopedSession = scoped_session(ReadSessionLocal)
+replica_lag = ReplicaLag(max_lag=float(os.getenv('DB_READ_MAX_LAG', '30')),
+                         interval=float(os.getenv('DB_READ_LAG_CHECK', '10')))
+_init_lock = threading.Lock()
+
+
+def init_db(url: str = None):
+    """
+    Создает движок БД, привязывает к нему сессии и создает таблицы.
+
+    Импорт модуля не подключается к БД: движок создается при первом вызове
+    init_db (явно при запуске бота или неявно при первой сессии). Повторные
+    вызовы возвращают уже созданный движок.
+    """
+    global engine
+    with _init_lock:
+        if engine is None:
+            url = url or DATABASE_URL
+            if not url:
+                raise RuntimeError('Не задан DB_URL для подключения к базе данных')
+            new_engine = create_engine(url, **engine_options(url))
+            pool_metrics.attach(new_engine)
+            Base.metadata.create_all(bind=new_engine)
+            SessionLocal.configure(bind=new_engine)
+            engine = new_engine
+        return engine
+
+
+def get_engine():
+    """
+    Возвращает движок БД, инициализируя его при первом обращении.
+    """
+    return engine if engine is not None else init_db()
+
+
+def init_read_db(url: str = None):
+    """
+    Создает отдельный движок только для чтения (реплика из DB_READ_URL) со
+    своим пулом соединений. Таблицы на нем не создаются. Возвращает None,
+    если адрес реплики не задан.
+    """
+    global read_engine
+    with _init_lock:
+        if read_engine is None:
+            url = url or DATABASE_READ_URL
+            if not url:
+                return None
+            new_engine = create_engine(url, **engine_options(url, prefix='DB_READ'))
+            read_pool_metrics.attach(new_engine)
+            ReadSessionLocal.configure(bind=new_engine)
+            read_engine = new_engine
+        return read_engine
+
+
+def close_read_db() -> None:
+    """
+    Закрывает соединения движка чтения; дальше чтение идет из основной БД,
+    пока движок чтения не будет создан снова.
+    """
+    global read_engine
+    ReadScopedSession.remove()
+    if read_engine is not None:
+        read_engine.dispose()
+    read_engine = None
+    replica_lag.reset()
+
+
+@contextmanager
+def session_scope(session_factory=ScopedSession):
+    """
+    Выдает сессию на время блока: фиксирует транзакцию при успехе и
+    откатывает при исключении.
+
+    По умолчанию используется сессия текущего потока из ScopedSession; она
+    не закрывается, а только отдает соединение пулу после commit/rollback,
+    поэтому обработчики одного потока переиспользуют один объект сессии.
+    При первом таком вызове БД инициализируется через init_db.
+    Сессии из других фабрик закрываются по выходе из блока.
+    """
+    if session_factory is ScopedSession:
+        get_engine()
+    session = session_factory()
+    try:
+        started = time.perf_counter()
+        session.connection()
+        pool_metrics.record_wait(time.perf_counter() - started)
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        if session_factory is not ScopedSession:
+            session.close()
+
+
+def _replica_session():
+    """
+    Возвращает сессию реплики чтения или None, если читать нужно из основной БД:
+    реплика не задана, недоступна или отстает больше DB_READ_MAX_LAG секунд.
+    """
+    replica = init_read_db()
+    if replica is None:
+        return None
+    if replica_lag.due():
+        try:
+            replica_lag.check(get_engine(), replica)
+        except SQLAlchemyError as e:
+            print(f"Ошибка проверки реплики чтения: {e}")
+            replica_lag.mark_unavailable()
+    if replica_lag.stale():
+        return None
+    session = ReadScopedSession()
+    try:
+        started = time.perf_counter()
+        session.connection()
+        read_pool_metrics.record_wait(time.perf_counter() - started)
+    except SQLAlchemyError as e:
+        print(f"Ошибка подключения к реплике чтения: {e}")
+        ReadScopedSession.remove()
+        replica_lag.mark_unavailable()
+        return None
+    return session
+
+
+def read_query(read, primary: bool = False):
+    """
+    Выполняет read(session) на реплике чтения и возвращает результат.
+
+    Единственный путь чтения с реплики: тяжелые запросы статистики на ней
+    не занимают соединения записи убийств. Без реплики, при ее
+    недоступности или отставании больше DB_READ_MAX_LAG секунд запрос сразу
+    выполняется в основной БД. Если запрос на реплике падает с любой ошибкой
+    SQLAlchemy (например, на реплике PostgreSQL еще нет таблицы -
+    ProgrammingError, или пул реплики исчерпан - TimeoutError), реплика
+    отмечается недоступной, и запрос повторяется в основной БД.
+
+    read должен прочитать результат целиком внутри вызова. primary=True -
+    сразу читать из основной БД: так читаются данные, которые должны
+    включать только что записанные убийства (реплика может отставать до
+    DB_READ_MAX_LAG секунд).
+    """
+    session = None if primary else _replica_session()
+    if session is not None:
+        try:
+            result = read(session)
+            session.commit()
+            return result
+        except SQLAlchemyError as e:
+            print(f"Ошибка запроса к реплике чтения, повтор в основной БД: {e}")
+            ReadScopedSession.remove()
+            replica_lag.mark_unavailable()
+    with session_scope() as session:
+        return read(session)
 
 
 class KillsSaver(Base):
     __tablename__ = 'kills'
+    __table_args__ = (
+        Index('ix_kills_player_id_time', 'player_id', 'time'),
+        Index('ix_kills_time', 'time'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    player_id = Column(BigInteger, nullable=False, index=True)
+    player_id = Column(BigInteger, nullable=False)
     time = Column(DateTime(timezone=True), default=datetime.utcnow)
     mob_type = Column(String(10), nullable=False)
 
@@ -29,4 +348,31 @@ class KillsSaver(Base):
         return f'id {self.id}; player_id {self.player_id}; time {self.time}; type {self.mob_type}'
 
 
-Base.metadata.create_all(bind=engine)
+class KillsDaily(Base):
+    """
+    Сводка убийств по дням и типам монстров, обновляется при записи убийств.
+    """
+    __tablename__ = 'kills_daily'
+
+    date = Column(Date, primary_key=True)
+    mob_type = Column(String(10), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'date {self.date}; type {self.mob_type}; count {self.count}'
+
+
+class KillsArchive(Base):
+    """
+    Убийства из архивированных месяцев, свернутые по игроку и типу монстра.
+    Сами строки этих месяцев выгружаются в файлы и удаляются из kills.
+    """
+    __tablename__ = 'kills_archive'
+
+    month = Column(Date, primary_key=True)
+    player_id = Column(BigInteger, primary_key=True)
+    mob_type = Column(String(10), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'month {self.month}; player_id {self.player_id}; type {self.mob_type}; count {self.count}'
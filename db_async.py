@@ -0,0 +1,119 @@
+"""
+Асинхронный доступ к статистике убийств.
+
+Использует те же модели и запросы, что и db_utils, но через асинхронный
+движок SQLAlchemy: для SQLite драйвер aiosqlite, для PostgreSQL asyncpg.
+Асинхронный фронтенд может ожидать запись и чтение убийств без передачи
+работы в пул потоков.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.engine import make_url
+from database import DATABASE_URL, Base, KillsSaver, engine_options
+from analytics import KillsSeries
+from db_utils import bump_daily, daily_kills_statement, notify_kill
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+async_engine = None
+AsyncSessionLocal = None
+_init_lock = asyncio.Lock()
+
+
+def async_url(url: str) -> str:
+    """
+    Переводит адрес БД на асинхронный драйвер.
+
+    Адреса, в которых драйвер уже указан и не является синхронным драйвером
+    по умолчанию (например, sqlite+aiosqlite), возвращаются без изменений.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.get_driver_name() in ('pysqlite', 'psycopg2', 'psycopg'):
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+async def init_async_db(url: str = None):
+    """
+    Создает асинхронный движок, фабрику сессий и таблицы.
+
+    Параметры пула берутся из тех же переменных окружения, что и для
+    синхронного движка. Повторные вызовы возвращают уже созданный движок.
+    """
+    global async_engine, AsyncSessionLocal
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    async with _init_lock:
+        if async_engine is None:
+            url = url or DATABASE_URL
+            if not url:
+                raise RuntimeError('Не задан DB_URL для подключения к базе данных')
+            url = async_url(url)
+            new_engine = create_async_engine(url, **engine_options(url))
+            async with new_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            AsyncSessionLocal = async_sessionmaker(new_engine, autoflush=False, expire_on_commit=False)
+            async_engine = new_engine
+        return async_engine
+
+
+async def close_async_db() -> None:
+    """
+    Закрывает соединения асинхронного движка.
+    """
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """
+    Выдает асинхронную сессию на время блока: commit при успехе, rollback при исключении.
+    """
+    if async_engine is None:
+        await init_async_db()
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def save_kill_async(player_id: int, mob_type: str) -> int:
+    """
+    Асинхронно записывает убийство и обновляет дневную сводку. Возвращает id убийства.
+    """
+    row = {'player_id': player_id, 'mob_type': mob_type, 'time': datetime.utcnow()}
+    async with async_session_scope() as session:
+        result = await session.execute(insert(KillsSaver).values(**row).returning(KillsSaver.id))
+        kill_id = result.scalar_one()
+        await session.run_sync(bump_daily, [row])
+    notify_kill(player_id, mob_type, row['time'])
+    return kill_id
+
+
+async def get_kills_series_async(player_id: int = None, since: datetime = None) -> KillsSeries:
+    """
+    Асинхронный вариант db_utils.get_kills_series: убийства по дням в колоночном виде.
+    """
+    async with async_session_scope() as session:
+        results = (await session.execute(daily_kills_statement(player_id, since))).all()
+    return KillsSeries.from_rows(results)
+
+
+async def get_kills_async(player_id: int = None, since: datetime = None):
+    """
+    Асинхронный вариант db_utils.get_kills: DataFrame убийств по дням.
+    """
+    return (await get_kills_series_async(player_id, since)).to_frame()
@@ -1,64 +1,436 @@
-from database import KillsSaver, SessionLocal
-import pandas as pd
-from sqlalchemy import func
-import matplotlib.pyplot as plt
-import io
+from database import KillsArchive, KillsDaily, KillsSaver, ScopedSession, get_engine, read_query, session_scope
+from sqlalchemy import Float, case, cast, delete, extract, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from analytics import MOB_TYPES, HourHeatmap, KillsSeries, KillTrends
+from charts import render_kills_chart
+from retention import add_months
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+KILL_LISTENERS = []
+
+
+def add_kill_listener(listener) -> None:
+    """
+    Регистрирует функцию listener(player_id, mob_type, time), которая
+    вызывается при каждом убийстве, переданном в save_kill или KillWriter.
+    """
+    KILL_LISTENERS.append(listener)
+
+
+def notify_kill(player_id: int, mob_type: str, when: datetime) -> None:
+    for listener in KILL_LISTENERS:
+        try:
+            listener(player_id, mob_type, when)
+        except Exception as e:
+            print(f"Ошибка обработчика убийства: {e}")
+
+
+def bump_daily(db, rows: list) -> None:
+    """
+    Добавляет убийства к дневной сводке kills_daily в текущей транзакции.
+
+    Для SQLite и PostgreSQL используется INSERT ... ON CONFLICT DO UPDATE,
+    для остальных БД - UPDATE с INSERT при отсутствии строки.
+    """
+    counts = Counter((row['time'].date(), row['mob_type']) for row in rows)
+    dialect = db.get_bind().dialect.name
+    for (day, mob_type), count in counts.items():
+        if dialect in ('sqlite', 'postgresql'):
+            module = sqlite if dialect == 'sqlite' else postgresql
+            stmt = module.insert(KillsDaily).values(date=day, mob_type=mob_type, count=count)
+            db.execute(stmt.on_conflict_do_update(index_elements=['date', 'mob_type'],
+                                                  set_={'count': KillsDaily.count + stmt.excluded.count}))
+        else:
+            result = db.execute(update(KillsDaily)
+                                .where(KillsDaily.date == day, KillsDaily.mob_type == mob_type)
+                                .values(count=KillsDaily.count + count))
+            if result.rowcount == 0:
+                db.add(KillsDaily(date=day, mob_type=mob_type, count=count))
+
+
+def rebuild_daily_rollup(session_factory=ScopedSession) -> int:
+    """
+    Пересчитывает kills_daily по таблице kills. Возвращает число строк сводки.
+
+    Строки архивированных месяцев удалены из kills, поэтому их дни в сводке
+    не трогаются: пересчитываются только дни после последнего месяца из
+    kills_archive.
+    """
+    with session_scope(session_factory) as db:
+        last_archived = db.query(func.max(KillsArchive.month)).scalar()
+        day = func.date(KillsSaver.time)
+        rollup = select(day, KillsSaver.mob_type, func.count()).group_by(day, KillsSaver.mob_type)
+        stale = delete(KillsDaily)
+        if last_archived is not None:
+            if isinstance(last_archived, str):
+                last_archived = date.fromisoformat(last_archived)
+            start = add_months(last_archived, 1)
+            rollup = rollup.where(KillsSaver.time >= datetime.combine(start, datetime.min.time()))
+            stale = stale.where(KillsDaily.date >= start)
+        db.execute(stale)
+        db.execute(insert(KillsDaily).from_select(['date', 'mob_type', 'count'], rollup))
+        return db.query(KillsDaily).count()
 
 
 def save_kill(player_id: int, mob_type: str) -> int:
-    db = SessionLocal()
-    try:
-        db_string = KillsSaver(player_id=player_id, mob_type=mob_type)
+    with session_scope() as db:
+        db_string = KillsSaver(player_id=player_id, mob_type=mob_type, time=datetime.utcnow())
         db.add(db_string)
-        db.commit()
-        db.refresh(db_string)
-        return db_string.id
-    except Exception as e:
-        db.rollback()
-        raise e
-    finally:
-        db.close()
-
-
-def get_kills():
-    """
-    Возвращает DataFrame с колонками: date, обычный, ивентовый
-    """
-    session = SessionLocal()
-    try:
-        query = session.query(func.date(KillsSaver.time).label("date"), KillsSaver.mob_type,
-                              func.count().label("count")
-                              ).group_by(func.date(KillsSaver.time),
-                                         KillsSaver.mob_type).order_by("date")
-        results = query.all()
-        df = pd.DataFrame(results, columns=["date", "mob_type", "count"])
-        if df.empty:
-            return pd.DataFrame(columns=["date", "обычный", "ивентовый"])
-        df_pivot = df.pivot(index="date", columns="mob_type", values="count").fillna(0)
-        df_pivot.index = pd.to_datetime(df_pivot.index)
-        return df_pivot.sort_index()
-    finally:
-        session.close()
-
-
-def kills_to_table(df: pd.DataFrame) -> bytes:
+        db.flush()
+        bump_daily(db, [{'mob_type': mob_type, 'time': db_string.time}])
+        kill_id = db_string.id
+    notify_kill(player_id, mob_type, db_string.time)
+    return kill_id
+
+
+class KillWriter:
     """
-    Строит график и возвращает его как png
+    Буферизованная запись убийств в БД.
+
+    Убийства складываются в ограниченную очередь, фоновый поток пишет их
+    пачками одним многострочным INSERT раз в flush_interval секунд или при
+    накоплении batch_size строк. Если очередь заполнена, вызывающий поток
+    ждет (backpressure), а по истечении put_timeout пишет убийство сам.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, session_factory=ScopedSession, batch_size: int = 500, flush_interval: float = 0.2,
+                 max_queue: int = 10000, put_timeout: float = 1.0):
+        """
+        Инициализирует запись убийств; фоновый поток запускается при первом убийстве.
+
+        Args:
+            session_factory: Фабрика сессий для записи пачек.
+            batch_size (int): Максимальный размер пачки.
+            flush_interval (float): Сколько секунд набирать пачку после первого убийства в ней.
+            max_queue (int): Максимальная длина очереди.
+            put_timeout (float): Сколько секунд ждать места в очереди, прежде чем записать убийство самому.
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.written = 0
+        self.batches = 0
+        self.overflows = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._put_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._processed = threading.Condition(self._lock)
+        self._enqueued = 0
+        self._done = 0
+        self._thread = None
+        self._closed = False
+
+    def add(self, player_id: int, mob_type: str) -> None:
+        """
+        Ставит убийство в очередь на запись. Время убийства фиксируется сразу.
+
+        Проверка закрытия и постановка в очередь без ожидания выполняются под
+        одной блокировкой, поэтому убийство не может оказаться в очереди после
+        метки остановки из close. Места в заполненной очереди поток ждет уже
+        без блокировки, чтобы одновременные убийства ждали параллельно.
+        """
+        row = {'player_id': player_id, 'mob_type': mob_type, 'time': datetime.utcnow()}
+        deadline = time.monotonic() + self.put_timeout
+        queued = False
+        while not queued:
+            with self._put_lock:
+                if self._closed:
+                    raise RuntimeError('KillWriter закрыт')
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='kill-writer', daemon=True)
+                    self._thread.start()
+                try:
+                    self._queue.put_nowait(row)
+                    queued = True
+                    with self._lock:
+                        self._enqueued += 1
+                except queue.Full:
+                    pass
+            remaining = deadline - time.monotonic()
+            if queued or remaining <= 0:
+                break
+            with self._queue.not_full:
+                self._queue.not_full.wait_for(lambda: len(self._queue.queue) < self._queue.maxsize, remaining)
+        if not queued:
+            with self._lock:
+                self.overflows += 1
+            self._insert([row])
+        notify_kill(player_id, mob_type, row['time'])
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Ждет записи убийств, поставленных в очередь до вызова.
+
+        Убийства, добавленные во время ожидания, не учитываются, поэтому при
+        постоянном потоке убийств ожидание не затягивается.
+
+        Args:
+            timeout (float): Максимальное время ожидания в секундах (None - без ограничения).
+
+        Returns:
+            bool: True, если все убийства до вызова обработаны.
+        """
+        with self._lock:
+            target = self._enqueued
+            return self._processed.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self) -> None:
+        """
+        Записывает оставшиеся убийства и останавливает фоновый поток.
+        """
+        with self._put_lock:
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        """
+        Цикл фонового потока: набирает пачку и пишет ее одним запросом.
+        """
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write_batch(batch)
+                with self._lock:
+                    self._done += len(batch)
+                    self._processed.notify_all()
+
+    def _write_batch(self, batch: list) -> None:
+        """
+        Пишет пачку с повторными попытками. Если пачку так и не удалось
+        записать, убийства пишутся по одному, чтобы одна ошибочная строка не
+        забрала с собой всю пачку; не записанные и так строки учитываются в dropped.
+        """
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                self._insert(batch)
+                with self._lock:
+                    self.batches += 1
+                return
+            except Exception as e:
+                print(f"Ошибка записи пачки убийств ({len(batch)} шт.), попытка {attempt + 1}: {e}")
+                time.sleep(self.flush_interval * (attempt + 1))
+        for row in batch:
+            try:
+                self._insert([row])
+            except Exception as e:
+                print(f"Ошибка записи убийства {row}: {e}")
+                with self._lock:
+                    self.dropped += 1
+
+    def _insert(self, rows: list) -> None:
+        with session_scope(self.session_factory) as db:
+            db.execute(insert(KillsSaver), rows)
+            bump_daily(db, rows)
+        with self._lock:
+            self.written += len(rows)
+
+
+def kills_version() -> tuple:
+    """
+    Возвращает версию данных статистики: максимальный id убийства и сумму дневной сводки.
+
+    Версия меняется при каждом новом убийстве и при пересчете сводки, а сам
+    запрос читает только индекс первичного ключа и O(days) строк сводки.
+    """
+    def read(session):
+        return session.query(func.max(KillsSaver.id)).scalar(), session.query(func.sum(KillsDaily.count)).scalar()
+
+    last_id, total = read_query(read)
+    return last_id or 0, int(total or 0)
+
+
+def daily_kills_statement(player_id: int = None, since: datetime = None):
+    """
+    Строит запрос убийств по дням с условной агрегацией:
+    строки (date, simple, event) по возрастанию даты.
+
+    Общая статистика читается из дневной сводки kills_daily, статистика
+    игрока - из kills через составной индекс (player_id, time).
     """
-    if df.empty:
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.text(0.5, 0.5, 'Нет данных об убийствах', horizontalalignment='center', verticalalignment='center')
-        ax.axis('off')
+    if player_id is None:
+        day = KillsDaily.date
+        columns = [func.sum(case((KillsDaily.mob_type == mob_type, KillsDaily.count), else_=0)) for mob_type in MOB_TYPES]
+        stmt = select(day, *columns)
+        if since is not None:
+            stmt = stmt.where(KillsDaily.date >= since.date())
     else:
-        df.plot(kind='bar', figsize=(12, 6), color=['#1f77b4', '#ff7f0e'])
-        plt.title('Убийства монстров по дням')
-        plt.xlabel('Дата')
-        plt.ylabel('Количество')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close()
-    buf.seek(0)
-    return buf.read()
+        day = func.date(KillsSaver.time)
+        columns = [func.sum(case((KillsSaver.mob_type == mob_type, 1), else_=0)) for mob_type in MOB_TYPES]
+        stmt = select(day, *columns).where(KillsSaver.player_id == player_id)
+        if since is not None:
+            stmt = stmt.where(KillsSaver.time >= since)
+    return stmt.group_by(day).order_by(day)
+
+
+def get_kills_series(player_id: int = None, since: datetime = None) -> KillsSeries:
+    """
+    Возвращает убийства по дням в колоночном виде, без pandas.
+    Параметры те же, что у get_kills. Статистика игрока читается из основной
+    БД, чтобы включать его только что записанные убийства.
+    """
+    stmt = daily_kills_statement(player_id, since)
+    return read_query(lambda session: KillsSeries.from_rows(session.execute(stmt)), primary=player_id is not None)
+
+
+def get_kills(player_id: int = None, since: datetime = None):
+    """
+    Возвращает DataFrame с колонками: date, обычный, ивентовый.
+
+    Общая статистика читается из дневной сводки kills_daily, а не из всей
+    таблицы kills. Статистика игрока (player_id) считается по kills через
+    составной индекс (player_id, time), поэтому читаются только его строки
+    начиная с since. Без pandas те же данные дает get_kills_series.
+    """
+    return get_kills_series(player_id, since).to_frame()
+
+
+def hour_heatmap_statement(player_id: int = None, since: datetime = None):
+    """
+    Строит запрос убийств по дню недели и часу: не более 7 * 24 строк
+    (dow, hour, count), где dow 0 - воскресенье.
+    """
+    weekday = extract('dow', KillsSaver.time)
+    hour = extract('hour', KillsSaver.time)
+    stmt = select(weekday, hour, func.count())
+    if player_id is not None:
+        stmt = stmt.where(KillsSaver.player_id == player_id)
+    if since is not None:
+        stmt = stmt.where(KillsSaver.time >= since)
+    return stmt.group_by(weekday, hour)
+
+
+def get_hour_heatmap(player_id: int = None, since: datetime = None) -> HourHeatmap:
+    """
+    Возвращает тепловую карту убийств по дню недели и часу (UTC).
+    Группировка выполняется в БД, в Python приходит не более 168 строк.
+    Карта игрока читается из основной БД, как и в get_kills_series.
+    """
+    stmt = hour_heatmap_statement(player_id, since)
+    return read_query(lambda session: HourHeatmap.from_rows(session.execute(stmt)), primary=player_id is not None)
+
+
+def kill_trends_statement(since: datetime = None, window: int = 7):
+    """
+    Строит запрос дневных трендов по сводке kills_daily: строки
+    (date, total, rolling, event_share) по возрастанию даты.
+
+    rolling - оконное среднее total за window последних дней с убийствами,
+    event_share - доля ивентовых убийств за день. Фильтр since применяется
+    после окна, чтобы первые дни периода учитывали предыдущие.
+    """
+    total = func.sum(KillsDaily.count)
+    daily = (select(KillsDaily.date.label('date'), total.label('total'),
+                    (cast(func.sum(case((KillsDaily.mob_type == 'event', KillsDaily.count), else_=0)), Float)
+                     / func.nullif(total, 0)).label('event_share'))
+             .group_by(KillsDaily.date).subquery())
+    rolling = func.avg(daily.c.total).over(order_by=daily.c.date, rows=(-(window - 1), 0))
+    trends = select(daily.c.date, daily.c.total, rolling.label('rolling'), daily.c.event_share).subquery()
+    stmt = select(trends.c.date, trends.c.total, trends.c.rolling, trends.c.event_share)
+    if since is not None:
+        stmt = stmt.where(trends.c.date >= since.date())
+    return stmt.order_by(trends.c.date)
+
+
+def get_kill_trends(since: datetime = None, window: int = 7) -> KillTrends:
+    """
+    Возвращает дневные итоги убийств со скользящим средним и долей ивентовых
+    убийств. Окно и доли считаются в БД оконными функциями.
+    """
+    stmt = kill_trends_statement(since, window)
+    return read_query(lambda session: KillTrends.from_rows(session.execute(stmt), window))
+
+
+def kill_counts_by_player(since: datetime = None) -> dict:
+    """
+    Возвращает число убийств каждого игрока начиная с since (None - за все время).
+    Используется для сверки таблиц лидеров. Итоги за все время включают
+    месяцы, перенесенные в kills_archive. Читается из основной БД: сверка
+    заменяет таблицы лидеров, и отстающая реплика откатила бы свежие убийства.
+    """
+    with session_scope() as session:
+        query = session.query(KillsSaver.player_id, func.count())
+        if since is not None:
+            query = query.filter(KillsSaver.time >= since)
+        counts = Counter(dict(query.group_by(KillsSaver.player_id).all()))
+        if since is None:
+            archived = session.query(KillsArchive.player_id, func.sum(KillsArchive.count)
+                                     ).group_by(KillsArchive.player_id).all()
+            counts.update({player_id: int(count) for player_id, count in archived})
+        return dict(counts)
+
+
+def add_player_time_index() -> str:
+    """
+    Создает составной индекс (player_id, time) на существующей таблице kills
+    и удаляет ставший лишним индекс по одному player_id.
+
+    В PostgreSQL индекс строится через CREATE INDEX CONCURRENTLY вне
+    транзакции, поэтому запись убийств во время построения не блокируется.
+    Возвращает имя диалекта БД.
+    """
+    engine = get_engine()
+    dialect = engine.dialect.name
+    concurrently = ' CONCURRENTLY' if dialect == 'postgresql' else ''
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(f'CREATE INDEX{concurrently} IF NOT EXISTS ix_kills_player_id_time '
+                          f'ON kills (player_id, time)'))
+        conn.execute(text(f'DROP INDEX{concurrently} IF EXISTS ix_kills_player_id'))
+    return dialect
+
+
+def add_time_index() -> str:
+    """
+    Создает индекс по time на существующей таблице kills. По нему общая
+    тепловая карта /heatmap, архивация и выгрузка читают только нужный
+    диапазон времени, а не всю таблицу.
+
+    В PostgreSQL индекс строится через CREATE INDEX CONCURRENTLY вне
+    транзакции, поэтому запись убийств во время построения не блокируется.
+    Возвращает имя диалекта БД.
+    """
+    engine = get_engine()
+    dialect = engine.dialect.name
+    concurrently = ' CONCURRENTLY' if dialect == 'postgresql' else ''
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text(f'CREATE INDEX{concurrently} IF NOT EXISTS ix_kills_time ON kills (time)'))
+    return dialect
+
+
+def kills_to_table(df: 'pd.DataFrame') -> bytes:
+    """
+    Строит график и возвращает его как png
+    """
+    return render_kills_chart(df)
@@ -17,6 +17,11 @@ class Druid(Character):
     характеристики и уникальные способности друида.
     """
 
+    SCHEMA = {
+        **Character.SCHEMA,
+        'cool_down': int,
+    }
+
     def __init__(self, name: str = "Druid") -> None:
         """
         Инициализирует экземпляр класса Druid.
@@ -35,7 +40,7 @@ class Druid(Character):
             'lvl': 1,
             'crit_chance': 7,
             'def_chance': 30,
-            'coefficent': 0.1,
+            'coefficient': 0.1,
             'cool_down': 3,
             'initiative': False,
         })
@@ -55,9 +60,9 @@ class Druid(Character):
         """
         try:
             if switcher:
-                self.characteristics['power'] += 20
+                self.buff('Вызов духов', 'power', self.characteristics['power'] + 20)
             else:
-                self.characteristics['power'] -= 20
+                self.unbuff('Вызов духов', 'power', self.characteristics['power'] - 20)
         except Exception as e:
             print(f"Ошибка при использовании способности 'Вызов духов': {e}")
 
@@ -10,6 +10,12 @@ class DataStorageError(Exception):
     pass
 
 
+class WriteBehindError(DataStorageError):
+    def __init__(self, files):
+        super().__init__(f"Не удалось записать файлы: {', '.join(files)}")
+        self.files = files
+
+
 class InvalidCharacterClassError(CharacterError):
     pass
 
@@ -17,6 +17,11 @@ class Hunter(Character):
     характеристики и уникальные способности охотника.
     """
 
+    SCHEMA = {
+        **Character.SCHEMA,
+        'cool_down': int,
+    }
+
     def __init__(self, name: str = "Hunter") -> None:
         """
         Инициализирует экземпляр класса Hunter.
@@ -35,7 +40,7 @@ class Hunter(Character):
             'lvl': 1,
             'crit_chance': 10,
             'def_chance': 50,
-            'coefficent': 0.1,
+            'coefficient': 0.1,
             'cool_down': 3,
             'initiative': False,
         })
@@ -55,9 +60,9 @@ class Hunter(Character):
         """
         try:
             if switcher:
-                self.characteristics['def_chance'] += 20
+                self.buff('Увертливость', 'def_chance', self.characteristics['def_chance'] + 20)
             else:
-                self.characteristics['def_chance'] -= 20
+                self.unbuff('Увертливость', 'def_chance', self.characteristics['def_chance'] - 20)
         except Exception as e:
             print(f"Ошибка при использовании способности 'Увертливость': {e}")
 
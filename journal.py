@@ -0,0 +1,334 @@
+"""
+Модуль разностных сохранений персонажей с журналом изменений.
+
+JournalDataManager хранит полный снимок персонажа через обычный менеджер
+данных, а при каждом следующем сохранении дописывает в журнал игрока только
+изменившиеся поля. После compact_every записей журнал сворачивается в новый
+снимок. При чтении персонаж восстанавливается из снимка и журнала.
+
+Снимок и каждая запись журнала помечены номером поколения. Сворачивание
+записывает снимок следующего поколения и только потом удаляет журнал; если
+сбой случился между этими шагами, записи старого поколения при чтении
+пропускаются и не откатывают поля нового снимка.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+from character import Character
+from data_manager import CHARACTER_TYPES, DataManager
+from exceptions import DataStorageError, WriteBehindError
+
+
+def diff_characters(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Вычисляет разницу между двумя словарями персонажа формата Character.to_dict.
+
+    Args:
+        old (Dict[str, Any]): Последний сохраненный словарь.
+        new (Dict[str, Any]): Текущий словарь.
+
+    Returns:
+        Dict[str, Any]: Запись журнала. Ключ 's' - измененные характеристики,
+            'd' - удаленные характеристики, 'n', 't', 'a', 'v' - новые имя, тип,
+            список способностей и версия формата. Пустой словарь, если изменений нет.
+    """
+    entry: Dict[str, Any] = {}
+    old_stats = old.get('characteristics', {})
+    new_stats = new.get('characteristics', {})
+    changed = {key: value for key, value in new_stats.items()
+               if key not in old_stats or old_stats[key] != value or type(old_stats[key]) is not type(value)}
+    if changed:
+        entry['s'] = changed
+    removed = [key for key in old_stats if key not in new_stats]
+    if removed:
+        entry['d'] = removed
+    for key, short in (('name', 'n'), ('type', 't'), ('abilities', 'a'), ('version', 'v')):
+        if old.get(key) != new.get(key):
+            entry[short] = new.get(key)
+    return entry
+
+
+def apply_entry(data: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Применяет запись журнала к словарю персонажа.
+
+    Args:
+        data (Dict[str, Any]): Словарь персонажа.
+        entry (Dict[str, Any]): Запись журнала из diff_characters.
+
+    Returns:
+        Dict[str, Any]: Тот же словарь с примененными изменениями.
+    """
+    characteristics = data.setdefault('characteristics', {})
+    characteristics.update(entry.get('s', {}))
+    for key in entry.get('d', ()):
+        characteristics.pop(key, None)
+    for key, short in (('name', 'n'), ('type', 't'), ('abilities', 'a'), ('version', 'v')):
+        if short in entry:
+            data[key] = entry[short]
+    return data
+
+
+class JournalDataManager(DataManager):
+    """
+    Менеджер разностных сохранений поверх обычного менеджера данных.
+
+    Журнал игрока хранится рядом со снимком в скрытом файле
+    .<имя файла>.journal, по одной JSON-записи изменений на строку.
+    """
+
+    JOURNAL_SUFFIX = '.journal'
+
+    def __init__(self, base: DataManager, compact_every: int = 50, fsync: bool = True) -> None:
+        """
+        Инициализирует менеджер разностных сохранений.
+
+        Args:
+            base (DataManager): Менеджер, который хранит полные снимки.
+            compact_every (int): Через сколько записей журнала сворачивать его в снимок.
+            fsync (bool): Сбрасывать ли каждую запись журнала на диск.
+        """
+        super().__init__(base.serializer)
+        self.base = base
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.journal_bytes = 0
+        self.compactions = 0
+        self._states: Dict[str, Tuple[Dict[str, Any], int, int]] = {}
+        self._lock = threading.Lock()
+
+    def journal_path(self, filename: str) -> str:
+        """
+        Возвращает путь к журналу игрока.
+
+        Args:
+            filename (str): Имя файла снимка.
+
+        Returns:
+            str: Путь к файлу журнала.
+        """
+        path = self.base.path(filename)
+        return os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}{self.JOURNAL_SUFFIX}')
+
+    def exists(self, filename: str) -> bool:
+        """
+        Проверяет, есть ли снимок персонажа.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True, если сохранение существует.
+        """
+        return self.base.exists(filename)
+
+    def create(self, character: Character, filename: str) -> bool:
+        """
+        Сохраняет персонажа: полный снимок при первом сохранении, иначе запись журнала.
+
+        Args:
+            character (Character): Объект персонажа для сохранения.
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True при успешном сохранении.
+
+        Raises:
+            DataStorageError: При ошибке записи.
+        """
+        data = character.to_dict()
+        with self._lock:
+            state = self._states.get(filename)
+        if state is None:
+            if not self.base.exists(filename):
+                return self.compact(character, filename)
+            self.read(filename)
+            with self._lock:
+                state = self._states[filename]
+        snapshot, entries, generation = state
+        entry = diff_characters(snapshot, data)
+        if not entry:
+            return True
+        if 't' in entry or entries + 1 >= self.compact_every:
+            try:
+                return self.compact(character, filename)
+            except DataStorageError as e:
+                if 't' in entry:
+                    raise
+                print(f"Ошибка сжатия журнала {filename}, изменения дописаны в журнал: {e}")
+        self._append(filename, {**entry, 'g': generation})
+        with self._lock:
+            self._states[filename] = (data, entries + 1, generation)
+        return True
+
+    def read(self, filename: str) -> Character:
+        """
+        Восстанавливает персонажа из снимка и журнала.
+
+        Применяются только записи журнала того же поколения, что и снимок.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            Character: Объект персонажа.
+
+        Raises:
+            DataStorageError: При ошибке чтения.
+        """
+        snapshot = self.base.read(filename)
+        generation = snapshot.journal_generation
+        data = snapshot.to_dict()
+        entries = [entry for entry in self._read_journal(filename) if entry.get('g', 0) == generation]
+        for entry in entries:
+            apply_entry(data, entry)
+        with self._lock:
+            self._states[filename] = (data, len(entries), generation)
+        char_type = data.get('type')
+        if char_type not in CHARACTER_TYPES:
+            raise DataStorageError(f"Неизвестный тип персонажа: {char_type}")
+        character = CHARACTER_TYPES[char_type].from_dict({**data, 'characteristics': dict(data['characteristics'])})
+        character.journal_generation = generation
+        return character
+
+    def update(self, character: Character, filename: str) -> bool:
+        """
+        Обновляет данные персонажа.
+
+        Args:
+            character (Character): Объект персонажа для обновления.
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True при успешном обновлении.
+        """
+        return self.create(character, filename)
+
+    def delete(self, filename: str) -> bool:
+        """
+        Удаляет снимок и журнал персонажа.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True при успешном удалении, иначе False.
+        """
+        with self._lock:
+            self._states.pop(filename, None)
+        self._remove_journal(filename)
+        return self.base.delete(filename)
+
+    def compact(self, character: Character, filename: str) -> bool:
+        """
+        Записывает полный снимок персонажа следующего поколения и очищает журнал.
+
+        Снимок должен оказаться на диске до очистки журнала, поэтому очередь
+        отложенной записи базового менеджера при этом сбрасывается. Если
+        снимок записать не удалось, он убирается из очереди, а журнал и
+        поколение остаются прежними. Если журнал не удалось удалить, его
+        записи относятся к прошлому поколению и при чтении пропускаются.
+
+        Args:
+            character (Character): Объект персонажа.
+            filename (str): Имя файла.
+
+        Returns:
+            bool: True при успешной записи.
+
+        Raises:
+            DataStorageError: Если снимок не записан на диск.
+        """
+        with self._lock:
+            state = self._states.get(filename)
+        previous = state[2] if state is not None else character.journal_generation
+        generation = previous + 1
+        character.journal_generation = generation
+        try:
+            self.base.create(character, filename)
+            if self.base.write_behind is not None:
+                path = self.base.path(filename)
+                try:
+                    self.base.write_behind.flush()
+                except WriteBehindError as e:
+                    if path in e.files:
+                        self.base.write_behind.discard(path)
+                        raise
+                    print(f"Ошибка отложенной записи при сжатии журнала {filename}: {e}")
+        except DataStorageError:
+            character.journal_generation = previous
+            raise
+        self._remove_journal(filename)
+        with self._lock:
+            self._states[filename] = (character.to_dict(), 0, generation)
+        self.compactions += 1
+        return True
+
+    def _remove_journal(self, filename: str) -> None:
+        """
+        Удаляет журнал игрока, если он есть.
+
+        Args:
+            filename (str): Имя файла.
+        """
+        try:
+            os.remove(self.journal_path(filename))
+        except FileNotFoundError:
+            pass
+
+    def _append(self, filename: str, entry: Dict[str, Any]) -> None:
+        """
+        Дописывает запись в журнал игрока.
+
+        Args:
+            filename (str): Имя файла.
+            entry (Dict[str, Any]): Запись журнала.
+
+        Raises:
+            DataStorageError: При ошибке записи журнала.
+        """
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            with open(self.journal_path(filename), 'a', encoding='utf-8') as f:
+                f.write(line)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            raise DataStorageError(f"Ошибка при записи журнала: {e}")
+        self.journal_bytes += len(line.encode('utf-8'))
+
+    def _read_journal(self, filename: str) -> List[Dict[str, Any]]:
+        """
+        Читает записи журнала игрока.
+
+        Оборванная последняя строка (сбой во время дозаписи) пропускается.
+
+        Args:
+            filename (str): Имя файла.
+
+        Returns:
+            List[Dict[str, Any]]: Записи журнала по порядку.
+
+        Raises:
+            DataStorageError: Если поврежден журнал не только в последней строке.
+        """
+        try:
+            with open(self.journal_path(filename), 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for number, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                if number == len(lines) - 1:
+                    print(f"Пропущена оборванная запись журнала {filename}")
+                    break
+                raise DataStorageError(f"Журнал {filename} поврежден в строке {number + 1}")
+        return entries
@@ -0,0 +1,189 @@
+"""
+Модуль колоночной выгрузки убийств для аналитики.
+
+Строки kills читаются частями по первичному ключу (id > последний
+выгруженный id, LIMIT chunk_size), поэтому расход памяти ограничен
+размером части, а запросы идут по индексу первичного ключа и не
+сканируют таблицу. Каждая часть записывается в файлы Parquet или
+Arrow IPC, разложенные по каталогам дат в стиле Hive:
+
+    out_dir/date=2024-03-01/part-000000000001-000000000500.parquet
+
+Такой каталог читается как один набор данных, например
+pyarrow.dataset.dataset(out_dir, partitioning='hive'). После каждой
+части последний выгруженный id сохраняется в файл _watermark.json, и
+следующий запуск читает только новые строки.
+
+Id выдаются при вставке, а видны строки после коммита, поэтому строка с
+меньшим id может появиться позже строки с большим (например, пачка
+KillWriter коммитится дольше одиночного save_kill). Чтобы водяной знак не
+перепрыгнул такую строку, выгрузка останавливается на первой строке моложе
+lag секунд: свежие строки и все строки после них ждут следующего запуска.
+
+Строки читаются через read_query, то есть с реплики DB_READ_URL, если
+она задана; lag должен покрывать и отставание реплики. Нужен пакет
+pyarrow.
+"""
+
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select
+from database import KillsSaver, read_query
+from exceptions import DataStorageError
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PARQUET = 'parquet'
+ARROW = 'arrow'
+EXPORT_FORMATS = (PARQUET, ARROW)
+WATERMARK_FILE = '_watermark.json'
+DEFAULT_LAG = 300.0
+
+
+@dataclass
+class KillsExport:
+    """
+    Результат выгрузки убийств.
+
+    Attributes:
+        rows (int): Количество выгруженных строк.
+        files (List[str]): Пути к записанным файлам.
+        watermark (int): Последний выгруженный id.
+    """
+    rows: int = 0
+    files: List[str] = field(default_factory=list)
+    watermark: int = 0
+
+
+def kills_schema():
+    """
+    Возвращает схему Arrow для строк kills.
+
+    Returns:
+        pyarrow.Schema: Схема (id, player_id, time, mob_type).
+    """
+    return pyarrow.schema([('id', pyarrow.int64()), ('player_id', pyarrow.int64()),
+                           ('time', pyarrow.timestamp('us')), ('mob_type', pyarrow.string())])
+
+
+def read_watermark(out_dir: str) -> int:
+    """
+    Читает последний выгруженный id.
+
+    Args:
+        out_dir (str): Каталог выгрузки.
+
+    Returns:
+        int: Последний выгруженный id или 0, если выгрузок еще не было.
+    """
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        return int(json.load(f)['last_id'])
+
+
+def write_watermark(out_dir: str, last_id: int) -> None:
+    """
+    Атомарно сохраняет последний выгруженный id.
+
+    Args:
+        out_dir (str): Каталог выгрузки.
+        last_id (int): Последний выгруженный id.
+    """
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'last_id': last_id, 'exported_at': datetime.utcnow().isoformat()}, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def write_table(table, path: str, fmt: str) -> None:
+    """
+    Записывает таблицу Arrow во временный файл и переименовывает его.
+
+    Args:
+        table (pyarrow.Table): Таблица.
+        path (str): Путь к файлу.
+        fmt (str): Формат: parquet или arrow.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    if fmt == PARQUET:
+        pyarrow.parquet.write_table(table, tmp_path)
+    else:
+        with pyarrow.OSFile(tmp_path, 'wb') as sink, pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def export_kills(out_dir: str, fmt: str = PARQUET, chunk_size: int = 50000,
+                 since_id: Optional[int] = None, lag: float = DEFAULT_LAG,
+                 now: Optional[datetime] = None) -> KillsExport:
+    """
+    Выгружает новые строки kills в файлы, разложенные по датам.
+
+    Водяной знак обновляется после каждой части, поэтому прерванная выгрузка
+    продолжается со следующей части; файлы незавершенной части при том же
+    chunk_size перезаписываются под теми же именами. Выгрузка останавливается
+    на первой строке со временем позже now - lag.
+
+    Args:
+        out_dir (str): Каталог выгрузки.
+        fmt (str): Формат файлов: parquet или arrow.
+        chunk_size (int): Сколько строк читать и держать в памяти за раз.
+        since_id (Optional[int]): Выгружать строки с id больше этого; по умолчанию
+            берется водяной знак из out_dir (0 - полная выгрузка).
+        lag (float): Сколько секунд строка должна пролежать в kills, прежде чем
+            ее выгрузить; должно превышать самую долгую транзакцию записи убийств.
+        now (Optional[datetime]): Текущее время (UTC).
+
+    Returns:
+        KillsExport: Результат выгрузки.
+
+    Raises:
+        DataStorageError: Если pyarrow не установлен или формат неизвестен.
+    """
+    if pyarrow is None:
+        raise DataStorageError("Для выгрузки убийств установите пакет pyarrow.")
+    if fmt not in EXPORT_FORMATS:
+        raise DataStorageError(f"Неизвестный формат выгрузки: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    last_id = read_watermark(out_dir) if since_id is None else since_id
+    result = KillsExport(watermark=last_id)
+    schema = kills_schema()
+    horizon = (now or datetime.utcnow()) - timedelta(seconds=lag)
+    while True:
+        stmt = (select(KillsSaver.id, KillsSaver.player_id, KillsSaver.time, KillsSaver.mob_type)
+                .where(KillsSaver.id > last_id).order_by(KillsSaver.id).limit(chunk_size))
+        rows = read_query(lambda session: session.execute(stmt).all())
+        settled = next((index for index, row in enumerate(rows) if row.time >= horizon), len(rows))
+        complete = settled == len(rows)
+        rows = rows[:settled]
+        if not rows:
+            return result
+        by_date = defaultdict(list)
+        for row in rows:
+            by_date[row.time.date()].append(row)
+        for day, day_rows in sorted(by_date.items()):
+            columns = list(zip(*day_rows))
+            table = pyarrow.Table.from_arrays([pyarrow.array(values, type=column.type)
+                                               for values, column in zip(columns, schema)], schema=schema)
+            path = os.path.join(out_dir, f'date={day:%Y-%m-%d}',
+                                f'part-{day_rows[0].id:012d}-{day_rows[-1].id:012d}.{fmt}')
+            write_table(table, path, fmt)
+            result.files.append(path)
+        last_id = rows[-1].id
+        write_watermark(out_dir, last_id)
+        result.rows += len(rows)
+        result.watermark = last_id
+        if not complete:
+            return result
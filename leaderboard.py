@@ -0,0 +1,342 @@
+"""
+Модуль таблиц лидеров.
+
+Таблицы (убийства за сегодня, за неделю, за все время и максимальный уровень)
+хранятся в памяти и обновляются на каждом убийстве и повышении уровня. Каждая
+таблица держит отсортированный top-K, поэтому команда /top отдается за O(K).
+Периодическая сверка с БД исправляет расхождения, например после перезапуска
+бота или пересчета статистики.
+"""
+
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TopK:
+    """
+    Счета игроков с поддерживаемым списком K лучших.
+    """
+
+    def __init__(self, k: int = 10) -> None:
+        """
+        Инициализирует таблицу.
+
+        Args:
+            k (int): Размер списка лучших.
+        """
+        self.k = k
+        self.scores: Dict[int, int] = {}
+        self._top: List[Tuple[int, int]] = []
+
+    def add(self, player_id: int, delta: int = 1) -> None:
+        """
+        Увеличивает счет игрока.
+
+        Args:
+            player_id (int): ID игрока.
+            delta (int): Прибавка к счету.
+        """
+        self.set(player_id, self.scores.get(player_id, 0) + delta)
+
+    def set(self, player_id: int, score: int) -> None:
+        """
+        Устанавливает счет игрока и обновляет список лучших.
+
+        Если счет игрока из списка лучших уменьшился, список пересчитывается
+        по всем счетам; в остальных случаях обновление стоит O(K log K).
+
+        Args:
+            player_id (int): ID игрока.
+            score (int): Новый счет.
+        """
+        previous = self.scores.get(player_id)
+        self.scores[player_id] = score
+        in_top = any(pid == player_id for pid, _ in self._top)
+        if in_top and previous is not None and score < previous:
+            self._rebuild()
+            return
+        if in_top:
+            self._top = [(pid, score if pid == player_id else value) for pid, value in self._top]
+        elif len(self._top) < self.k or score > self._top[-1][1]:
+            self._top.append((player_id, score))
+        else:
+            return
+        self._top.sort(key=lambda item: (-item[1], item[0]))
+        del self._top[self.k:]
+
+    def replace(self, scores: Dict[int, int]) -> None:
+        """
+        Заменяет все счета, например результатом сверки с БД.
+
+        Args:
+            scores (Dict[int, int]): Счета по ID игрока.
+        """
+        self.scores = dict(scores)
+        self._rebuild()
+
+    def top(self) -> List[Tuple[int, int]]:
+        """
+        Возвращает список лучших.
+
+        Returns:
+            List[Tuple[int, int]]: Пары (ID игрока, счет) по убыванию счета.
+        """
+        return list(self._top)
+
+    def _rebuild(self) -> None:
+        self._top = heapq.nsmallest(self.k, self.scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class PeriodTopK(TopK):
+    """
+    Таблица лучших за календарный период, которая обнуляется при смене периода.
+    """
+
+    def __init__(self, k: int, start: Callable[[datetime], datetime]) -> None:
+        """
+        Инициализирует таблицу периода.
+
+        Args:
+            k (int): Размер списка лучших.
+            start (Callable[[datetime], datetime]): Начало периода, в который попадает время.
+        """
+        super().__init__(k)
+        self.start = start
+        self.current: Optional[datetime] = None
+
+    def roll(self, when: datetime) -> bool:
+        """
+        Переходит к периоду времени when, обнуляя счета при смене периода.
+
+        Args:
+            when (datetime): Время события (UTC).
+
+        Returns:
+            bool: False, если событие относится к уже прошедшему периоду.
+        """
+        start = self.start(when)
+        if self.current is None or start > self.current:
+            self.current = start
+            self.replace({})
+        return start == self.current
+
+
+def day_start(when: datetime) -> datetime:
+    """
+    Возвращает начало суток.
+
+    Args:
+        when (datetime): Время (UTC).
+
+    Returns:
+        datetime: Полночь того же дня.
+    """
+    return datetime(when.year, when.month, when.day)
+
+
+def week_start(when: datetime) -> datetime:
+    """
+    Возвращает начало недели.
+
+    Args:
+        when (datetime): Время (UTC).
+
+    Returns:
+        datetime: Полночь понедельника той же недели.
+    """
+    return day_start(when) - timedelta(days=when.weekday())
+
+
+class Leaderboards:
+    """
+    Набор таблиц лидеров бота.
+
+    Attributes:
+        kills_day (PeriodTopK): Убийства за текущие сутки (UTC).
+        kills_week (PeriodTopK): Убийства за текущую ISO-неделю.
+        kills_all (TopK): Убийства за все время.
+        levels (TopK): Максимальный уровень персонажа игрока.
+        names (Dict[int, str]): Последние известные имена персонажей игроков.
+    """
+
+    def __init__(self, k: int = 10) -> None:
+        """
+        Инициализирует таблицы лидеров.
+
+        Args:
+            k (int): Размер каждой таблицы.
+        """
+        self.kills_day = PeriodTopK(k, day_start)
+        self.kills_week = PeriodTopK(k, week_start)
+        self.kills_all = TopK(k)
+        self.levels = TopK(k)
+        self.names: Dict[int, str] = {}
+        self.reconciled_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._captured: Optional[List[Tuple[int, datetime]]] = None
+
+    def record_kill(self, player_id: int, mob_type: str, when: datetime) -> None:
+        """
+        Учитывает убийство. Подходит как слушатель db_utils.add_kill_listener.
+
+        Args:
+            player_id (int): ID игрока.
+            mob_type (str): Тип монстра.
+            when (datetime): Время убийства (UTC).
+        """
+        with self._lock:
+            self._apply_kill(player_id, when)
+            if self._captured is not None:
+                self._captured.append((player_id, when))
+
+    def record_level(self, player_id: int, name: str, lvl: int) -> None:
+        """
+        Учитывает уровень персонажа игрока; в таблице остается максимальный.
+
+        Args:
+            player_id (int): ID игрока.
+            name (str): Имя персонажа.
+            lvl (int): Уровень.
+        """
+        with self._lock:
+            self.names[player_id] = name
+            if lvl > self.levels.scores.get(player_id, 0):
+                self.levels.set(player_id, lvl)
+
+    def reconcile(self, kill_counts: Callable[[Optional[datetime]], Dict[int, int]],
+                  now: Optional[datetime] = None, before: Optional[Callable[[], Optional[bool]]] = None) -> bool:
+        """
+        Сверяет таблицы убийств с БД.
+
+        Убийства, учтенные во время сверки, добавляются к ее результату, чтобы
+        не потеряться; возможное двойное попадание таких убийств исправляется
+        следующей сверкой. Учет начинается до вызова before, поэтому убийство,
+        еще не записанное в БД к моменту сброса очереди, тоже не теряется.
+
+        Args:
+            kill_counts (Callable[[Optional[datetime]], Dict[int, int]]): Функция,
+                возвращающая число убийств каждого игрока начиная с указанного
+                времени (None - за все время).
+            now (Optional[datetime]): Текущее время (UTC).
+            before (Optional[Callable[[], Optional[bool]]]): Вызывается перед запросами
+                к БД, например для сброса очереди убийств. Если возвращает False,
+                сверка пропускается.
+
+        Returns:
+            bool: True, если таблицы сверены.
+        """
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._captured = []
+        try:
+            if before is not None and before() is False:
+                with self._lock:
+                    self._captured = None
+                return False
+            totals = kill_counts(None)
+            day = kill_counts(day_start(now))
+            week = kill_counts(week_start(now))
+        except BaseException:
+            with self._lock:
+                self._captured = None
+            raise
+        with self._lock:
+            captured, self._captured = self._captured, None
+            self.kills_all.replace(totals)
+            for board, counts in ((self.kills_day, day), (self.kills_week, week)):
+                board.current = board.start(now)
+                board.replace(counts)
+            for player_id, when in captured:
+                self._apply_kill(player_id, when)
+            self.reconciled_at = now
+        return True
+
+    def top(self) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Возвращает все таблицы с именами игроков.
+
+        Returns:
+            Dict[str, List[Tuple[str, int]]]: Заголовок таблицы -> пары (имя, счет).
+        """
+        with self._lock:
+            self.kills_day.roll(datetime.utcnow())
+            self.kills_week.roll(datetime.utcnow())
+            boards = (('Убийства за сегодня', self.kills_day), ('Убийства за неделю', self.kills_week),
+                      ('Убийства за все время', self.kills_all), ('Уровень', self.levels))
+            return {title: [(self.names.get(player_id, str(player_id)), score) for player_id, score in board.top()]
+                    for title, board in boards}
+
+    def _apply_kill(self, player_id: int, when: datetime) -> None:
+        self.kills_all.add(player_id)
+        for board in (self.kills_day, self.kills_week):
+            if board.roll(when):
+                board.add(player_id)
+
+
+def format_top(boards: Dict[str, List[Tuple[str, int]]]) -> str:
+    """
+    Форматирует таблицы лидеров для сообщения в Telegram.
+
+    Args:
+        boards (Dict[str, List[Tuple[str, int]]]): Результат Leaderboards.top.
+
+    Returns:
+        str: Текст сообщения.
+    """
+    parts = []
+    for title, rows in boards.items():
+        lines = [f'{place}. {name} - {score}' for place, (name, score) in enumerate(rows, 1)] or ['пока пусто']
+        parts.append(f'{title}:\n' + '\n'.join(lines))
+    return '\n\n'.join(parts)
+
+
+class LeaderboardReconciler:
+    """
+    Фоновая периодическая сверка таблиц лидеров с БД.
+    """
+
+    def __init__(self, leaderboards: Leaderboards, kill_counts: Callable[[Optional[datetime]], Dict[int, int]],
+                 interval: float = 600.0, before: Optional[Callable[[], Optional[bool]]] = None) -> None:
+        """
+        Инициализирует сверку.
+
+        Args:
+            leaderboards (Leaderboards): Таблицы лидеров.
+            kill_counts (Callable[[Optional[datetime]], Dict[int, int]]): Подсчет убийств по игрокам в БД.
+            interval (float): Период сверки в секундах.
+            before (Optional[Callable[[], Optional[bool]]]): Вызывается в начале сверки, например для
+                сброса очереди убийств; False - пропустить сверку.
+        """
+        self.leaderboards = leaderboards
+        self.kill_counts = kill_counts
+        self.interval = interval
+        self.before = before
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запускает фоновый поток; первая сверка выполняется сразу.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='leaderboard', daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """
+        Останавливает фоновый поток.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if not self.leaderboards.reconcile(self.kill_counts, before=self.before):
+                    print("Сверка таблиц лидеров пропущена: before вернул False")
+            except Exception as e:
+                print(f"Ошибка сверки таблиц лидеров: {e}")
+            self._stop.wait(self.interval)
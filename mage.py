@@ -18,6 +18,11 @@ class Mage(Character):
     характеристики и уникальные способности мага.
     """
 
+    SCHEMA = {
+        **Character.SCHEMA,
+        'cool_down': int,
+    }
+
     def __init__(self, name: str = "Mage") -> None:
         """
         Инициализирует экземпляр класса Mage.
@@ -36,7 +41,7 @@ class Mage(Character):
             'lvl': 1,
             'crit_chance': 20,
             'def_chance': 20,
-            'coefficent': 0.1,
+            'coefficient': 0.1,
             'cool_down': 3,
             'initiative': False,
         })
@@ -62,12 +67,12 @@ class Mage(Character):
         try:
             if switcher:
                 if random.randint(1, 100) <= self.characteristics['crit_chance'] * 2:
-                    self.characteristics['power'] *= 3
+                    self.buff('Огненный шар', 'power', self.characteristics['power'] * 3)
                     return True
                 else:
                     return False
             else:
-                self.characteristics['power'] //= 3
+                self.unbuff('Огненный шар', 'power', self.characteristics['power'] // 3)
                 return None
         except Exception as e:
             print(f"Ошибка при использовании способности 'Огненный шар': {e}")
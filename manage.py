@@ -0,0 +1,64 @@
+"""
+Служебные команды обслуживания базы данных бота.
+
+Пример запуска:
+    python manage.py rebuild-rollup
+    python manage.py add-player-time-index
+    python manage.py add-time-index
+    python manage.py archive-kills --keep-months 6 --archive-dir kills_archive
+    python manage.py export-kills --out-dir kills_export --format parquet
+"""
+
+import argparse
+import os
+
+
+def main() -> None:
+    """
+    Точка входа командной строки служебных команд.
+    """
+    parser = argparse.ArgumentParser(description='Обслуживание БД RPG-бота')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild-rollup', help='Пересчитать дневную сводку kills_daily по таблице kills')
+    subparsers.add_parser('add-player-time-index',
+                          help='Добавить индекс kills (player_id, time) без долгой блокировки записи')
+    subparsers.add_parser('add-time-index', help='Добавить индекс kills (time) без долгой блокировки записи')
+    archive_parser = subparsers.add_parser('archive-kills',
+                                           help='Выгрузить старые месяцы kills в архив и удалить их из таблицы')
+    archive_parser.add_argument('--keep-months', type=int, default=int(os.getenv('KILLS_RETENTION_MONTHS', '6')))
+    archive_parser.add_argument('--archive-dir', default=os.getenv('KILLS_ARCHIVE_DIR', 'kills_archive'))
+    archive_parser.add_argument('--batch-size', type=int, default=5000)
+    export_parser = subparsers.add_parser('export-kills',
+                                          help='Выгрузить новые убийства в Parquet/Arrow по датам для аналитики')
+    export_parser.add_argument('--out-dir', default=os.getenv('KILLS_EXPORT_DIR', 'kills_export'))
+    export_parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    export_parser.add_argument('--chunk-size', type=int, default=50000)
+    export_parser.add_argument('--full', action='store_true', help='Выгрузить все строки, не глядя на водяной знак')
+    export_parser.add_argument('--lag', type=float, default=float(os.getenv('KILLS_EXPORT_LAG', '300')),
+                               help='Не выгружать убийства моложе стольких секунд')
+
+    args = parser.parse_args()
+    if args.command == 'archive-kills' and args.keep_months < 1:
+        parser.error('--keep-months должно быть не меньше 1')
+    if args.command == 'rebuild-rollup':
+        from db_utils import rebuild_daily_rollup
+        print(f"Строк в kills_daily: {rebuild_daily_rollup()}")
+    elif args.command == 'add-player-time-index':
+        from db_utils import add_player_time_index
+        print(f"Индекс ix_kills_player_id_time создан ({add_player_time_index()})")
+    elif args.command == 'add-time-index':
+        from db_utils import add_time_index
+        print(f"Индекс ix_kills_time создан ({add_time_index()})")
+    elif args.command == 'archive-kills':
+        from retention import apply_retention
+        for result in apply_retention(args.keep_months, args.archive_dir, args.batch_size):
+            print(f"{result.month:%Y-%m}: выгружено {result.exported}, удалено {result.deleted} -> {result.path}")
+    elif args.command == 'export-kills':
+        from kills_export import export_kills
+        result = export_kills(args.out_dir, args.format, args.chunk_size, since_id=0 if args.full else None,
+                              lag=args.lag)
+        print(f"Выгружено строк: {result.rows}, файлов: {len(result.files)}, последний id: {result.watermark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Модуль версий формата сохранений и миграций между ними.
+
+Каждая миграция переводит словарь персонажа (формат Character.to_dict)
+с версии N на версию N + 1. Цепочка миграций для каждой исходной версии
+собирается один раз и затем переиспользуется; сохранения обновляются
+при чтении, поэтому останавливать бота для переписывания всех файлов
+не нужно.
+"""
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+from exceptions import SerializationError
+
+SAVE_FORMAT_VERSION = 2
+LEGACY_VERSION = 1
+
+Migration = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(from_version: int) -> Callable[[Migration], Migration]:
+    """
+    Регистрирует миграцию с версии from_version на следующую.
+
+    Args:
+        from_version (int): Исходная версия формата.
+
+    Returns:
+        Callable[[Migration], Migration]: Декоратор функции миграции.
+    """
+    def register(func: Migration) -> Migration:
+        if from_version in MIGRATIONS:
+            raise ValueError(f"Миграция с версии {from_version} уже зарегистрирована")
+        MIGRATIONS[from_version] = func
+        compile_chain.cache_clear()
+        return func
+    return register
+
+
+@lru_cache(maxsize=None)
+def compile_chain(version: int) -> Tuple[Migration, ...]:
+    """
+    Собирает цепочку миграций от version до SAVE_FORMAT_VERSION.
+
+    Args:
+        version (int): Исходная версия формата.
+
+    Returns:
+        Tuple[Migration, ...]: Миграции в порядке применения.
+
+    Raises:
+        SerializationError: Если версия новее текущей или в цепочке есть пропуск.
+    """
+    if version > SAVE_FORMAT_VERSION:
+        raise SerializationError(f"Версия сохранения {version} новее поддерживаемой {SAVE_FORMAT_VERSION}")
+    chain = []
+    for step in range(version, SAVE_FORMAT_VERSION):
+        if step not in MIGRATIONS:
+            raise SerializationError(f"Нет миграции сохранения с версии {step}")
+        chain.append(MIGRATIONS[step])
+    return tuple(chain)
+
+
+def upgrade(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Обновляет словарь персонажа до текущей версии формата.
+
+    Args:
+        data (Dict[str, Any]): Словарь персонажа. Сохранения без поля version
+            считаются версией LEGACY_VERSION.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: Обновленный словарь и исходная версия.
+
+    Raises:
+        SerializationError: Если сохранение нельзя обновить.
+    """
+    version = int(data.get('version', LEGACY_VERSION))
+    for step in compile_chain(version):
+        data = step(data)
+    data['version'] = SAVE_FORMAT_VERSION
+    return data, version
+
+
+@migration(1)
+def merge_coefficient_typo(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Версия 1 -> 2: убирает характеристику 'coefficent' с опечаткой.
+
+    Классы персонажей хранили ее рядом с 'coefficient' из базового класса;
+    значение с опечаткой используется, только если правильного ключа нет.
+
+    Args:
+        data (Dict[str, Any]): Словарь персонажа версии 1.
+
+    Returns:
+        Dict[str, Any]: Словарь персонажа версии 2.
+    """
+    characteristics = data.setdefault('characteristics', {})
+    typo = characteristics.pop('coefficent', None)
+    if 'coefficient' not in characteristics:
+        characteristics['coefficient'] = typo if typo is not None else 0.1
+    return data
@@ -0,0 +1,182 @@
+"""
+Модуль хранения и архивации старых убийств.
+
+Таблица kills хранит только последние keep_months месяцев. Каждый более
+старый месяц обрабатывается так:
+    1. строки месяца выгружаются в сжатый NDJSON-файл kills-ГГГГ-ММ.ndjson.gz;
+    2. в той же БД в kills_archive записываются итоги месяца по игроку и
+       типу монстра (дневная сводка kills_daily при этом не меняется, а
+       rebuild_daily_rollup не пересчитывает дни архивированных месяцев);
+    3. строки месяца удаляются из kills небольшими пачками, чтобы не держать
+       долгих блокировок.
+Запись итогов в kills_archive отмечает месяц как выгруженный, поэтому
+прерванную архивацию можно безопасно запустить повторно.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional
+from sqlalchemy import Date, delete, func, insert, literal, select
+from compression import GZIP, open_stream
+from database import KillsArchive, KillsSaver, session_scope
+
+
+@dataclass
+class ArchivedMonth:
+    """
+    Результат архивации одного месяца.
+
+    Attributes:
+        month (date): Первый день месяца.
+        exported (int): Количество строк, выгруженных в файл (0, если файл выгружен раньше).
+        deleted (int): Количество строк, удаленных из kills.
+        path (str): Путь к файлу выгрузки.
+    """
+    month: date
+    exported: int
+    deleted: int
+    path: str
+
+
+def month_start(value: datetime) -> date:
+    """
+    Возвращает первый день месяца.
+
+    Args:
+        value (datetime): Дата или время.
+
+    Returns:
+        date: Первый день месяца.
+    """
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """
+    Сдвигает первый день месяца на months месяцев.
+
+    Args:
+        value (date): Первый день месяца.
+        months (int): Сдвиг (может быть отрицательным).
+
+    Returns:
+        date: Первый день нового месяца.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_path(archive_dir: str, month: date) -> str:
+    """
+    Возвращает путь к файлу выгрузки месяца.
+
+    Args:
+        archive_dir (str): Каталог архива.
+        month (date): Первый день месяца.
+
+    Returns:
+        str: Путь к файлу.
+    """
+    return os.path.join(archive_dir, f'kills-{month:%Y-%m}.ndjson.gz')
+
+
+def export_month(month: date, path: str, chunk_size: int = 5000) -> int:
+    """
+    Выгружает строки kills за месяц в сжатый NDJSON-файл.
+
+    Файл пишется во временный и переименовывается после записи, строки
+    читаются частями по chunk_size.
+
+    Args:
+        month (date): Первый день месяца.
+        path (str): Путь к файлу выгрузки.
+        chunk_size (int): Размер части при чтении.
+
+    Returns:
+        int: Количество выгруженных строк.
+    """
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(add_months(month, 1), datetime.min.time())
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    count = 0
+    with session_scope() as session, open_stream(tmp_path, 'wb', GZIP) as f:
+        query = (select(KillsSaver.id, KillsSaver.player_id, KillsSaver.time, KillsSaver.mob_type)
+                 .where(KillsSaver.time >= start, KillsSaver.time < end).order_by(KillsSaver.id))
+        for kill_id, player_id, time, mob_type in session.execute(query.execution_options(yield_per=chunk_size)):
+            record = {'id': kill_id, 'player_id': player_id, 'time': time.isoformat(), 'mob_type': mob_type}
+            f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def archive_month(month: date, archive_dir: str, batch_size: int = 5000) -> ArchivedMonth:
+    """
+    Архивирует один месяц: выгрузка, итоги в kills_archive, удаление пачками.
+
+    Args:
+        month (date): Первый день месяца.
+        archive_dir (str): Каталог архива.
+        batch_size (int): Сколько строк удалять одной транзакцией.
+
+    Returns:
+        ArchivedMonth: Результат архивации.
+    """
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(add_months(month, 1), datetime.min.time())
+    in_month = (KillsSaver.time >= start, KillsSaver.time < end)
+    path = archive_path(archive_dir, month)
+    with session_scope() as session:
+        done = session.query(KillsArchive.month).filter(KillsArchive.month == month).first() is not None
+    exported = 0
+    if not done:
+        exported = export_month(month, path, batch_size)
+        with session_scope() as session:
+            session.execute(insert(KillsArchive).from_select(
+                ['month', 'player_id', 'mob_type', 'count'],
+                select(literal(month, Date), KillsSaver.player_id, KillsSaver.mob_type, func.count())
+                .where(*in_month).group_by(KillsSaver.player_id, KillsSaver.mob_type)))
+    deleted = 0
+    while True:
+        with session_scope() as session:
+            ids = select(KillsSaver.id).where(*in_month).limit(batch_size).scalar_subquery()
+            result = session.execute(delete(KillsSaver).where(KillsSaver.id.in_(ids)))
+        if result.rowcount <= 0:
+            break
+        deleted += result.rowcount
+    return ArchivedMonth(month, exported, deleted, path)
+
+
+def apply_retention(keep_months: int, archive_dir: str, batch_size: int = 5000,
+                    now: Optional[datetime] = None) -> List[ArchivedMonth]:
+    """
+    Архивирует все месяцы старше keep_months последних месяцев.
+
+    Args:
+        keep_months (int): Сколько последних месяцев (включая текущий) оставлять в kills.
+        archive_dir (str): Каталог архива.
+        batch_size (int): Сколько строк удалять одной транзакцией.
+        now (Optional[datetime]): Текущее время (UTC).
+
+    Returns:
+        List[ArchivedMonth]: Результаты по архивированным месяцам, от старых к новым.
+
+    Raises:
+        ValueError: Если keep_months меньше 1.
+    """
+    if keep_months < 1:
+        raise ValueError(f"keep_months должно быть не меньше 1, получено {keep_months}")
+    cutoff = add_months(month_start(now or datetime.utcnow()), -(keep_months - 1))
+    cutoff_time = datetime.combine(cutoff, datetime.min.time())
+    results = []
+    while True:
+        with session_scope() as session:
+            oldest = session.query(func.min(KillsSaver.time)).filter(KillsSaver.time < cutoff_time).scalar()
+        if oldest is None:
+            return results
+        if isinstance(oldest, str):
+            oldest = datetime.fromisoformat(oldest)
+        results.append(archive_month(month_start(oldest), archive_dir, batch_size))
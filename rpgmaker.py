@@ -16,9 +16,25 @@ Telegram бот для RPG-игры с элементами боя и разви
     character (Character): Экземпляр класса персонажа текущего пользователя.
     monster (Character): Экземпляр класса монстра в текущем бою.
     current_user_id (int): ID текущего пользователя.
-    json_manager (JSONDataManager): Менеджер для работы с JSON-файлами.
-    xml_manager (XMLDataManager): Менеджер для работы с XML-файлами.
+    save_layout (ShardedLayout): Раскладка файлов сохранений по подкаталогам каталога SAVES_DIR.
+    write_behind (WriteBehindQueue): Очередь отложенной атомарной записи сохранений.
+    character_cache (CharacterCache): LRU-кеш загруженных персонажей.
+    autosave (AutosaveScheduler): Планировщик автосохранения измененных персонажей в том формате,
+                                  из которого они загружены (новые - в JSON).
+    kill_writer (KillWriter): Буферизованная пакетная запись убийств в БД.
+    chart_renderer (ChartRenderer): Пул процессов построения графиков.
+    stats_chart (ChartCache): Кеш графика /stats по версии данных об убийствах.
+    heatmap_chart (ChartCache): Кеш тепловой карты /heatmap по версии данных и дате.
+    trends_chart (ChartCache): Кеш графика трендов /trends по версии данных и дате.
+    leaderboards (Leaderboards): Таблицы лидеров для команды /top.
+    leaderboard_reconciler (LeaderboardReconciler): Периодическая сверка таблиц лидеров с БД.
+    json_manager (DataManager): Менеджер для работы с JSON-файлами (разностный при SAVE_JOURNAL=1).
+    xml_manager (DataManager): Менеджер для работы с XML-файлами (разностный при SAVE_JOURNAL=1).
     dungeon_cooldowns (dict): Словарь для хранения времени последнего посещения подземелья по user_id.
+    MYSTATS_DAYS (int): За сколько последних дней команда /mystats показывает убийства игрока.
+    HEATMAP_DAYS (int): За сколько последних дней команда /heatmap строит тепловую карту.
+    TRENDS_DAYS (int): За сколько последних дней команда /trends показывает тренды.
+    KILL_FLUSH_TIMEOUT (float): Сколько секунд команды статистики ждут записи очереди убийств.
     TIME_PATTERN (str): Регулярное выражение для валидации времени в формате ЧЧ:ММ:СС.
     NAME_PATTERN (str): Регулярное выражение для валидации имени персонажа (только русские буквы).
 """
@@ -29,13 +45,20 @@ from mage import Mage
 from druid import Druid
 from hunter import Hunter
 from character import Character
-from data_manager import JSONDataManager, XMLDataManager
+from data_manager import JSONDataManager, XMLDataManager, WriteBehindQueue, ShardedLayout, CharacterCache
+from journal import JournalDataManager
+from autosave import AutosaveScheduler
 from exceptions import CharacterError, DataStorageError
 from dotenv import load_dotenv
 import os
 import re
 from datetime import datetime, timedelta
-from db_utils import save_kill, kills_to_table, get_kills
+from database import close_read_db, init_db
+from db_utils import (KillWriter, add_kill_listener, get_hour_heatmap, get_kill_trends, get_kills_series,
+                      kill_counts_by_player, kills_version)
+from leaderboard import LeaderboardReconciler, Leaderboards, format_top
+from charts import (ChartCache, ChartRenderer, render_hour_heatmap, render_kills_chart, render_trends_chart,
+                    send_chart)
 
 load_dotenv()
 
@@ -54,11 +77,73 @@ monster: Character = None
 current_user_id = None
 dungeon_cooldowns = {}
 
+MYSTATS_DAYS = 30
+HEATMAP_DAYS = 28
+TRENDS_DAYS = 90
+KILL_FLUSH_TIMEOUT = float(os.getenv("KILL_FLUSH_TIMEOUT", "2"))
+
 TIME_PATTERN = r"^([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]$"
 NAME_PATTERN = r'^[А-Яа-яЁё]+$'
 
-json_manager = JSONDataManager()
-xml_manager = XMLDataManager()
+save_layout = ShardedLayout(os.getenv("SAVES_DIR", "saves"))
+write_behind = WriteBehindQueue(delay=float(os.getenv("SAVE_DELAY", "2")))
+character_cache = CharacterCache(max_entries=int(os.getenv("CHARACTER_CACHE_SIZE", "1024")))
+save_compression = os.getenv("SAVE_COMPRESSION", "none")
+if os.getenv("SAVE_JOURNAL") == "1":
+    compact_every = int(os.getenv("JOURNAL_COMPACT_EVERY", "50"))
+    json_manager = JournalDataManager(JSONDataManager(layout=save_layout, cache=character_cache,
+                                                      compression=save_compression), compact_every)
+    xml_manager = JournalDataManager(XMLDataManager(layout=save_layout, cache=character_cache,
+                                                    compression=save_compression), compact_every)
+else:
+    json_manager = JSONDataManager(write_behind=write_behind, layout=save_layout, cache=character_cache,
+                                   compression=save_compression)
+    xml_manager = XMLDataManager(write_behind=write_behind, layout=save_layout, cache=character_cache,
+                                 compression=save_compression)
+autosave = AutosaveScheduler(json_manager, interval=float(os.getenv("AUTOSAVE_INTERVAL", "30")))
+kill_writer = KillWriter(batch_size=int(os.getenv("KILL_BATCH_SIZE", "500")),
+                         flush_interval=int(os.getenv("KILL_FLUSH_MS", "200")) / 1000)
+chart_renderer = ChartRenderer(workers=int(os.getenv("CHART_WORKERS", "1")),
+                               timeout=float(os.getenv("CHART_RENDER_TIMEOUT", "30")))
+stats_chart = ChartCache(lambda: chart_renderer.render(render_kills_chart, get_kills_series()), kills_version,
+                         ttl=float(os.getenv("STATS_CACHE_TTL", "0")))
+heatmap_chart = ChartCache(
+    lambda: chart_renderer.render(render_hour_heatmap,
+                                  get_hour_heatmap(since=datetime.utcnow() - timedelta(days=HEATMAP_DAYS))),
+    lambda: (kills_version(), datetime.utcnow().date()), ttl=float(os.getenv("STATS_CACHE_TTL", "0")))
+trends_chart = ChartCache(
+    lambda: chart_renderer.render(render_trends_chart,
+                                  get_kill_trends(since=datetime.utcnow() - timedelta(days=TRENDS_DAYS))),
+    lambda: (kills_version(), datetime.utcnow().date()), ttl=float(os.getenv("STATS_CACHE_TTL", "0")))
+leaderboards = Leaderboards(k=int(os.getenv("LEADERBOARD_SIZE", "10")))
+add_kill_listener(leaderboards.record_kill)
+leaderboard_reconciler = LeaderboardReconciler(leaderboards, kill_counts_by_player,
+                                               interval=float(os.getenv("LEADERBOARD_RECONCILE", "600")),
+                                               before=lambda: kill_writer.flush(timeout=KILL_FLUSH_TIMEOUT))
+
+
+def flush_kills() -> None:
+    """
+    Ждет записи убийств из очереди не дольше KILL_FLUSH_TIMEOUT секунд.
+
+    Если БД не успевает, статистика строится по уже записанным убийствам,
+    а поток обработчика не блокируется.
+    """
+    if not kill_writer.flush(timeout=KILL_FLUSH_TIMEOUT):
+        print(f"Очередь убийств не записана за {KILL_FLUSH_TIMEOUT} с, статистика может отставать")
+
+
+def autosave_filename(user_id: int) -> str:
+    """
+    Возвращает имя файла автосохранения игрока.
+
+    Args:
+        user_id (int): ID пользователя.
+
+    Returns:
+        str: Имя JSON-файла сохранения.
+    """
+    return f"character_{user_id}.json"
 
 
 def is_valid_time_format(time_str: str) -> bool:
@@ -199,8 +284,10 @@ def main():
     """
     Основная функция инициализации и запуска Telegram бота.
 
-    Настраивает обработчики команд и сообщений, запускает polling бота.
+    Подключается к БД, настраивает обработчики команд и сообщений, запускает polling бота.
     """
+    init_db()
+    leaderboard_reconciler.start()
     bot = TeleBot(API_TOKEN)
 
     @bot.message_handler(commands=['start'])
@@ -229,13 +316,85 @@ def main():
     def send_stats(message):
         print(1)
         try:
-            df = get_kills()
-            img_bytes = kills_to_table(df)
-            bot.send_photo(message.chat.id, img_bytes, caption="Статистика убийств монстров")
+            flush_kills()
+            send_chart(bot, message.chat.id, stats_chart, caption="Статистика убийств монстров")
         except Exception as e:
             bot.reply_to(message, "Ошибка при генерации статистики")
             print(f"Stats error: {e}")
 
+    @bot.message_handler(commands=['mystats'])
+    def send_my_stats(message: types.Message):
+        """
+        Обработчик команды /mystats.
+
+        Отправляет график убийств игрока по дням за последние MYSTATS_DAYS дней и итоги по типам монстров.
+
+        Args:
+            message (types.Message): Объект сообщения от пользователя.
+        """
+        try:
+            flush_kills()
+            since = datetime.utcnow() - timedelta(days=MYSTATS_DAYS)
+            series = get_kills_series(player_id=message.from_user.id, since=since)
+            totals = series.totals()
+            caption = (f'Твои убийства за {MYSTATS_DAYS} дней: обычных {totals["simple"]}, '
+                       f'ивентовых {totals["event"]}')
+            img_bytes = chart_renderer.render(render_kills_chart, series, 'Твои убийства монстров по дням')
+            bot.send_photo(message.chat.id, img_bytes, caption=caption)
+        except Exception as e:
+            bot.reply_to(message, "Ошибка при генерации статистики")
+            print(f"Mystats error: {e}")
+
+    @bot.message_handler(commands=['heatmap'])
+    def send_heatmap(message: types.Message):
+        """
+        Обработчик команды /heatmap.
+
+        Отправляет тепловую карту убийств по дням недели и часам за последние HEATMAP_DAYS дней.
+
+        Args:
+            message (types.Message): Объект сообщения от пользователя.
+        """
+        try:
+            flush_kills()
+            send_chart(bot, message.chat.id, heatmap_chart, caption=f"Убийства по часам за {HEATMAP_DAYS} дней")
+        except Exception as e:
+            bot.reply_to(message, "Ошибка при генерации статистики")
+            print(f"Heatmap error: {e}")
+
+    @bot.message_handler(commands=['trends'])
+    def send_trends(message: types.Message):
+        """
+        Обработчик команды /trends.
+
+        Отправляет дневные итоги убийств за последние TRENDS_DAYS дней со скользящим
+        средним за 7 дней и долей ивентовых убийств.
+
+        Args:
+            message (types.Message): Объект сообщения от пользователя.
+        """
+        try:
+            flush_kills()
+            send_chart(bot, message.chat.id, trends_chart, caption=f"Тренды убийств за {TRENDS_DAYS} дней")
+        except Exception as e:
+            bot.reply_to(message, "Ошибка при генерации статистики")
+            print(f"Trends error: {e}")
+
+    @bot.message_handler(commands=['top'])
+    def send_top(message: types.Message):
+        """
+        Обработчик команды /top.
+
+        Отправляет таблицы лидеров по убийствам и уровню из памяти, без запросов к БД.
+
+        Args:
+            message (types.Message): Объект сообщения от пользователя.
+        """
+        try:
+            bot.send_message(chat_id=message.chat.id, text=format_top(leaderboards.top()))
+        except Exception as e:
+            print(f"Ошибка при отправке таблицы лидеров: {e}")
+
     @bot.message_handler(func=lambda menu: True if menu.text == 'Смена класса' else False)
     def transfer_to_choosing(message: types.Message):
         """
@@ -297,6 +456,8 @@ def main():
             if character and character.name.startswith("Temp_"):
                 if is_valid_name(message.text):
                     character.name = message.text
+                    character.mark_dirty()
+                    autosave.track(character, autosave_filename(message.from_user.id))
                     bot.send_message(
                         chat_id=message.chat.id,
                         text=f'Отлично! Твое имя: {character.name}. Ты можешь отправиться в деревню.',
@@ -327,6 +488,7 @@ def main():
             if character:
                 if character.characteristics['exp'] >= 100:
                     response = character.level_up()
+                    leaderboards.record_level(message.from_user.id, character.name, character.characteristics['lvl'])
                     bot.send_message(chat_id=message.chat.id, text=response)
                 else:
                     bot.send_message(chat_id=message.chat.id, text='У тебя пока недостаточно опыта')
@@ -444,9 +606,9 @@ def main():
                     exp_gained = monster.characteristics["lvl"] * 15
 
                 if monster.name == 'Ancient Guardian':
-                    save_kill(player_id=message.from_user.id, mob_type='event')
+                    kill_writer.add(player_id=message.from_user.id, mob_type='event')
                 else:
-                    save_kill(player_id=message.from_user.id, mob_type='simple')
+                    kill_writer.add(player_id=message.from_user.id, mob_type='simple')
 
                 character.gain_exp(exp_gained)
                 bot.send_message(
@@ -572,9 +734,10 @@ def main():
             if not character:
                 bot.send_message(chat_id=message.chat.id, text='Нет персонажа для сохранения.')
                 return
-            filename = f"character_{message.from_user.id}.json"
+            filename = autosave_filename(message.from_user.id)
             success = json_manager.create(character, filename)
             if success:
+                character.dirty = False
                 bot.send_message(chat_id=message.chat.id, text=f'Персонаж сохранен в {filename}')
             else:
                 bot.send_message(chat_id=message.chat.id, text='Ошибка при сохранении.')
@@ -623,11 +786,14 @@ def main():
         """
         global character
         try:
-            filename = f"character_{message.from_user.id}.json"
-            if not os.path.exists(filename):
+            filename = autosave_filename(message.from_user.id)
+            if not json_manager.exists(filename):
                 bot.send_message(chat_id=message.chat.id, text=f'Файл {filename} не найден.')
                 return
             character = json_manager.read(filename)
+            autosave.forget(f"character_{message.from_user.id}.xml")
+            autosave.track(character, filename)
+            leaderboards.record_level(message.from_user.id, character.name, character.characteristics['lvl'])
             bot.send_message(chat_id=message.chat.id,
                              text=f'Персонаж загружен из {filename}. Текущий уровень: {character.characteristics["lvl"]}')
         except DataStorageError as e:
@@ -649,10 +815,13 @@ def main():
         global character
         try:
             filename = f"character_{message.from_user.id}.xml"
-            if not os.path.exists(filename):
+            if not xml_manager.exists(filename):
                 bot.send_message(chat_id=message.chat.id, text=f'Файл {filename} не найден.')
                 return
             character = xml_manager.read(filename)
+            autosave.forget(autosave_filename(message.from_user.id))
+            autosave.track(character, filename, xml_manager)
+            leaderboards.record_level(message.from_user.id, character.name, character.characteristics['lvl'])
             bot.send_message(chat_id=message.chat.id,
                              text=f'Персонаж загружен из {filename}. Текущий уровень: {character.characteristics["lvl"]}')
         except DataStorageError as e:
@@ -704,8 +873,19 @@ if __name__ == '__main__':
 
     load_dungeon_times_from_file()
 
+    adopted = save_layout.adopt('.')
+    if adopted:
+        print(f"Перенесено сохранений в {save_layout.root}: {adopted}")
+
     import atexit
 
     atexit.register(save_dungeon_times_to_file)
+    atexit.register(save_layout.close)
+    atexit.register(write_behind.close)
+    atexit.register(chart_renderer.close)
+    atexit.register(leaderboard_reconciler.close)
+    atexit.register(kill_writer.close)
+    atexit.register(autosave.close)
+    atexit.register(close_read_db)
 
     main()
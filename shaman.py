@@ -17,6 +17,11 @@ class Shaman(Character):
     характеристики и уникальные способности шамана.
     """
 
+    SCHEMA = {
+        **Character.SCHEMA,
+        'cool_down': int,
+    }
+
     def __init__(self, name: str = "Shaman") -> None:
         """
         Инициализирует экземпляр класса Shaman.
@@ -35,7 +40,7 @@ class Shaman(Character):
             'lvl': 1,
             'crit_chance': 5,
             'def_chance': 40,
-            'coefficent': 0.1,
+            'coefficient': 0.1,
             'cool_down': 3,
             'initiative': False,
         })
@@ -55,9 +60,9 @@ class Shaman(Character):
         """
         try:
             if switcher:
-                self.characteristics['def_chance'] += 30
+                self.buff('Щит природы', 'def_chance', self.characteristics['def_chance'] + 30)
             else:
-                self.characteristics['def_chance'] -= 30
+                self.unbuff('Щит природы', 'def_chance', self.characteristics['def_chance'] - 30)
         except Exception as e:
             print(f"Ошибка при использовании способности 'Щит природы': {e}")
 
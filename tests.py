@@ -1,5 +1,7 @@
 import unittest
 import re
+import os
+import tempfile
 from datetime import datetime, timedelta
 from rpgmaker import is_valid_time_format, can_enter_special_dungeon, TIME_PATTERN
 
@@ -117,5 +119,1506 @@ class TestDungeonTimeValidation(unittest.TestCase):
                 self.assertIsNone(match, f"Регулярное выражение неожиданно совпадает с {time_str}")
 
 
+class TestCharacterArchive(unittest.TestCase):
+    """
+    Класс для тестирования массового экспорта и импорта сохранений.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог с сохранениями в обоих форматах.
+        """
+        from data_manager import JSONDataManager, XMLDataManager
+        from mage import Mage
+        from druid import Druid
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, 'src')
+        os.makedirs(self.src)
+        JSONDataManager().create(Mage('Мерлин'), os.path.join(self.src, 'character_1.json'))
+        XMLDataManager().create(Druid('Радагаст'), os.path.join(self.src, 'character_2.xml'))
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_archive_round_trip(self):
+        """
+        Тест: экспорт в архив и импорт обратно сохраняют всех персонажей в обоих форматах архива.
+        """
+        from archive import export_characters, import_characters
+        from data_manager import JSONDataManager, XMLDataManager
+        for archive_format in ('ndjson', 'binary'):
+            with self.subTest(archive_format=archive_format):
+                archive_path = os.path.join(self.tmp.name, f'characters.{archive_format}')
+                dst = os.path.join(self.tmp.name, archive_format)
+                self.assertEqual(export_characters(self.src, archive_path, archive_format, workers=1).records, 2)
+                self.assertEqual(import_characters(archive_path, dst, workers=1).records, 2)
+                mage = JSONDataManager().read(os.path.join(dst, 'character_1.json'))
+                druid = XMLDataManager().read(os.path.join(dst, 'character_2.xml'))
+                self.assertEqual(mage.name, 'Мерлин')
+                self.assertEqual(druid.name, 'Радагаст')
+                self.assertEqual(druid.characteristics['power'], 30)
+
+
+class TestWriteBehindPersistence(unittest.TestCase):
+    """
+    Класс для тестирования атомарной отложенной записи сохранений.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог и менеджер с очередью отложенной записи.
+        """
+        from data_manager import JSONDataManager, WriteBehindQueue
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = WriteBehindQueue(delay=60)
+        self.manager = JSONDataManager(write_behind=self.queue)
+        self.filename = os.path.join(self.tmp.name, 'character_1.json')
+
+    def tearDown(self):
+        """
+        Закрывает очередь и удаляет временный каталог.
+        """
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_repeated_saves_are_coalesced(self):
+        """
+        Тест: повторные сохранения до сброса очереди объединяются в одну запись последней версии.
+        """
+        from hunter import Hunter
+        hunter = Hunter('Леголас')
+        for exp in (10, 20, 30):
+            hunter.characteristics['exp'] = exp
+            self.manager.create(hunter, self.filename)
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(self.manager.exists(self.filename))
+        self.assertEqual(self.manager.read(self.filename).characteristics['exp'], 30)
+        self.queue.flush()
+        self.assertEqual(self.queue.written, 1)
+        self.assertEqual(self.queue.coalesced, 2)
+        self.assertEqual(self.manager.read(self.filename).characteristics['exp'], 30)
+        self.assertEqual(os.listdir(self.tmp.name), ['character_1.json'])
+
+    def test_failed_write_is_reported_and_counted(self):
+        """
+        Тест: неудачная запись сообщается через flush, а после всех попыток отбрасывается и учитывается в dropped.
+        """
+        from exceptions import WriteBehindError
+
+        def failing_writer(filename, data):
+            raise OSError('диск заполнен')
+
+        self.queue.submit(self.filename, '{}', failing_writer)
+        for attempt in range(self.queue.MAX_ATTEMPTS):
+            with self.assertRaises(WriteBehindError) as raised:
+                self.queue.flush()
+            self.assertEqual(raised.exception.files, [self.filename])
+            self.assertEqual(len(self.queue), 0 if attempt + 1 == self.queue.MAX_ATTEMPTS else 1)
+        self.assertEqual(self.queue.dropped, 1)
+        self.queue.flush()
+
+
+class TestShardedLayout(unittest.TestCase):
+    """
+    Класс для тестирования раскладки сохранений по подкаталогам с индексом.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог сохранений.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_saves_are_sharded_and_indexed(self):
+        """
+        Тест: сохранение попадает в хешированный подкаталог и в индекс, индекс переживает перезапуск.
+        """
+        from data_manager import JSONDataManager, ShardedLayout
+        from shaman import Shaman
+        layout = ShardedLayout(self.tmp.name)
+        manager = JSONDataManager(layout=layout)
+        manager.create(Shaman('Тралл'), 'character_7.json')
+        path = layout.path_for('character_7.json')
+        self.assertTrue(os.path.exists(path))
+        self.assertNotEqual(os.path.dirname(path), self.tmp.name)
+        self.assertTrue(manager.exists('character_7.json'))
+        self.assertFalse(manager.exists('character_7.xml'))
+        layout.close()
+
+        reopened = ShardedLayout(self.tmp.name)
+        entries = list(reopened.entries())
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['user_id'], '7')
+        self.assertEqual(entries[0]['format'], 'json')
+        self.assertEqual(entries[0]['size'], os.path.getsize(path))
+        self.assertEqual(JSONDataManager(layout=reopened).read('character_7.json').name, 'Тралл')
+
+    def test_unclean_index_is_rebuilt(self):
+        """
+        Тест: индекс, не закрытый корректно, перестраивается обходом каталога.
+        """
+        from data_manager import XMLDataManager, ShardedLayout
+        from mage import Mage
+        layout = ShardedLayout(self.tmp.name, flush_every=1000)
+        XMLDataManager(layout=layout).create(Mage('Гэндальф'), 'character_8.xml')
+        self.assertTrue(ShardedLayout(self.tmp.name).contains('character_8.xml'))
+
+
+class TestSQLiteDataManager(unittest.TestCase):
+    """
+    Класс для тестирования хранения персонажей в SQLite.
+    """
+
+    def setUp(self):
+        """
+        Создает временную базу персонажей.
+        """
+        from data_manager import SQLiteDataManager
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = SQLiteDataManager(os.path.join(self.tmp.name, 'characters.db'))
+
+    def tearDown(self):
+        """
+        Закрывает базу и удаляет временный каталог.
+        """
+        self.manager.close()
+        self.tmp.cleanup()
+
+    def test_crud(self):
+        """
+        Тест: создание, пакетная запись, чтение, обновление и удаление персонажей.
+        """
+        from druid import Druid
+        from hunter import Hunter
+        self.assertTrue(self.manager.create(Druid('Мальфурион'), 'character_1.json'))
+        self.assertEqual(self.manager.create_many([(Hunter(f'Охотник{i}'), f'character_{i}.json')
+                                                   for i in range(2, 12)]), 10)
+        druid = self.manager.read('character_1.json')
+        self.assertIsInstance(druid, Druid)
+        druid.gain_exp(40)
+        self.manager.update(druid, 'character_1.json')
+        self.assertEqual(self.manager.read('character_1.json').characteristics['exp'], 40)
+        self.assertTrue(self.manager.exists('character_11.json'))
+        self.assertTrue(self.manager.delete('character_11.json'))
+        self.assertFalse(self.manager.exists('character_11.json'))
+
+
+class TestCharacterCache(unittest.TestCase):
+    """
+    Класс для тестирования LRU-кеша загруженных персонажей.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог и менеджер с кешем.
+        """
+        from data_manager import XMLDataManager, CharacterCache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CharacterCache(max_entries=2)
+        self.manager = XMLDataManager(cache=self.cache)
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_hits_copies_and_invalidation(self):
+        """
+        Тест: повторное чтение берется из кеша, возвращает копию и сбрасывается при перезаписи.
+        """
+        from mage import Mage
+        filename = os.path.join(self.tmp.name, 'character_1.xml')
+        self.manager.create(Mage('Джайна'), filename)
+        first = self.manager.read(filename)
+        first.characteristics['exp'] = 99
+        second = self.manager.read(filename)
+        self.assertEqual(second.characteristics['exp'], 0)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+        self.manager.create(first, filename)
+        self.assertEqual(self.manager.read(filename).characteristics['exp'], 99)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_size_based_eviction(self):
+        """
+        Тест: при превышении размера кеша вытесняется давно не используемый персонаж.
+        """
+        from hunter import Hunter
+        filenames = [os.path.join(self.tmp.name, f'character_{i}.xml') for i in range(3)]
+        for filename in filenames:
+            self.manager.create(Hunter('Сильвана'), filename)
+            self.manager.read(filename)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class TestTypedDeserialization(unittest.TestCase):
+    """
+    Класс для тестирования разбора сохранений по схеме полей класса.
+    """
+
+    def test_xml_round_trip_keeps_types_and_abilities(self):
+        """
+        Тест: после XML значения имеют типы из схемы, а способности работают.
+        """
+        from data_manager import XMLSerializer
+        from druid import Druid
+        druid = Druid('Кенарий')
+        druid.characteristics['initiative'] = False
+        loaded = XMLSerializer().deserialize(XMLSerializer().serialize(druid))
+        self.assertIs(loaded.characteristics['initiative'], False)
+        self.assertIsInstance(loaded.characteristics['coefficient'], float)
+        self.assertIsInstance(loaded.characteristics['power'], int)
+        loaded.abilities['Вызов духов'](switcher=True)
+        self.assertEqual(loaded.characteristics['power'], 50)
+
+    def test_json_values_are_coerced(self):
+        """
+        Тест: JSON-значения с неверным типом приводятся к типам из схемы.
+        """
+        from data_manager import JSONSerializer
+        data = '{"type": "Shaman", "name": "Дрек", "characteristics": {"power": 10.0, "coefficient": 1}}'
+        loaded = JSONSerializer().deserialize(data)
+        self.assertIs(type(loaded.characteristics['power']), int)
+        self.assertIs(type(loaded.characteristics['coefficient']), float)
+
+    def test_json_fractional_int_is_rejected(self):
+        """
+        Тест: дробное значение целочисленной характеристики не обрезается, а отклоняется.
+        """
+        from data_manager import JSONSerializer
+        from exceptions import SerializationError
+        data = '{"type": "Shaman", "name": "Дрек", "characteristics": {"power": 10.5}}'
+        with self.assertRaises(SerializationError):
+            JSONSerializer().deserialize(data)
+
+
+class TestSaveMigrations(unittest.TestCase):
+    """
+    Класс для тестирования версий формата сохранений и миграций.
+    """
+
+    LEGACY_JSON = ('{"type": "Hunter", "name": "Ринго", "characteristics": {"max_health": 50, "health": 50, '
+                   '"power": 50, "exp": 20, "lvl": 1, "crit_chance": 10, "def_chance": 50, "coefficient": 0.1, '
+                   '"initiative": false, "coefficent": 0.1, "cool_down": 3}, "abilities": ["Увертливость"]}')
+
+    def setUp(self):
+        """
+        Создает временный каталог.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_legacy_save_is_upgraded_and_written_back(self):
+        """
+        Тест: сохранение без версии обновляется при чтении и перезаписывается в текущем формате.
+        """
+        import json
+        from data_manager import JSONDataManager
+        from migrations import SAVE_FORMAT_VERSION
+        filename = os.path.join(self.tmp.name, 'character_1.json')
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(self.LEGACY_JSON)
+        manager = JSONDataManager()
+        hunter = manager.read(filename)
+        self.assertNotIn('coefficent', hunter.characteristics)
+        self.assertEqual(hunter.characteristics['exp'], 20)
+        self.assertEqual(manager.migrated, 1)
+        with open(filename, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], SAVE_FORMAT_VERSION)
+        manager.read(filename)
+        self.assertEqual(manager.migrated, 1)
+
+    def test_newer_version_is_rejected(self):
+        """
+        Тест: сохранение более новой версии формата не загружается.
+        """
+        from data_manager import XMLSerializer
+        from exceptions import SerializationError
+        from migrations import SAVE_FORMAT_VERSION
+        data = f'<Character version="{SAVE_FORMAT_VERSION + 1}" type="Mage" name="Каэль" />'
+        with self.assertRaises(SerializationError):
+            XMLSerializer().deserialize(data)
+
+
+class TestJournalDataManager(unittest.TestCase):
+    """
+    Класс для тестирования разностных сохранений с журналом.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог и менеджер разностных сохранений.
+        """
+        from data_manager import JSONDataManager
+        from journal import JournalDataManager
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = JournalDataManager(JSONDataManager(), compact_every=3, fsync=False)
+        self.filename = os.path.join(self.tmp.name, 'character_1.json')
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_only_changes_are_journaled_and_compacted(self):
+        """
+        Тест: после снимка в журнал пишутся только изменения, чтение собирает персонажа, журнал сворачивается.
+        """
+        from journal import JournalDataManager
+        from data_manager import JSONDataManager
+        from shaman import Shaman
+        shaman = Shaman('Нобундо')
+        self.manager.create(shaman, self.filename)
+        shaman.gain_exp(15)
+        self.manager.create(shaman, self.filename)
+        self.assertLess(self.manager.journal_bytes, 30)
+        self.assertTrue(os.path.exists(self.manager.journal_path(self.filename)))
+
+        restored = JournalDataManager(JSONDataManager()).read(self.filename)
+        self.assertEqual(restored.characteristics['exp'], 15)
+
+        shaman.gain_exp(15)
+        self.manager.create(shaman, self.filename)
+        shaman.gain_exp(15)
+        self.manager.create(shaman, self.filename)
+        self.assertEqual(self.manager.compactions, 2)
+        self.assertFalse(os.path.exists(self.manager.journal_path(self.filename)))
+        self.assertEqual(JSONDataManager().read(self.filename).characteristics['exp'], 45)
+
+    def test_crash_between_snapshot_and_journal_removal(self):
+        """
+        Тест: журнал, не удаленный после записи нового снимка, не откатывает поля снимка.
+        """
+        from journal import JournalDataManager
+        from data_manager import JSONDataManager, XMLDataManager
+        from shaman import Shaman
+        shaman = Shaman('Нобундо')
+        self.manager.create(shaman, self.filename)
+        shaman.gain_exp(15)
+        self.manager.create(shaman, self.filename)
+        shaman.gain_exp(15)
+        self.manager.create(shaman, self.filename)
+
+        def crash(filename):
+            raise OSError('сбой')
+
+        self.manager._remove_journal = crash
+        shaman.gain_exp(15)
+        with self.assertRaises(OSError):
+            self.manager.create(shaman, self.filename)
+        self.assertTrue(os.path.exists(self.manager.journal_path(self.filename)))
+
+        restored = JournalDataManager(JSONDataManager(), compact_every=3, fsync=False)
+        self.assertEqual(restored.read(self.filename).characteristics['exp'], 45)
+        shaman.gain_exp(5)
+        restored.create(shaman, self.filename)
+        self.assertEqual(JournalDataManager(JSONDataManager()).read(self.filename).characteristics['exp'], 50)
+
+        xml_filename = os.path.join(self.tmp.name, 'character_2.xml')
+        xml_manager = JournalDataManager(XMLDataManager(), compact_every=3, fsync=False)
+        xml_manager.create(shaman, xml_filename)
+        self.assertEqual(XMLDataManager().read(xml_filename).journal_generation, shaman.journal_generation)
+
+    def test_failed_snapshot_keeps_journal(self):
+        """
+        Тест: если снимок не записан, журнал и поколение сохраняются, а изменения дописываются в журнал.
+        """
+        from data_manager import JSONDataManager, WriteBehindQueue
+        from journal import JournalDataManager
+        from shaman import Shaman
+        queue = WriteBehindQueue(delay=60)
+        base = JSONDataManager(write_behind=queue)
+        manager = JournalDataManager(base, compact_every=3, fsync=False)
+        shaman = Shaman('Нобундо')
+        manager.create(shaman, self.filename)
+        generation = shaman.journal_generation
+        for _ in range(2):
+            shaman.gain_exp(15)
+            manager.create(shaman, self.filename)
+        write_file = base._write_file
+
+        def failing_write(filename, data):
+            raise OSError('диск заполнен')
+
+        base._write_file = failing_write
+        shaman.gain_exp(15)
+        self.assertTrue(manager.create(shaman, self.filename))
+        self.assertEqual(shaman.journal_generation, generation)
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(os.path.exists(manager.journal_path(self.filename)))
+        self.assertEqual(JournalDataManager(JSONDataManager()).read(self.filename).characteristics['exp'], 45)
+
+        base._write_file = write_file
+        shaman.gain_exp(5)
+        manager.create(shaman, self.filename)
+        self.assertEqual(shaman.journal_generation, generation + 1)
+        self.assertFalse(os.path.exists(manager.journal_path(self.filename)))
+        self.assertEqual(JournalDataManager(JSONDataManager()).read(self.filename).characteristics['exp'], 50)
+        queue.close()
+
+
+class TestCompressedSaves(unittest.TestCase):
+    """
+    Класс для тестирования сжатых сохранений и архивов.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_codec_is_detected_on_read(self):
+        """
+        Тест: сжатое сохранение меньше исходного и читается менеджером без сжатия, и наоборот.
+        """
+        from data_manager import XMLDataManager
+        from mage import Mage
+        plain = os.path.join(self.tmp.name, 'character_1.xml')
+        XMLDataManager().create(Mage('Антонидас'), plain)
+        for codec in ('gzip', 'zlib'):
+            with self.subTest(codec=codec):
+                packed = os.path.join(self.tmp.name, f'character_{codec}.xml')
+                XMLDataManager(compression=codec).create(Mage('Антонидас'), packed)
+                self.assertLess(os.path.getsize(packed), os.path.getsize(plain))
+                self.assertEqual(XMLDataManager().read(packed).name, 'Антонидас')
+                self.assertEqual(XMLDataManager(compression=codec).read(plain).name, 'Антонидас')
+
+    def test_compressed_archive_round_trip(self):
+        """
+        Тест: сжатый архив читается при импорте с автоматическим определением кодека.
+        """
+        from archive import export_characters, import_characters
+        from data_manager import JSONDataManager
+        from hunter import Hunter
+        src = os.path.join(self.tmp.name, 'src')
+        os.makedirs(src)
+        JSONDataManager(compression='gzip').create(Hunter('Ренгар'), os.path.join(src, 'character_5.json'))
+        archive_path = os.path.join(self.tmp.name, 'characters.bin.gz')
+        export_characters(src, archive_path, 'binary', workers=1, codec='gzip')
+        with open(archive_path, 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+        dst = os.path.join(self.tmp.name, 'dst')
+        self.assertEqual(import_characters(archive_path, dst, workers=1).records, 1)
+        self.assertEqual(JSONDataManager().read(os.path.join(dst, 'character_5.json')).name, 'Ренгар')
+
+
+class TestAutosaveScheduler(unittest.TestCase):
+    """
+    Класс для тестирования автосохранения измененных персонажей.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог и менеджер сохранений.
+        """
+        from data_manager import JSONDataManager
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = JSONDataManager()
+        self.filename = os.path.join(self.tmp.name, 'character_7.json')
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_only_dirty_characters_are_flushed(self):
+        """
+        Тест: сохраняются только персонажи с изменениями, флаг снимается после записи.
+        """
+        from autosave import AutosaveScheduler
+        from druid import Druid
+        scheduler = AutosaveScheduler(self.manager, interval=3600)
+        druid = Druid('Малфурион')
+        scheduler.track(druid, self.filename)
+        self.assertEqual(scheduler.flush(), 0)
+        druid.gain_exp(40)
+        self.assertTrue(druid.dirty)
+        self.assertEqual(scheduler.flush(), 1)
+        self.assertFalse(druid.dirty)
+        self.assertEqual(self.manager.read(self.filename).characteristics['exp'], 40)
+        self.assertEqual(scheduler.flush(), 0)
+        base_power = druid.characteristics['power']
+        druid.spirit_calling(True)
+        self.assertFalse(druid.dirty)
+        druid.gain_exp(10)
+        scheduler.close()
+        saved = self.manager.read(self.filename).characteristics
+        self.assertEqual((saved['exp'], saved['power']), (50, base_power))
+        self.assertEqual(druid.characteristics['power'], base_power + 20)
+        self.assertEqual(scheduler.saved, 2)
+
+    def test_characters_are_saved_by_their_own_manager(self):
+        """
+        Тест: персонаж, загруженный из XML, автосохраняется в тот же XML-файл, а не в JSON.
+        """
+        from autosave import AutosaveScheduler
+        from data_manager import XMLDataManager
+        from mage import Mage
+        xml_manager = XMLDataManager()
+        xml_filename = os.path.join(self.tmp.name, 'character_8.xml')
+        xml_manager.create(Mage('Джайна'), xml_filename)
+        mage = xml_manager.read(xml_filename)
+        scheduler = AutosaveScheduler(self.manager, interval=3600)
+        scheduler.track(mage, xml_filename, xml_manager)
+        mage.characteristics['crit_chance'] = 50
+        mage.gain_exp(30)
+        self.assertTrue(mage.fireball(True))
+        self.assertEqual(scheduler.flush(), 1)
+        saved = xml_manager.read(xml_filename).characteristics
+        self.assertEqual((saved['exp'], saved['power']), (30, mage.characteristics['power'] // 3))
+        self.assertFalse(self.manager.exists(os.path.join(self.tmp.name, 'character_8.json')))
+        scheduler.close()
+
+
+class TestKillWriter(unittest.TestCase):
+    """
+    Класс для тестирования пакетной записи убийств.
+    """
+
+    def setUp(self):
+        """
+        Создает временную базу SQLite с таблицей убийств.
+        """
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from database import Base
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'kills.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def tearDown(self):
+        """
+        Закрывает соединения и удаляет временный каталог.
+        """
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_kills_are_written_in_batches_and_flushed_on_close(self):
+        """
+        Тест: все убийства записаны пачками, включая остаток при закрытии.
+        """
+        from database import KillsSaver
+        from db_utils import KillWriter
+        writer = KillWriter(self.session_factory, batch_size=10, flush_interval=60, max_queue=20)
+        for number in range(25):
+            writer.add(player_id=number % 3, mob_type='simple' if number % 5 else 'event')
+        writer.close()
+        session = self.session_factory()
+        try:
+            self.assertEqual(session.query(KillsSaver).count(), 25)
+            self.assertEqual(session.query(KillsSaver).filter(KillsSaver.mob_type == 'event').count(), 5)
+        finally:
+            session.close()
+        self.assertEqual(writer.written, 25)
+        self.assertLessEqual(writer.batches, 3)
+        with self.assertRaises(RuntimeError):
+            writer.add(player_id=1, mob_type='simple')
+
+    def test_flush_waits_only_for_earlier_kills(self):
+        """
+        Тест: flush возвращается при непрерывном потоке убийств, дождавшись убийств до вызова.
+        """
+        import threading
+        from database import KillsSaver
+        from db_utils import KillWriter
+        writer = KillWriter(self.session_factory, batch_size=5, flush_interval=0.01)
+        for number in range(10):
+            writer.add(player_id=number, mob_type='simple')
+        stop = threading.Event()
+
+        def produce():
+            while not stop.is_set():
+                writer.add(player_id=99, mob_type='simple')
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        try:
+            self.assertTrue(writer.flush(timeout=10))
+            session = self.session_factory()
+            try:
+                self.assertEqual(session.query(KillsSaver).filter(KillsSaver.player_id < 10).count(), 10)
+            finally:
+                session.close()
+        finally:
+            stop.set()
+            producer.join()
+            writer.close()
+
+    def test_full_queue_waits_do_not_serialize(self):
+        """
+        Тест: при заполненной очереди одновременные убийства ждут места параллельно, а не по очереди.
+        """
+        import threading
+        import time
+        from database import KillsSaver
+        from db_utils import KillWriter
+        release = threading.Event()
+
+        def session_factory():
+            if threading.current_thread().name == 'kill-writer':
+                release.wait(10)
+            return self.session_factory()
+
+        writer = KillWriter(session_factory, batch_size=1, flush_interval=0.01, max_queue=1, put_timeout=0.5)
+        writer.add(player_id=1, mob_type='simple')
+        time.sleep(0.2)
+        writer.add(player_id=2, mob_type='simple')
+        threads = [threading.Thread(target=writer.add, args=(number, 'simple')) for number in range(3, 7)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(writer.overflows, 4)
+        release.set()
+        writer.close()
+        session = self.session_factory()
+        try:
+            self.assertEqual(session.query(KillsSaver).count(), 6)
+        finally:
+            session.close()
+
+    def test_failed_batch_falls_back_to_single_rows(self):
+        """
+        Тест: пачка с ошибочной строкой после повторов пишется по одной строке, теряется только ошибочная.
+        """
+        from database import KillsSaver
+        from db_utils import KillWriter
+        writer = KillWriter(self.session_factory, batch_size=10, flush_interval=0.01)
+        writer.add(player_id=1, mob_type='simple')
+        writer.add(player_id=2, mob_type=None)
+        writer.add(player_id=3, mob_type='event')
+        writer.close()
+        session = self.session_factory()
+        try:
+            self.assertEqual(session.query(KillsSaver).count(), 2)
+        finally:
+            session.close()
+        self.assertEqual(writer.dropped, 1)
+
+
+class TestDatabaseSessions(unittest.TestCase):
+    """
+    Класс для тестирования настроек пула и сессий БД.
+    """
+
+    def setUp(self):
+        """
+        Подключает БД (из DB_URL или SQLite в памяти) и запоминает переменные окружения пула.
+        """
+        from database import init_db
+        init_db(os.getenv('DB_URL') or 'sqlite://')
+        self.saved_env = {name: os.environ.get(name) for name in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW')}
+
+    def tearDown(self):
+        """
+        Восстанавливает переменные окружения пула.
+        """
+        for name, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def test_pool_options_from_environment(self):
+        """
+        Тест: размер пула берется из окружения, для SQLite в памяти не задается.
+        """
+        from database import engine_options
+        os.environ['DB_POOL_SIZE'] = '12'
+        os.environ['DB_MAX_OVERFLOW'] = '3'
+        options = engine_options('postgresql://user@localhost/rpg')
+        self.assertEqual((options['pool_size'], options['max_overflow']), (12, 3))
+        self.assertNotIn('pool_size', engine_options('sqlite://'))
+
+    def test_session_scope_reuses_thread_session_and_rolls_back(self):
+        """
+        Тест: сессия потока переиспользуется, при ошибке транзакция откатывается.
+        """
+        from database import KillsSaver, pool_metrics, session_scope
+        checkouts = pool_metrics.checkouts
+        with session_scope() as first:
+            before = first.query(KillsSaver).count()
+        with self.assertRaises(ValueError):
+            with session_scope() as second:
+                second.add(KillsSaver(player_id=-5, mob_type='simple'))
+                second.flush()
+                raise ValueError('сбой')
+        with session_scope() as third:
+            self.assertEqual(third.query(KillsSaver).count(), before)
+        self.assertIs(first, second)
+        self.assertIs(first, third)
+        self.assertGreaterEqual(pool_metrics.checkouts - checkouts, 3)
+
+
+class TestKillsDailyRollup(unittest.TestCase):
+    """
+    Класс для тестирования дневной сводки убийств.
+    """
+
+    def setUp(self):
+        """
+        Создает временную базу SQLite с таблицами убийств.
+        """
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from database import Base
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'kills.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+
+    def tearDown(self):
+        """
+        Закрывает соединения и удаляет временный каталог.
+        """
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def daily(self):
+        """
+        Возвращает сводку в виде словаря (дата, тип) -> количество.
+        """
+        from database import KillsDaily
+        session = self.session_factory()
+        try:
+            return {(row.date, row.mob_type): row.count for row in session.query(KillsDaily)}
+        finally:
+            session.close()
+
+    def test_rollup_is_incremental_and_rebuildable(self):
+        """
+        Тест: пакетная запись обновляет сводку, пересчет дает тот же результат.
+        """
+        from database import KillsSaver
+        from db_utils import KillWriter, rebuild_daily_rollup
+        writer = KillWriter(self.session_factory, batch_size=4)
+        for number in range(10):
+            writer.add(player_id=1, mob_type='event' if number < 3 else 'simple')
+        writer.close()
+        session = self.session_factory()
+        session.add(KillsSaver(player_id=2, mob_type='simple', time=datetime(2024, 1, 5, 12)))
+        session.commit()
+        session.close()
+        today = datetime.utcnow().date()
+        incremental = self.daily()
+        self.assertEqual(incremental, {(today, 'event'): 3, (today, 'simple'): 7})
+        self.assertEqual(rebuild_daily_rollup(self.session_factory), 3)
+        self.assertEqual(self.daily(), {**incremental, (datetime(2024, 1, 5).date(), 'simple'): 1})
+
+
+class TestChartCache(unittest.TestCase):
+    """
+    Класс для тестирования кеша графиков статистики.
+    """
+
+    def setUp(self):
+        """
+        Создает счетчик построений и текущую версию данных.
+        """
+        self.data_version = 1
+        self.calls = 0
+
+    def render(self):
+        """
+        Имитирует долгое построение графика.
+        """
+        import time
+        self.calls += 1
+        time.sleep(0.05)
+        return f'png{self.data_version}'.encode()
+
+    def test_render_once_per_version_with_single_flight(self):
+        """
+        Тест: одновременные запросы строят график один раз, новая версия перестраивает его.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from charts import ChartCache
+        cache = ChartCache(self.render, lambda: self.data_version)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: cache.get(), range(8)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(set(results), {(1, b'png1')})
+        self.data_version = 2
+        self.assertEqual(cache.get(), (2, b'png2'))
+        self.assertEqual(cache.get(), (2, b'png2'))
+        self.assertEqual(self.calls, 2)
+
+    def test_ttl_serves_cached_chart_without_version_check(self):
+        """
+        Тест: в пределах ttl версия данных не проверяется.
+        """
+        from charts import ChartCache
+        cache = ChartCache(self.render, lambda: self.data_version, ttl=60)
+        cache.get()
+        self.data_version = 5
+        self.assertEqual(cache.get(), (1, b'png1'))
+        cache.invalidate()
+        self.assertEqual(cache.get(), (5, b'png5'))
+
+
+class TestSendChart(unittest.TestCase):
+    """
+    Класс для тестирования отправки графика по file_id.
+    """
+
+    def setUp(self):
+        """
+        Создает поддельного бота, запоминающего отправленные фотографии.
+        """
+        from types import SimpleNamespace
+        self.sent = []
+        self.data_version = 1
+        self.reject_file_id = False
+
+        def send_photo(chat_id, photo, caption=None):
+            if isinstance(photo, str) and self.reject_file_id:
+                raise RuntimeError('file_id устарел')
+            self.sent.append(photo)
+            return SimpleNamespace(photo=[SimpleNamespace(file_id='small'),
+                                          SimpleNamespace(file_id=f'id{len(self.sent)}')])
+
+        self.bot = SimpleNamespace(send_photo=send_photo)
+
+    def tearDown(self):
+        """
+        Очищает список отправленных фотографий.
+        """
+        self.sent.clear()
+
+    def test_upload_only_when_chart_changes(self):
+        """
+        Тест: та же версия отправляется по file_id, новая или отклоненная - загружается.
+        """
+        from charts import ChartCache, send_chart
+        cache = ChartCache(lambda: f'png{self.data_version}'.encode(), lambda: self.data_version)
+        send_chart(self.bot, 1, cache)
+        send_chart(self.bot, 2, cache)
+        self.assertEqual(self.sent, [b'png1', 'id1'])
+        self.data_version = 2
+        send_chart(self.bot, 1, cache)
+        self.assertEqual(self.sent[-1], b'png2')
+        self.reject_file_id = True
+        send_chart(self.bot, 1, cache)
+        self.assertEqual(self.sent[-1], b'png2')
+
+
+class TestChartRenderer(unittest.TestCase):
+    """
+    Класс для тестирования построения графиков в пуле процессов.
+    """
+
+    def setUp(self):
+        """
+        Создает пул построения графиков из одного процесса.
+        """
+        from charts import ChartRenderer
+        self.renderer = ChartRenderer(workers=1, timeout=0.5)
+
+    def tearDown(self):
+        """
+        Останавливает пул процессов.
+        """
+        self.renderer.close()
+
+    def test_render_returns_png_and_respects_timeout(self):
+        """
+        Тест: график приходит из процесса в виде PNG, долгое построение прерывается по таймауту.
+        """
+        import time
+        import pandas as pd
+        from charts import render_kills_chart
+        self.renderer.timeout = 60
+        df = pd.DataFrame({'simple': [3, 5], 'event': [1, 0]},
+                          index=pd.to_datetime(['2024-01-01', '2024-01-02']))
+        self.assertTrue(self.renderer.render(render_kills_chart, df).startswith(b'\x89PNG'))
+        self.assertTrue(self.renderer.render(render_kills_chart, pd.DataFrame()).startswith(b'\x89PNG'))
+        self.renderer.timeout = 0.2
+        with self.assertRaises(TimeoutError):
+            self.renderer.render(time.sleep, 2)
+
+    def test_timeout_terminates_busy_worker(self):
+        """
+        Тест: по таймауту процесс с зависшим построением завершается, следующий график строится в новом пуле.
+        """
+        import time
+        import pandas as pd
+        from charts import _pool_processes, render_kills_chart
+        self.renderer.timeout = 60
+        self.renderer.render(time.sleep, 0)
+        busy = _pool_processes(self.renderer._executor)
+        self.renderer.timeout = 0.2
+        with self.assertRaises(TimeoutError):
+            self.renderer.render(time.sleep, 30)
+        self.assertIsNone(self.renderer._executor)
+        self.assertFalse(any(process.is_alive() for process in busy))
+        self.renderer.timeout = 60
+        self.assertTrue(self.renderer.render(render_kills_chart, pd.DataFrame()).startswith(b'\x89PNG'))
+
+
+    def test_render_queued_behind_timeout_is_retried(self):
+        """
+        Тест: график, ждавший в пуле, остановленном по чужому таймауту, строится в новом пуле.
+        """
+        import threading
+        import time
+        self.renderer.timeout = 2
+        self.renderer.render(time.sleep, 0)
+        errors = []
+
+        def hang():
+            try:
+                self.renderer.render(time.sleep, 30)
+            except TimeoutError as e:
+                errors.append(e)
+
+        results = []
+
+        def add(number):
+            try:
+                results.append(self.renderer.render(sum, [number, 1]))
+            except Exception as e:
+                errors.append(e)
+
+        hanging = threading.Thread(target=hang)
+        hanging.start()
+        time.sleep(0.3)
+        queued = [threading.Thread(target=add, args=(number,)) for number in range(3)]
+        for thread in queued:
+            thread.start()
+        for thread in [hanging, *queued]:
+            thread.join()
+        self.assertEqual(sorted(results), [1, 2, 3])
+        self.assertEqual([type(e) for e in errors], [TimeoutError])
+
+class SQLiteEngineMixin:
+    """
+    Подмена глобального движка database на временную базу SQLite.
+    """
+
+    def use_sqlite_engine(self, filename='kills.db'):
+        """
+        Подключает database к новой базе SQLite во временном каталоге self.tmp.
+        Прежний движок возвращается, а каталог удаляется после теста.
+
+        Args:
+            filename (str): Имя файла базы во временном каталоге.
+
+        Returns:
+            str: Путь к файлу базы.
+        """
+        import database
+        self.tmp = tempfile.TemporaryDirectory()
+        saved_engine = database.engine
+        database.ScopedSession.remove()
+        database.close_read_db()
+        database.engine = None
+        path = os.path.join(self.tmp.name, filename)
+        database.init_db(f"sqlite:///{path}")
+
+        def restore():
+            database.close_read_db()
+            database.ScopedSession.remove()
+            database.engine.dispose()
+            database.engine = saved_engine
+            database.SessionLocal.configure(bind=saved_engine)
+            self.tmp.cleanup()
+
+        self.addCleanup(restore)
+        return path
+
+
+class TestPlayerKills(SQLiteEngineMixin, unittest.TestCase):
+    """
+    Класс для тестирования статистики убийств игрока.
+    """
+
+    def setUp(self):
+        """
+        Подключает временную базу SQLite с убийствами двух игроков.
+        """
+        from database import KillsSaver, SessionLocal
+        self.use_sqlite_engine()
+        session = SessionLocal()
+        for day, player_id, mob_type in ((1, 10, 'simple'), (1, 10, 'event'), (2, 10, 'simple'),
+                                         (2, 10, 'simple'), (2, 20, 'simple'), (20, 10, 'simple')):
+            session.add(KillsSaver(player_id=player_id, mob_type=mob_type, time=datetime(2024, 3, day, 12)))
+        session.commit()
+        session.close()
+
+    def test_player_daily_counts_since(self):
+        """
+        Тест: статистика игрока учитывает только его убийства начиная с since, индекс создан.
+        """
+        from sqlalchemy import inspect
+        import database
+        from db_utils import add_player_time_index, get_kills
+        df = get_kills(player_id=10, since=datetime(2024, 3, 1))
+        self.assertEqual(df['simple'].tolist(), [1, 2, 1])
+        self.assertEqual(int(df.sum().sum()), 5)
+        self.assertEqual(len(get_kills(player_id=10, since=datetime(2024, 3, 15))), 1)
+        self.assertEqual(add_player_time_index(), 'sqlite')
+        indexes = {index['name'] for index in inspect(database.engine).get_indexes('kills')}
+        self.assertIn('ix_kills_player_id_time', indexes)
+        self.assertNotIn('ix_kills_player_id', indexes)
+
+    def test_series_matches_frame_without_pandas(self):
+        """
+        Тест: колоночный ряд из условной агрегации и его DataFrame совпадают с ожидаемыми, график строится.
+        """
+        from datetime import date
+        import pandas as pd
+        from pandas.testing import assert_frame_equal
+        from charts import render_kills_chart
+        from db_utils import get_kills, get_kills_series
+        series = get_kills_series(player_id=10)
+        self.assertEqual(series.dates, [date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 20)])
+        self.assertEqual(list(series.counts['simple']), [1, 2, 1])
+        self.assertEqual(list(series.counts['event']), [1, 0, 0])
+        self.assertEqual(series.totals(), {'simple': 4, 'event': 1})
+        expected = pd.DataFrame({'event': [1, 0, 0], 'simple': [1, 2, 1]},
+                                index=pd.to_datetime([date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 20)]))
+        expected.index.name = 'date'
+        expected.columns.name = 'mob_type'
+        assert_frame_equal(get_kills(player_id=10), expected)
+        empty = get_kills(player_id=999)
+        self.assertEqual(list(empty.columns), ['date', 'обычный', 'ивентовый'])
+        self.assertEqual(len(empty), 0)
+        self.assertTrue(render_kills_chart(series).startswith(b'\x89PNG'))
+
+    def test_hour_heatmap(self):
+        """
+        Тест: тепловая карта группирует убийства по дню недели и часу в БД, индекс по времени создан.
+        """
+        from sqlalchemy import inspect
+        import database
+        from charts import render_hour_heatmap
+        from db_utils import add_time_index, get_hour_heatmap
+        self.assertEqual(add_time_index(), 'sqlite')
+        self.assertIn('ix_kills_time', {index['name'] for index in inspect(database.engine).get_indexes('kills')})
+        heatmap = get_hour_heatmap()
+        self.assertEqual(heatmap.counts[5][12], 2)
+        self.assertEqual(heatmap.counts[6][12], 3)
+        self.assertEqual(heatmap.counts[3][12], 1)
+        self.assertEqual(sum(sum(row) for row in heatmap.counts), 6)
+        self.assertEqual(heatmap.peak(), (6, 12, 3))
+        self.assertEqual(sum(map(sum, get_hour_heatmap(player_id=20).counts)), 1)
+        self.assertTrue(get_hour_heatmap(since=datetime(2025, 1, 1)).empty)
+        self.assertTrue(render_hour_heatmap(heatmap).startswith(b'\x89PNG'))
+
+    def test_kill_trends_rolling_window(self):
+        """
+        Тест: скользящее среднее и доля ивентовых убийств считаются оконной функцией по сводке.
+        """
+        from charts import render_trends_chart
+        from db_utils import get_kill_trends, rebuild_daily_rollup
+        rebuild_daily_rollup()
+        trends = get_kill_trends(window=2)
+        self.assertEqual(list(trends.totals), [2, 3, 1])
+        self.assertEqual(list(trends.rolling), [2.0, 2.5, 2.0])
+        self.assertEqual(list(trends.event_share), [0.5, 0.0, 0.0])
+        self.assertAlmostEqual(trends.event_ratio(), 0.2)
+        recent = get_kill_trends(since=datetime(2024, 3, 2), window=2)
+        self.assertEqual(list(recent.rolling), [2.5, 2.0])
+        self.assertTrue(render_trends_chart(trends).startswith(b'\x89PNG'))
+
+
+class TestLeaderboards(unittest.TestCase):
+    """
+    Класс для тестирования таблиц лидеров.
+    """
+
+    def setUp(self):
+        """
+        Создает таблицы лидеров на трех игроков.
+        """
+        from leaderboard import Leaderboards
+        self.boards = Leaderboards(k=2)
+        self.now = datetime(2024, 3, 6, 12)
+
+    def tearDown(self):
+        """
+        Удаляет таблицы лидеров.
+        """
+        del self.boards
+
+    def test_incremental_top_and_period_rollover(self):
+        """
+        Тест: top-K обновляется на каждом убийстве, дневная таблица обнуляется в новые сутки.
+        """
+        for player_id, kills in ((1, 3), (2, 1), (3, 2)):
+            for _ in range(kills):
+                self.boards.record_kill(player_id, 'simple', self.now)
+        self.assertEqual(self.boards.kills_all.top(), [(1, 3), (3, 2)])
+        self.boards.record_kill(2, 'simple', self.now + timedelta(days=1))
+        self.boards.record_kill(2, 'simple', self.now + timedelta(days=1))
+        self.assertEqual(self.boards.kills_day.top(), [(2, 2)])
+        self.assertEqual(self.boards.kills_week.top(), [(1, 3), (2, 3)])
+        self.boards.record_level(3, 'Тралл', 7)
+        self.boards.record_level(3, 'Тралл', 5)
+        self.assertEqual(self.boards.top()['Уровень'], [('Тралл', 7)])
+
+    def test_reconcile_replaces_counts_and_keeps_concurrent_kills(self):
+        """
+        Тест: сверка заменяет счета данными БД и сохраняет убийства, учтенные во время сверки.
+        """
+        self.boards.record_kill(1, 'simple', self.now)
+
+        def kill_counts(since):
+            if since is None:
+                self.boards.record_kill(4, 'event', self.now)
+                return {1: 10, 2: 4}
+            return {2: 1}
+
+        self.boards.reconcile(kill_counts, now=self.now)
+        self.assertEqual(self.boards.kills_all.top(), [(1, 10), (2, 4)])
+        self.assertEqual(self.boards.kills_all.scores[4], 1)
+        self.assertEqual(self.boards.kills_day.top(), [(2, 1), (4, 1)])
+
+    def test_kill_during_flush_is_captured(self):
+        """
+        Тест: убийство, учтенное во время сброса очереди перед сверкой, не теряется; неудачный сброс пропускает сверку.
+        """
+        self.boards.record_kill(1, 'simple', self.now)
+
+        def flush():
+            self.boards.record_kill(5, 'simple', self.now)
+            return True
+
+        self.assertTrue(self.boards.reconcile(lambda since: {1: 1}, now=self.now, before=flush))
+        self.assertEqual(self.boards.kills_all.scores.get(5), 1)
+        self.assertFalse(self.boards.reconcile(lambda since: {}, now=self.now, before=lambda: False))
+        self.assertEqual(self.boards.kills_all.top(), [(1, 1), (5, 1)])
+        self.assertIsNone(self.boards._captured)
+
+
+class TestKillsRetention(SQLiteEngineMixin, unittest.TestCase):
+    """
+    Класс для тестирования архивации старых убийств.
+    """
+
+    def setUp(self):
+        """
+        Подключает временную базу SQLite с убийствами за три месяца.
+        """
+        from database import KillsSaver, SessionLocal
+        self.use_sqlite_engine()
+        session = SessionLocal()
+        for month, player_id, count in ((1, 1, 3), (1, 2, 1), (2, 1, 2), (3, 2, 4)):
+            for number in range(count):
+                session.add(KillsSaver(player_id=player_id, mob_type='simple',
+                                       time=datetime(2024, month, 10 + number, 12)))
+        session.commit()
+        session.close()
+
+    def test_old_months_are_archived_and_totals_kept(self):
+        """
+        Тест: старые месяцы выгружены в файлы и удалены, итоги игроков за все время сохранены.
+        """
+        import gzip
+        import json
+        from database import KillsSaver, SessionLocal
+        from db_utils import kill_counts_by_player
+        from retention import apply_retention
+        before = kill_counts_by_player()
+        archive_dir = os.path.join(self.tmp.name, 'archive')
+        results = apply_retention(1, archive_dir, batch_size=2, now=datetime(2024, 3, 20))
+        self.assertEqual([(r.month.month, r.exported, r.deleted) for r in results], [(1, 4, 4), (2, 2, 2)])
+        with gzip.open(results[0].path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(sorted(json.loads(line)['player_id'] for line in f), [1, 1, 1, 2])
+        session = SessionLocal()
+        self.assertEqual(session.query(KillsSaver).count(), 4)
+        session.close()
+        self.assertEqual(kill_counts_by_player(), before)
+        self.assertEqual(apply_retention(1, archive_dir, now=datetime(2024, 3, 20)), [])
+
+    def test_rebuild_after_archive_keeps_archived_days(self):
+        """
+        Тест: пересчет сводки после архивации не стирает дни архивированных месяцев.
+        """
+        from database import KillsDaily, SessionLocal
+        from db_utils import rebuild_daily_rollup
+        from retention import apply_retention
+
+        def rollup():
+            session = SessionLocal()
+            try:
+                return sorted((row.date, row.mob_type, row.count) for row in session.query(KillsDaily))
+            finally:
+                session.close()
+
+        rebuild_daily_rollup(SessionLocal)
+        before = rollup()
+        apply_retention(1, os.path.join(self.tmp.name, 'archive'), now=datetime(2024, 3, 20))
+        self.assertEqual(rebuild_daily_rollup(SessionLocal), len(before))
+        self.assertEqual(rollup(), before)
+
+    def test_keep_months_below_one_is_rejected(self):
+        """
+        Тест: keep_months меньше 1 отклоняется, а не архивирует текущий месяц.
+        """
+        from retention import apply_retention
+        with self.assertRaises(ValueError):
+            apply_retention(0, os.path.join(self.tmp.name, 'archive'), now=datetime(2024, 3, 20))
+
+
+class TestKillsExport(SQLiteEngineMixin, unittest.TestCase):
+    """
+    Класс для тестирования колоночной выгрузки убийств.
+    """
+
+    def setUp(self):
+        """
+        Подключает временную базу SQLite с убийствами за два дня.
+        """
+        from database import KillsSaver, SessionLocal
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest('pyarrow не установлен')
+        self.use_sqlite_engine()
+        session = SessionLocal()
+        for day, player_id, mob_type in ((1, 1, 'simple'), (1, 2, 'event'), (2, 1, 'simple'),
+                                         (2, 1, 'simple'), (2, 2, 'simple')):
+            session.add(KillsSaver(player_id=player_id, mob_type=mob_type, time=datetime(2024, 3, day, 12)))
+        session.commit()
+        session.close()
+        self.out_dir = os.path.join(self.tmp.name, 'export')
+
+    def test_incremental_parquet_export(self):
+        """
+        Тест: выгрузка идет частями по id, раскладывается по датам и продолжается с водяного знака.
+        """
+        import pyarrow.dataset
+        from database import SessionLocal, KillsSaver
+        from kills_export import export_kills, read_watermark
+        result = export_kills(self.out_dir, chunk_size=2)
+        self.assertEqual((result.rows, result.watermark), (5, 5))
+        self.assertEqual(len(result.files), 3)
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['_watermark.json', 'date=2024-03-01', 'date=2024-03-02'])
+        self.assertEqual(export_kills(self.out_dir).rows, 0)
+        session = SessionLocal()
+        session.add(KillsSaver(player_id=3, mob_type='event', time=datetime(2024, 3, 2, 13)))
+        session.commit()
+        session.close()
+        self.assertEqual(export_kills(self.out_dir).rows, 1)
+        self.assertEqual(read_watermark(self.out_dir), 6)
+        table = pyarrow.dataset.dataset(self.out_dir, format='parquet', partitioning='hive',
+                                        exclude_invalid_files=True).to_table()
+        self.assertEqual(sorted(table.column('id').to_pylist()), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(table.filter(pyarrow.dataset.field('mob_type') == 'event').num_rows, 2)
+
+    def test_export_stops_before_unsettled_rows(self):
+        """
+        Тест: выгрузка останавливается на первой строке моложе lag, следующие строки ждут следующего запуска.
+        """
+        from database import SessionLocal, KillsSaver
+        from kills_export import export_kills, read_watermark
+        session = SessionLocal()
+        session.add(KillsSaver(player_id=3, mob_type='simple', time=datetime(2024, 3, 3, 11, 59)))
+        session.add(KillsSaver(player_id=3, mob_type='simple', time=datetime(2024, 3, 3, 11, 50)))
+        session.commit()
+        session.close()
+        now = datetime(2024, 3, 3, 12)
+        result = export_kills(self.out_dir, chunk_size=2, lag=300, now=now)
+        self.assertEqual((result.rows, result.watermark), (5, 5))
+        self.assertEqual(export_kills(self.out_dir, lag=300, now=now).rows, 0)
+        self.assertEqual(export_kills(self.out_dir, lag=300, now=datetime(2024, 3, 3, 12, 5)).rows, 2)
+        self.assertEqual(read_watermark(self.out_dir), 7)
+
+    def test_arrow_ipc_export(self):
+        """
+        Тест: формат Arrow IPC читается обратно с теми же строками; неизвестный формат отклоняется.
+        """
+        import pyarrow.ipc
+        from exceptions import DataStorageError
+        from kills_export import export_kills
+        result = export_kills(self.out_dir, fmt='arrow')
+        rows = sum(pyarrow.ipc.open_file(path).read_all().num_rows for path in result.files)
+        self.assertEqual(rows, 5)
+        self.assertTrue(all(path.endswith('.arrow') for path in result.files))
+        with self.assertRaises(DataStorageError):
+            export_kills(self.out_dir, fmt='csv')
+
+
+class TestReadReplica(SQLiteEngineMixin, unittest.TestCase):
+    """
+    Класс для тестирования отдельного движка чтения статистики.
+    """
+
+    def setUp(self):
+        """
+        Подключает временную основную базу SQLite и ее копию как отстающую реплику.
+        """
+        import shutil
+        import database
+        from database import KillsSaver, SessionLocal
+        self.saved_max_lag = database.replica_lag.max_lag
+        primary_path = self.use_sqlite_engine('primary.db')
+        self.replica_url = f"sqlite:///{os.path.join(self.tmp.name, 'replica.db')}"
+        session = SessionLocal()
+        session.add_all([KillsSaver(player_id=1, mob_type='simple', time=datetime(2024, 3, 1, 12)),
+                         KillsSaver(player_id=2, mob_type='event', time=datetime(2024, 3, 1, 13))])
+        session.commit()
+        shutil.copy(primary_path, os.path.join(self.tmp.name, 'replica.db'))
+        session.add(KillsSaver(player_id=1, mob_type='simple', time=datetime.utcnow() - timedelta(minutes=5)))
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        """
+        Возвращает прежний порог отставания реплики.
+        """
+        import database
+        database.replica_lag.max_lag = self.saved_max_lag
+
+    def test_reads_use_primary_without_replica(self):
+        """
+        Тест: без DB_READ_URL чтение идет из основной БД.
+        """
+        import database
+        from db_utils import kills_version
+        self.assertIs(database.read_query(lambda session: session.get_bind()), database.engine)
+        self.assertEqual(kills_version()[0], 3)
+
+    def test_replica_reads_and_lag_fallback(self):
+        """
+        Тест: чтение идет с реплики, пока ее отставание меньше порога, иначе из основной БД.
+        Сверка лидеров и статистика игрока всегда читаются из основной БД.
+        """
+        import database
+        from db_utils import get_kills_series, kill_counts_by_player, kills_version
+        database.replica_lag.max_lag = 3600
+        database.init_read_db(self.replica_url)
+        self.assertEqual(kills_version()[0], 2)
+        self.assertEqual(kill_counts_by_player(), {1: 2, 2: 1})
+        self.assertEqual(get_kills_series(player_id=1).totals()['simple'], 2)
+        self.assertEqual(database.replica_lag.rows, 1)
+        self.assertGreaterEqual(database.replica_lag.seconds, 290)
+        self.assertGreater(database.read_pool_metrics.checkouts, 0)
+        database.replica_lag.max_lag = 60
+        database.replica_lag.checked_at = None
+        self.assertEqual(kills_version()[0], 3)
+        self.assertTrue(database.replica_lag.stale())
+
+    def test_unavailable_replica_falls_back(self):
+        """
+        Тест: недоступная реплика отмечается и не мешает чтению из основной БД.
+        """
+        import database
+        from db_utils import kills_version
+        database.init_read_db(f"sqlite:///{os.path.join(self.tmp.name, 'missing', 'replica.db')}")
+        self.assertEqual(kills_version()[0], 3)
+        self.assertFalse(database.replica_lag.available)
+
+    def test_exhausted_replica_pool_falls_back(self):
+        """
+        Тест: исчерпанный пул реплики (TimeoutError пула) не мешает чтению из основной БД.
+        """
+        import time
+        from unittest.mock import patch
+        import database
+        from db_utils import kills_version
+        settings = {'DB_READ_POOL_SIZE': '1', 'DB_READ_MAX_OVERFLOW': '0', 'DB_READ_POOL_TIMEOUT': '0.1'}
+        with patch.dict(os.environ, settings):
+            database.init_read_db(self.replica_url)
+        database.replica_lag.max_lag = 3600
+        database.replica_lag.checked_at = time.monotonic()
+        with database.read_engine.connect():
+            self.assertEqual(kills_version()[0], 3)
+        self.assertFalse(database.replica_lag.available)
+
+    def test_failed_replica_query_is_retried_on_primary(self):
+        """
+        Тест: запрос, упавший на реплике (нет таблицы), повторяется в основной БД.
+        """
+        import sqlite3
+        import database
+        from db_utils import kills_version
+        connection = sqlite3.connect(os.path.join(self.tmp.name, 'replica.db'))
+        connection.execute('DROP TABLE kills_daily')
+        connection.commit()
+        connection.close()
+        database.replica_lag.max_lag = 3600
+        database.init_read_db(self.replica_url)
+        self.assertEqual(kills_version()[0], 3)
+        self.assertFalse(database.replica_lag.available)
+
+
+class TestAsyncKills(unittest.TestCase):
+    """
+    Класс для тестирования асинхронной записи и чтения убийств.
+    """
+
+    def setUp(self):
+        """
+        Создает временный каталог для базы SQLite.
+        """
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest('aiosqlite не установлен')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp.name, 'kills.db')}"
+
+    def tearDown(self):
+        """
+        Удаляет временный каталог.
+        """
+        self.tmp.cleanup()
+
+    def test_concurrent_async_saves_update_rollup(self):
+        """
+        Тест: конкурентные асинхронные записи попадают в kills и в дневную сводку.
+        """
+        import asyncio
+        from db_async import async_url, close_async_db, get_kills_async, init_async_db, save_kill_async
+        self.assertEqual(async_url('sqlite:///x.db'), 'sqlite+aiosqlite:///x.db')
+        self.assertEqual(async_url('postgresql://u:p@h/db'), 'postgresql+asyncpg://u:p@h/db')
+
+        async def scenario():
+            await init_async_db(self.url)
+            try:
+                ids = await asyncio.gather(*(save_kill_async(7, 'event' if n % 4 == 0 else 'simple')
+                                             for n in range(20)))
+                return ids, await get_kills_async(), await get_kills_async(player_id=7)
+            finally:
+                await close_async_db()
+
+        ids, overall, player = asyncio.run(scenario())
+        self.assertEqual(sorted(ids), list(range(1, 21)))
+        self.assertEqual(int(overall['simple'].sum()), 15)
+        self.assertEqual(int(overall['event'].sum()), 5)
+        self.assertEqual(overall.to_dict(), player.to_dict())
+
+
 if __name__ == '__rpgmaker__':
     unittest.rpgmaker()